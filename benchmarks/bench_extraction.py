@@ -0,0 +1,96 @@
+"""Benchmark wikicode extraction: get_pagelinks + get_headings_sections (two full parses
+plus a reparse of every section and link) vs get_headings_sections_links (one parse) vs
+get_headings_links_fast (linear scanners, no sections)
+
+Usage
+-----
+python benchmarks/bench_extraction.py [--pages 300] [--seed 0]
+"""
+
+import argparse
+import random
+import time
+
+from typing import Callable, List
+from xml.etree.ElementTree import Element
+
+import vulcan.wikitools.wikixml as wikixml
+
+WORDS = ["quantum", "mechanics", "theory", "physics", "energy", "particle", "wave", "field"]
+
+
+def make_article(rng: random.Random) -> str:
+    """Make a synthetic article with a lead, headings, links, templates and refs"""
+    sections = []
+    for i in range(rng.randint(0, 12)):
+        paragraph = []
+        for _ in range(rng.randint(20, 200)):
+            roll = rng.random()
+            word = rng.choice(WORDS)
+            if roll < 0.05:
+                paragraph.append("[[{}]]".format(word.title()))
+            elif roll < 0.08:
+                paragraph.append("[[{}|{}]]".format(word.title(), word))
+            elif roll < 0.09:
+                paragraph.append("{{{{cite web|title={}}}}}".format(word))
+            elif roll < 0.10:
+                paragraph.append("<ref>[[{}]] p. {}</ref>".format(word.title(), i))
+            else:
+                paragraph.append(word)
+        text = " ".join(paragraph)
+        if i == 0:
+            sections.append(text)
+        else:
+            sections.append("== {} {} ==\n{}".format(rng.choice(WORDS).title(), i, text))
+    sections.append("[[Category:{}]]".format(rng.choice(WORDS).title()))
+    return "\n\n".join(sections)
+
+
+def two_pass(element: Element):
+    links = wikixml.get_pagelinks(element)
+    headings, sections = wikixml.get_headings_sections(element)
+    return headings, sections, links
+
+
+def single_pass(element: Element):
+    return wikixml.get_headings_sections_links(element)
+
+
+def fast(element: Element):
+    return wikixml.get_headings_links_fast(element)
+
+
+def pages_per_second(extract: Callable, elements: List[Element]) -> float:
+    start = time.perf_counter()
+    for element in elements:
+        extract(element)
+    return len(elements) / (time.perf_counter() - start)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    arg_parser.add_argument("--pages", type=int, default=300)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+    rng = random.Random(args.seed)
+    elements = []
+    for _ in range(args.pages):
+        element = Element("text")
+        element.text = make_article(rng)
+        elements.append(element)
+    mismatches = sum(two_pass(element) != single_pass(element) for element in elements)
+    two_pass_rate = pages_per_second(two_pass, elements)
+    single_pass_rate = pages_per_second(single_pass, elements)
+    fast_mismatches = sum(two_pass(element)[::2] != fast(element) for element in elements)
+    fast_rate = pages_per_second(fast, elements)
+    print("pages: {} (mismatched results: {})".format(args.pages, mismatches))
+    print("get_pagelinks + get_headings_sections: {:8.1f} pages/s".format(two_pass_rate))
+    print("get_headings_sections_links:           {:8.1f} pages/s".format(single_pass_rate))
+    print("speedup: {:.2f}x".format(single_pass_rate / two_pass_rate))
+    print("get_headings_links_fast (mismatched results: {})".format(fast_mismatches))
+    print("get_headings_links_fast:               {:8.1f} pages/s".format(fast_rate))
+    print("speedup: {:.2f}x".format(fast_rate / two_pass_rate))
+
+
+if __name__ == "__main__":
+    main()
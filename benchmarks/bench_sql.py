@@ -0,0 +1,121 @@
+"""Benchmark reading the page table's INSERT INTO lines: the lazy regex that
+database.sql used to match rows with, against the tokenizer's iter_rows and
+parse_columns
+
+The dump is synthetic: --statements lines of --rows-per-statement rows, with a share
+of titles (--tricky) containing escaped quotes, commas and parentheses. Besides rows/s
+the regex row reports how many rows it got wrong (a title or namespace that doesn't
+match the generated row).
+
+Usage
+-----
+python benchmarks/bench_sql.py [--statements 200] [--rows-per-statement 1000]
+    [--tricky 0.02] [--seed 0]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from typing import Callable, List, Tuple
+
+from vulcan.database.sql import LineEnum, iter_rows, parse_columns
+
+# the row regex database.sql used before the tokenizer
+# pylint: disable=anomalous-backslash-in-string
+page_item_ex = re.compile(b"\((.*?),(.*?),'(.*?)',(.*?),(.*?),(.*?)\)")
+TRICKY_TITLES = ["Don\\'t_Stop", "A,_B_(C)", "Rock_\\'n\\'_Roll_(album)", "C:\\\\"]
+
+
+def make_lines(
+    statements: int, rows_per_statement: int, tricky: float, seed: int
+) -> Tuple[List[bytes], List[Tuple[int, str]]]:
+    """INSERT INTO lines and the (namespace, title) of every row"""
+    rng = random.Random(seed)
+    lines, expected = [], []
+    page_id = 1
+    for _ in range(statements):
+        rows = []
+        for _ in range(rows_per_statement):
+            namespace = rng.choice([0, 0, 0, 1, 2, 4, 10, 14])
+            if rng.random() < tricky:
+                literal = rng.choice(TRICKY_TITLES)
+            else:
+                literal = "Title_{}_{}".format(page_id, rng.randint(0, 10**6))
+            title = literal.replace("\\'", "'").replace("\\\\", "\\")
+            row = "({},{},'{}','',{},0,{:.6f},'20210501000000','20210501000000',{},{},'wikitext',NULL)"
+            rows.append(
+                row.format(
+                    page_id,
+                    namespace,
+                    literal,
+                    rng.randint(0, 1),
+                    rng.random(),
+                    page_id * 7,
+                    rng.randint(10, 10**5),
+                )
+            )
+            expected.append((namespace, title))
+            page_id += 1
+        lines.append("INSERT INTO `page` VALUES {};\n".format(",".join(rows)).encode("utf-8"))
+    return lines, expected
+
+
+def bench_regex(lines: List[bytes]) -> List[Tuple[int, str]]:
+    rows = []
+    for line in lines:
+        for entry in page_item_ex.finditer(line):
+            rows.append((int(entry.group(2)), entry.group(3).decode("utf-8")))
+    return rows
+
+
+def bench_iter_rows(lines: List[bytes]) -> List[Tuple[int, str]]:
+    rows = []
+    for line in lines:
+        for row in iter_rows(line, LineEnum.PAGE):
+            rows.append((row.page_namespace, row.page_title))
+    return rows
+
+
+def bench_parse_columns(lines: List[bytes]) -> List[Tuple[int, str]]:
+    columns = parse_columns(lines, LineEnum.PAGE, ["page_namespace", "page_title"])
+    return list(zip(columns["page_namespace"].tolist(), columns["page_title"].tolist()))
+
+
+def errors(rows: List[Tuple[int, str]], expected: List[Tuple[int, str]]) -> int:
+    wrong = sum(row != want for row, want in zip(rows, expected))
+    return wrong + abs(len(rows) - len(expected))
+
+
+def run(benchmark: Callable, lines: List[bytes]) -> Tuple[list, float]:
+    start = time.perf_counter()
+    rows = benchmark(lines)
+    return rows, time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    arg_parser.add_argument("--statements", type=int, default=200)
+    arg_parser.add_argument("--rows-per-statement", type=int, default=1000)
+    arg_parser.add_argument("--tricky", type=float, default=0.02)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+    lines, expected = make_lines(args.statements, args.rows_per_statement, args.tricky, args.seed)
+    size = sum(len(line) for line in lines) / 2**20
+    print("{} rows, {:.1f} MiB".format(len(expected), size))
+    print("{:<16} {:>10} {:>12} {:>10}".format("benchmark", "seconds", "rows/s", "wrong rows"))
+    for name, benchmark in [
+        ("regex", bench_regex),
+        ("iter_rows", bench_iter_rows),
+        ("parse_columns", bench_parse_columns),
+    ]:
+        rows, seconds = run(benchmark, lines)
+        rate = len(rows) / seconds
+        print(
+            "{:<16} {:>10.3f} {:>12.0f} {:>10}".format(name, seconds, rate, errors(rows, expected))
+        )
+
+
+if __name__ == "__main__":
+    main()
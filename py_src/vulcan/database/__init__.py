@@ -1,2 +1,2 @@
-from .models import PageText, Page, PageLink, PageTalk, PageQuality
+from .models import PageText, Page, PageLink, PageTalk, PageQuality, PageRedirect
 from .config import get_engine, get_sessionmaker
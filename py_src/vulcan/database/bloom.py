@@ -0,0 +1,211 @@
+"""bloom : Bloom filter of committed titles in shared memory, so every ETL worker can
+skip the database when a title certainly hasn't been committed yet
+
+Duplicates are rare (1-2 per 2000 pages), so almost every title is a certain miss
+and only the few probable duplicates need to be checked against the text table.
+
+The filter's bits live in a multiprocessing.shared_memory block laid out as a
+16 byte header (number of bits, number of hashes) followed by the bit array. The
+main process creates the block and workers either inherit the SharedBloomFilter when
+they are forked or attach to the block by name. Bits are set under a
+multiprocessing.Lock, so concurrent adds from different workers can't lose each
+other's bits (a lost bit would be a false negative). Index i of a title is
+(h1 + i * h2) mod bits, with h1 and h2 the two halves of its 128-bit blake2b digest.
+
+The filter can be saved to and loaded from a file, so a resumed build starts with
+every title committed by the previous run.
+"""
+
+import math
+import multiprocessing as mp
+import os
+import struct
+
+from hashlib import blake2b
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import sessionmaker
+
+from .models import PageText
+
+HEADER = struct.Struct("<QQ")  # number of bits, number of hashes
+
+
+def filter_size(capacity: int, error_rate: float) -> tuple:
+    """Optimal (bits, hashes) for capacity items with a false positive rate of
+    error_rate. bits is rounded up to a whole number of bytes"""
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    bits = max(8, bits + (-bits) % 8)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+class SharedBloomFilter:
+    """Bloom filter of strings backed by a shared memory block
+
+    Parameters
+    ----------
+    capacity : int
+        number of titles the filter is sized for. past it the false positive rate
+        climbs above error_rate
+    error_rate : float, optional
+        false positive rate at capacity, by default 0.001
+    lock : multiprocessing.Lock, optional
+        lock held while setting bits, by default None (a new mp.Lock())
+    exact : bool, optional
+        also keep an exact set of the titles this process added, by default False.
+        titles in it are certain duplicates that don't need a database query
+
+    Raises
+    ------
+    TypeError
+        if capacity isn't an int or error_rate isn't a float
+    ValueError
+        if capacity is less than 1 or error_rate isn't between 0 and 1
+    """
+
+    def __init__(
+        self, capacity: int, error_rate: float = 0.001, lock=None, exact: bool = False
+    ) -> None:
+        if not isinstance(capacity, int):
+            msg = "invalid capacity. capacity must be an int, not {}"
+            msg = msg.format(type(capacity))
+            raise TypeError(msg)
+        if not isinstance(error_rate, float):
+            msg = "invalid error_rate. error_rate must be a float, not {}"
+            msg = msg.format(type(error_rate))
+            raise TypeError(msg)
+        if capacity < 1:
+            msg = "capacity ({}) must be at least 1".format(capacity)
+            raise ValueError(msg)
+        if not 0.0 < error_rate < 1.0:
+            msg = "error_rate ({}) must be between 0 and 1".format(error_rate)
+            raise ValueError(msg)
+        bits, hashes = filter_size(capacity, error_rate)
+        shm = SharedMemory(create=True, size=HEADER.size + bits // 8)
+        HEADER.pack_into(shm.buf, 0, bits, hashes)
+        self._init(shm, lock, exact, owner=True)
+
+    def _init(self, shm: SharedMemory, lock, exact: bool, owner: bool) -> None:
+        self.shm = shm
+        self.bits, self.hashes = HEADER.unpack_from(shm.buf, 0)
+        self.lock = lock if lock is not None else mp.Lock()
+        self.exact: Optional[Set[str]] = set() if exact else None
+        # the process that created the block unlinks it (not the workers forked from it)
+        self.owner_pid = os.getpid() if owner else None
+
+    @classmethod
+    def attach(cls, name: str, lock=None, exact: bool = False) -> "SharedBloomFilter":
+        """Attach to the filter in the shared memory block name, created by another
+        process. pass the creator's lock (inherited when the process was started) so
+        adds are serialized with the other processes"""
+        try:  # the creator unlinks the block, not this process's resource tracker
+            shm = SharedMemory(name=name, track=False)  # python >= 3.13
+        except TypeError:  # workers started by multiprocessing share the creator's tracker
+            shm = SharedMemory(name=name)
+        bloom = cls.__new__(cls)
+        bloom._init(shm, lock, exact, owner=False)  # pylint: disable=protected-access
+        return bloom
+
+    @property
+    def name(self) -> str:
+        """name of the shared memory block, for attach()"""
+        return self.shm.name
+
+    def _indices(self, title: str) -> List[int]:
+        digest = blake2b(title.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1  # odd, so the indices don't repeat
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, title: str) -> None:
+        """Add title to the filter"""
+        self.add_many([title])
+
+    def add_many(self, titles: Iterable[str]) -> None:
+        """Add every title in titles to the filter, holding the lock once"""
+        indices = []
+        for title in titles:
+            indices.extend(self._indices(title))
+            if self.exact is not None:
+                self.exact.add(title)
+        buf = self.shm.buf
+        with self.lock:
+            for index in indices:
+                byte = HEADER.size + (index >> 3)
+                buf[byte] = buf[byte] | (1 << (index & 7))
+
+    def __contains__(self, title: str) -> bool:
+        """False if title was certainly never added, True if it probably was"""
+        buf = self.shm.buf
+        for index in self._indices(title):
+            if not buf[HEADER.size + (index >> 3)] & (1 << (index & 7)):
+                return False
+        return True
+
+    def classify(self, titles: Iterable[str]) -> Tuple[Set[str], List[str]]:
+        """Split titles into certain duplicates (in the exact set) and probable
+        duplicates (in the filter) that have to be checked against the database.
+        every other title certainly isn't a duplicate"""
+        certain, probable = set(), []
+        for title in titles:
+            if self.exact is not None and title in self.exact:
+                certain.add(title)
+            elif title in self:
+                probable.append(title)
+        return certain, probable
+
+    def fill_ratio(self) -> float:
+        """Share of bits that are set"""
+        data = bytes(self.shm.buf[HEADER.size : HEADER.size + self.bits // 8])
+        return bin(int.from_bytes(data, "little")).count("1") / self.bits
+
+    def save(self, path: Path) -> None:
+        """Atomically write the filter (header and bits) to path"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with self.lock:
+            data = bytes(self.shm.buf[: HEADER.size + self.bits // 8])
+        with open(tmp_path, "wb") as tmp_file:
+            tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, lock=None, exact: bool = False) -> "SharedBloomFilter":
+        """Create a filter in a new shared memory block from a file written by save()"""
+        with open(path, "rb") as filter_file:
+            data = filter_file.read()
+        bits, _ = HEADER.unpack_from(data, 0)
+        if len(data) != HEADER.size + bits // 8:
+            msg = "{} is truncated: {} bytes for a {} bit filter"
+            msg = msg.format(path, len(data), bits)
+            raise ValueError(msg)
+        shm = SharedMemory(create=True, size=len(data))
+        shm.buf[: len(data)] = data
+        bloom = cls.__new__(cls)
+        bloom._init(shm, lock, exact, owner=True)  # pylint: disable=protected-access
+        return bloom
+
+    def seed_from_db(self, session_gen: sessionmaker, batch_size: int = 10000) -> int:
+        """Add every title already in the text table, and return how many there were"""
+        sess = session_gen()
+        titles = []
+        seeded = 0
+        for row in sess.query(PageText.title).yield_per(batch_size):
+            titles.append(row.title)
+            if len(titles) == batch_size:
+                self.add_many(titles)
+                seeded += len(titles)
+                titles = []
+        self.add_many(titles)
+        sess.close()
+        return seeded + len(titles)
+
+    def close(self) -> None:
+        """Detach from the block, and free it if this process created it"""
+        self.shm.close()
+        if self.owner_pid == os.getpid():
+            self.shm.unlink()
@@ -0,0 +1,270 @@
+"""bulk : load pages into the text table with PostgreSQL COPY instead of the ORM
+
+Every batch is encoded straight from the WikipediaPage lists into COPY's text format,
+copied into a temporary staging table, and moved into text with a single
+INSERT ... ON CONFLICT DO NOTHING. The titles that statement returns are the
+additions; every other page in the batch is a duplicate, either of a page already in
+the database or of an earlier page in the same batch.
+
+If text is hash partitioned (models.create_all_tables with text_partitions), the
+staging table is moved into each partition directly instead, one INSERT per partition
+selecting the rows that hash to it. Every worker visits the partitions in a different
+order (rotated by its pid), so concurrent workers are usually writing to different
+partitions' btrees rather than queueing on the same pages.
+
+COPY is all-or-nothing, so a batch that can't be copied (e.g. a title, heading or
+link longer than its column allows) is rolled back and committed again with
+crud.commit_list_to_db, each page in a savepoint of its own, so only the bad pages
+are lost and they are counted as errors.
+"""
+
+import io
+import multiprocessing as mp
+import re
+
+from os import getpid
+from typing import Iterable, List, Optional, Sequence, TextIO, Tuple
+
+from sqlalchemy.orm import sessionmaker
+
+from ..wikitools import WikipediaPage
+from ..wikitools import WikiXMLFile
+
+from .bloom import SharedBloomFilter
+from .crud import commit_list_to_db
+from .models import PageText
+from .writer import page_size
+
+STAGING_TABLE = "text_staging"
+COLUMNS = ("title", "headings", "sections", "links")
+# the staging table has text's columns but none of its constraints or indexes, and is
+# emptied at the end of every transaction
+CREATE_STAGING = (
+    "CREATE TEMPORARY TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS) "
+    "ON COMMIT DELETE ROWS"
+)
+COPY_STAGING = "COPY {staging} ({columns}) FROM STDIN"
+INSERT_FROM_STAGING = (
+    "INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} "
+    "ON CONFLICT (title) DO NOTHING RETURNING title"
+)
+INSERT_PARTITION_FROM_STAGING = (
+    "INSERT INTO {partition} ({columns}) SELECT {columns} FROM {staging} "
+    "WHERE satisfies_hash_partition({table_oid}, {modulus}, {remainder}, title) "
+    "ON CONFLICT (title) DO NOTHING RETURNING title"
+)
+# hash partitions of a table: name, oid of the parent and bound
+SELECT_PARTITIONS = (
+    "SELECT c.relname, i.inhparent::oid, pg_get_expr(c.relpartbound, c.oid) "
+    "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname"
+)
+hash_bound_ex = re.compile(r"WITH \(modulus (\d+), remainder (\d+)\)", re.IGNORECASE)
+# characters with a meaning in COPY's text format, and their escapes
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+# characters with a meaning inside a quoted array element
+_ARRAY_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"'})
+
+
+def copy_text(value: Optional[str]) -> str:
+    """Encode one field in COPY's text format (None is NULL)"""
+    if value is None:
+        return "\\N"
+    return value.translate(_COPY_ESCAPES)
+
+
+def array_literal(values: Iterable[str]) -> str:
+    """PostgreSQL array literal for a list of strings, with every element quoted so
+    commas, braces, spaces and the string NULL are kept as they are"""
+    return "{" + ",".join('"' + value.translate(_ARRAY_ESCAPES) + '"' for value in values) + "}"
+
+
+def page_row(page: WikipediaPage) -> str:
+    """One line of COPY input for page, with the columns in COLUMNS order"""
+    fields = [
+        copy_text(page.title),
+        copy_text(array_literal(page.headings)),
+        copy_text(array_literal(page.sections)),
+        copy_text(array_literal(page.links)),
+    ]
+    return "\t".join(fields) + "\n"
+
+
+def encode_pages(pages: Iterable[WikipediaPage]) -> io.StringIO:
+    """COPY input for pages, ready to be read from the start"""
+    buffer = io.StringIO()
+    for page in pages:
+        buffer.write(page_row(page))
+    buffer.seek(0)
+    return buffer
+
+
+def encode_rows(rows: Iterable[Sequence]) -> io.StringIO:
+    """COPY input for rows of plain values (str, numbers and None), ready to be read
+    from the start"""
+    buffer = io.StringIO()
+    for row in rows:
+        fields = [copy_text(value if value is None else str(value)) for value in row]
+        buffer.write("\t".join(fields) + "\n")
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows(cursor, table: str, columns: Sequence[str], rows: Iterable[Sequence]) -> None:
+    """COPY rows of plain values into columns of table"""
+    statement = "COPY {} ({}) FROM STDIN".format(table, ", ".join(columns))
+    cursor.copy_expert(statement, encode_rows(rows))
+
+
+def hash_partitions(cursor, table: str) -> List[Tuple[str, int, int, int]]:
+    """(name, parent oid, modulus, remainder) of every hash partition of table, empty
+    if table isn't hash partitioned"""
+    cursor.execute(SELECT_PARTITIONS, (table,))
+    partitions = []
+    for name, table_oid, bound in cursor.fetchall():
+        match = hash_bound_ex.search(bound)
+        if match is None:
+            return []  # partitioned some other way, let PostgreSQL route the rows
+        partitions.append((name, table_oid, int(match.group(1)), int(match.group(2))))
+    return partitions
+
+
+def rotate(items: list, start: int) -> list:
+    """items, starting from index start % len(items)"""
+    if len(items) == 0:
+        return items
+    start %= len(items)
+    return items[start:] + items[:start]
+
+
+def copy_pages(
+    cursor, pages: List[WikipediaPage], table: str = PageText.__tablename__
+) -> List[str]:
+    """Copy pages into table through the staging table, skipping titles that are
+    already in table. titles must be unique within pages. If table is hash
+    partitioned, the pages are inserted into each partition directly
+
+    Parameters
+    ----------
+    cursor : psycopg2 cursor
+        cursor of the connection to load with. the caller commits
+    pages : List[WikipediaPage]
+        pages to load
+    table : str, optional
+        table to load into, by default "text" (PageText)
+
+    Returns
+    -------
+    inserted : List[str]
+        titles of the pages that were added to table
+    """
+    columns = ", ".join(COLUMNS)
+    cursor.execute(CREATE_STAGING.format(staging=STAGING_TABLE, table=table))
+    cursor.copy_expert(
+        COPY_STAGING.format(staging=STAGING_TABLE, columns=columns), encode_pages(pages)
+    )
+    partitions = hash_partitions(cursor, table)
+    if len(partitions) == 0:
+        cursor.execute(
+            INSERT_FROM_STAGING.format(table=table, staging=STAGING_TABLE, columns=columns)
+        )
+        return [row[0] for row in cursor.fetchall()]
+    inserted = []
+    for name, table_oid, modulus, remainder in rotate(partitions, getpid()):
+        statement = INSERT_PARTITION_FROM_STAGING.format(
+            partition=name,
+            columns=columns,
+            staging=STAGING_TABLE,
+            table_oid=table_oid,
+            modulus=modulus,
+            remainder=remainder,
+        )
+        cursor.execute(statement)
+        inserted.extend(row[0] for row in cursor.fetchall())
+    return inserted
+
+
+def copy_list_to_db(
+    file: WikiXMLFile,
+    pages_to_commit: List[WikipediaPage],
+    session_gen: sessionmaker,
+    stats_file: TextIO,
+    duplicates_file: TextIO,
+    title_filter: SharedBloomFilter = None,
+) -> Tuple[int, int, int]:
+    """Write a list of pages to the database with COPY. A drop-in replacement for
+    crud.commit_list_to_db
+
+    Parameters
+    ----------
+    file : WikiXMLFile
+        file the pages are from, for the log messages
+    pages_to_commit : List[WikipediaPage]
+        pages to write. emptied, like commit_list_to_db does
+    session_gen : sessionmaker
+        sessionmaker bound to a PostgreSQL (psycopg2) engine
+    stats_file : TextIO
+        file to log the batch's totals and errors to
+    duplicates_file : TextIO
+        file to write the title of every duplicate page to
+    title_filter : SharedBloomFilter, optional
+        filter to add the copied titles to, by default None. ON CONFLICT already
+        finds the duplicates, so it isn't checked here
+
+    Returns
+    -------
+    Tuple[additions : int, duplicates : int, errors : int]
+    """
+    commit_logger = mp.get_logger()
+    pages = list(pages_to_commit)
+    pages_to_commit.clear()
+    if len(pages) == 0:
+        return 0, 0, 0
+    unique = {}  # title: first page with the title in the batch
+    repeated = []  # titles of the later pages
+    for page in pages:
+        if page.title in unique:
+            repeated.append(page.title)
+        else:
+            unique[page.title] = page
+    sess = session_gen()
+    try:
+        cursor = sess.connection().connection.cursor()
+        inserted = copy_pages(cursor, list(unique.values()))
+        cursor.close()
+        sess.commit()
+    except Exception as msg:  # pylint: disable=broad-except
+        sess.rollback()
+        sess.close()
+        mtext = "pid: {} COPY failed, committing the batch page by page. msg:{}\n"
+        mtext = mtext.format(getpid(), msg)
+        stats_file.write(mtext)
+        commit_logger.warning(mtext)
+        return commit_list_to_db(
+            file, pages, session_gen, stats_file, duplicates_file, title_filter, savepoints=True
+        )
+    sess.close()
+    if title_filter is not None:
+        title_filter.add_many(inserted)
+    additions = len(inserted)
+    inserted = set(inserted)
+    repeated.extend(title for title in unique if title not in inserted)
+    duplicates = len(repeated)
+    for title in repeated:
+        duplicates_file.write(title + "\n")
+    msg = "pid: {} copied. adds - {}/{}\tduplicates - {}/{}\nerrors - {}/{}\ttotal - {}/{} ({:.1f} MB)"
+    msg = msg.format(
+        getpid(),
+        additions,
+        file.additions,
+        duplicates,
+        file.duplicates,
+        0,
+        file.errors,
+        len(pages),
+        file.pages,
+        sum(page_size(page) for page in pages) / 2**20,
+    )
+    commit_logger.info(msg)
+    stats_file.write(msg + "\n")
+    return additions, duplicates, 0
@@ -1,14 +1,43 @@
 import multiprocessing as mp
 
 from os import getpid
-from typing import List, TextIO, Tuple
+from typing import List, Set, TextIO, Tuple
 
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import any_, bindparam, String
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session, sessionmaker
 
 from ..wikitools import WikipediaPage
 from ..wikitools import WikiXMLFile
 
+from .bloom import SharedBloomFilter
 from .models import PageText
+from .writer import page_size
+
+
+def existing_titles(sess: Session, titles: List[str]) -> Set[str]:
+    """Titles in titles that are already in the text table, with a single
+    title = ANY(:titles) query"""
+    if len(titles) == 0:
+        return set()
+    titles_param = bindparam("titles", titles, type_=ARRAY(String(200)))
+    query = sess.query(PageText.title).filter(PageText.title == any_(titles_param))
+    return {row.title for row in query}
+
+
+def split_new(pages: List[WikipediaPage], seen: Set[str]) -> Tuple[List[WikipediaPage], List[str]]:
+    """Split pages into those to add (the first page with each title not in seen) and
+    the titles of the duplicates"""
+    seen = set(seen)
+    to_add, repeated = [], []
+    for page in pages:
+        if page.title in seen:
+            repeated.append(page.title)
+        else:
+            seen.add(page.title)
+            to_add.append(page)
+    return to_add, repeated
 
 
 def commit_list_to_db(
@@ -17,36 +46,88 @@ def commit_list_to_db(
     session_gen: sessionmaker,
     stats_file: TextIO,
     duplicates_file: TextIO,
+    title_filter: SharedBloomFilter = None,
+    savepoints: bool = False,
 ) -> Tuple[int, int, int]:
     """write a list to a database
 
-    takes a list to commit, create a session, check if each page is in the database,
-    note duplicate if duplicate, else stage after all files staged, commit"""
+    takes a list to commit, create a session, find the pages already in the database
+    with one query, note duplicate if duplicate (of a page in the database or one
+    staged earlier from the list), else stage after all files staged, commit
+
+    with a title_filter, only the titles it says are probable duplicates are looked
+    up, and the committed titles are added to it. the filter is only advisory: if
+    the commit hits a title that is already in the table (one committed by another
+    worker since the lookup, or one a filter saved before a crash is missing), the
+    batch is rolled back, every title is looked up and the batch committed again
+
+    if the commit fails otherwise (e.g. a heading or link is too long for its
+    column), the batch is rolled back and every page is added again in a savepoint
+    of its own, so only the bad pages are lost and counted as errors. savepoints=True
+    skips the first attempt, for a batch already known to have a bad page"""
     commit_logger = mp.get_logger()
     sess = session_gen()
     errors = 0
-    additions = 0
-    duplicates = 0
-    for _ in range(len(pages_to_commit)):
-        page = pages_to_commit.pop()
-        if sess.query(PageText).filter_by(title=page.title).first() is None:
-            try:  # if page isn't in db
-                sess.add(page.page())
-                additions += 1
-            except Exception as msg:
+    pages = list(pages_to_commit)
+    pages_to_commit.clear()
+    titles = [page.title for page in pages]
+    if title_filter is None:
+        seen = existing_titles(sess, titles)
+    else:
+        certain, probable = title_filter.classify(titles)
+        seen = certain | existing_titles(sess, probable)
+    to_add, repeated = split_new(pages, seen)
+    added = []
+    failure = None  # why the batch couldn't be committed in one go
+    attempts = 0 if savepoints else 2
+    while attempts != 0:
+        attempts -= 1
+        try:
+            sess.add_all([page.page() for page in to_add])
+            sess.commit()
+            added = [page.title for page in to_add]
+            break
+        except IntegrityError as msg:
+            sess.rollback()
+            failure = msg
+            mtext = "pid: {} a title is already in the table, looking them all up. msg:{}\n"
+            mtext = mtext.format(getpid(), msg)
+            stats_file.write(mtext)
+            commit_logger.warning(mtext)
+            to_add, repeated = split_new(pages, existing_titles(sess, titles))
+        except Exception as msg:  # pylint: disable=broad-except
+            sess.rollback()
+            failure = msg
+            attempts = 0
+    else:  # every attempt failed, or savepoints
+        if failure is not None:
+            mtext = "pid: {} commit failed, committing the batch page by page. msg:{}\n"
+            mtext = mtext.format(getpid(), failure)
+            stats_file.write(mtext)
+            commit_logger.warning(mtext)
+        for page in to_add:
+            try:
+                with sess.begin_nested():  # rolled back alone if the page is bad
+                    sess.add(page.page())
+                added.append(page.title)
+            except IntegrityError:  # committed by another worker meanwhile
+                repeated.append(page.title)
+            except Exception as msg:  # pylint: disable=broad-except
                 errors += 1
                 mtext = "page:{} => msg:{}\n".format(page, msg)
                 stats_file.write(mtext)
                 commit_logger.error(mtext)
-                sess.rollback()
-        else:  # if page is in db
-            duplicates += 1
-            commit_logger.info("pid: %i duplicate %s", getpid(), page.title)
-            duplicates_file.write(page.title + "\n")
-    sess.commit()
+        sess.commit()
     sess.close()
+    additions = len(added)
+    duplicates = len(repeated)
+    for title in repeated:
+        commit_logger.info("pid: %i duplicate %s", getpid(), title)
+        duplicates_file.write(title + "\n")
+    if title_filter is not None:
+        title_filter.add_many(added)
     del sess
-    msg = "pid: {} committed. adds - {}/{}\tduplicates - {}/{}\nerrors - {}/{}\ttotal - {}/{}"
+    msg = "pid: {} committed. adds - {}/{}\tduplicates - {}/{}\nerrors - {}/{}\ttotal - {}/{} ({:.1f} MB)"
     msg = msg.format(
         getpid(),
         additions,
@@ -55,8 +136,9 @@ def commit_list_to_db(
         file.duplicates,
         errors,
         file.errors,
-        file.chunk_size,
+        len(pages),
         file.pages,
+        sum(page_size(page) for page in pages) / 2**20,
     )
     commit_logger.info(msg)
     stats_file.write(msg + "\n")
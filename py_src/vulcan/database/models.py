@@ -23,14 +23,17 @@ https://stackoverflow.com/questions/53063778/case-insensitive-indexing-in-postgr
 https://stackoverflow.com/questions/14419299/adding-indexes-to-sqlalchemy-models-after-table-creation
 """
 
-from sqlalchemy import func, Column, Integer, Text, String
+from typing import List
+
+from sqlalchemy import func, inspect, text, Column, Integer, Text, String
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.engine.base import Engine
+from sqlalchemy.engine.interfaces import Dialect
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.hybrid import Comparator, hybrid_property
 from sqlalchemy.orm import relationship
-from sqlalchemy.schema import ForeignKey
+from sqlalchemy.schema import CreateTable, ForeignKey
 
 from .utils import create_logger
 
@@ -69,6 +72,16 @@ class PageText(Base):
         list of section headings
     sections : ARRAY(TEXT)
         list containing the text content under each heading
+
+    Partitioning
+    ------------
+    The table can be created hash partitioned by title (create_all_tables with
+    text_partitions), so parallel loaders insert into several smaller btrees instead
+    of one, and each partition is vacuumed/analyzed on its own. Queries on title
+    (PageText.title == ...) are pruned to a single partition. title_insensitive
+    compares lower(title), which the hash can't prune, so it uses the lower(title)
+    index of every partition (database.indices creates it on the parent table, which
+    creates it on each partition)
     """
 
     __tablename__ = "text"
@@ -212,6 +225,43 @@ class PageTalk(Base):
         return CaseInsensitiveComparator(cls.page_title)
 
 
+class PageRedirect(Base):
+    """ORM class for representing a redirect from one ns 0 page to another
+
+    Redirect pages aren't in Page, so links to them from PageText.links don't resolve
+    without this table (or a database.redirect.RedirectMap built from it)
+
+    Properties
+    ----------
+    __tablename__ : redirect
+
+    Columns
+    -------
+    rd_from : Integer
+        id of the redirect page
+    rd_from_title : String(200)
+        title of the redirect page, None until it's loaded from the page table
+    rd_title : String(200)
+        title of the page the redirect points to (possibly another redirect)
+    rd_fragment : String(255)
+        section of rd_title the redirect points to, None for the whole page
+    """
+
+    __tablename__ = "redirect"
+    rd_from = Column(Integer, primary_key=True)
+    rd_from_title = Column(String(200), index=True)
+    rd_title = Column(String(200))
+    rd_fragment = Column(String(255))
+
+    def __repr__(self):
+        msg = "<PageRedirect: (\n\t"
+        msg += "rd_from={},\n\t".format(self.rd_from)
+        msg += "rd_from_title='{}',\n\t".format(self.rd_from_title)
+        msg += "rd_title='{}',\n\t".format(self.rd_title)
+        msg += ")>"
+        return msg
+
+
 class PageQuality(Base):
     """ORM class for representing the quality of a page
 
@@ -267,6 +317,10 @@ def drop_recreate_all_tables_except_text(eng: Engine) -> None:
         PageTalk.__table__.drop(eng)
     except ProgrammingError:
         logger.info("Table talk does not exist")
+    try:
+        PageRedirect.__table__.drop(eng)
+    except ProgrammingError:
+        logger.info("Table redirect does not exist")
     try:
         Page.__table__.drop(eng)
     except ProgrammingError:
@@ -274,14 +328,77 @@ def drop_recreate_all_tables_except_text(eng: Engine) -> None:
     create_all_tables(eng)
 
 
-def create_all_tables(eng: Engine) -> None:
+# 1 if a table is partitioned, else 0
+COUNT_PARTITIONED = text(
+    "SELECT count(*) FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+)
+
+
+def partitioned_text_ddl(dialect: Dialect, partitions: int) -> List[str]:
+    """CREATE TABLE statements for PageText's table hash partitioned by title into
+    partitions tables named text_p0, text_p1, ...
+
+    A partitioned table's primary key must include the partition key, so title (the
+    primary key) is the only column the table can be partitioned by
+
+    Raises
+    ------
+    TypeError
+        if partitions isn't an int
+    ValueError
+        if partitions < 2
+    """
+    if not isinstance(partitions, int):
+        msg = "partitions must be an int. invalid partitions: {}"
+        msg = msg.format(partitions)
+        raise TypeError(msg)
+    if partitions < 2:
+        msg = "partitions ({}) must be at least 2"
+        msg = msg.format(partitions)
+        raise ValueError(msg)
+    table = PageText.__tablename__
+    create = str(CreateTable(PageText.__table__).compile(dialect=dialect)).strip()
+    statements = [create + " PARTITION BY HASH (title)"]
+    for remainder in range(partitions):
+        statement = (
+            "CREATE TABLE {table}_p{remainder} PARTITION OF {table} "
+            "FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+        )
+        statements.append(statement.format(table=table, modulus=partitions, remainder=remainder))
+    return statements
+
+
+def create_all_tables(eng: Engine, text_partitions: int = 0) -> None:
     """create all tables, won't overwrite if tables exist
 
     Parameters
     ----------
     eng : Engine
         Engine to create the tables on
+    text_partitions : int, optional
+        if the text table doesn't exist yet, create it hash partitioned by title
+        into text_partitions partitions, by default 0 (not partitioned)
+
+    Raises
+    ------
+    ValueError
+        if text_partitions is given but text exists and isn't partitioned
     """
+    logger = create_logger()
+    if text_partitions != 0:
+        if not inspect(eng).has_table(PageText.__tablename__):
+            with eng.begin() as conn:
+                for statement in partitioned_text_ddl(eng.dialect, text_partitions):
+                    conn.execute(text(statement))
+            logger.info("Created text with %i hash partitions", text_partitions)
+        else:
+            with eng.connect() as conn:
+                partitioned = conn.execute(
+                    COUNT_PARTITIONED, {"table": PageText.__tablename__}
+                ).scalar()
+            if partitioned == 0:
+                msg = "text already exists and isn't partitioned. drop it or use text_partitions=0"
+                raise ValueError(msg)
     Base.metadata.create_all(eng)
 
 
@@ -1,22 +1,219 @@
+"""sql : read the INSERT INTO lines of Wikipedia's MySQL table dumps
+
+Each line is a single INSERT INTO `table` VALUES (...),(...),...; statement. Each
+LineEnum has a column schema (the leading columns of its table, in dump order) that
+is compiled into one regular expression per table, matching a whole row: a group per
+schema column, then any further columns skipped. Quoted strings are matched with
+their backslash escapes, so quotes, commas and parentheses inside titles don't break
+rows apart, and the alternatives never overlap, so nothing backtracks across a long
+line. Rows must follow each other with only a comma between them; anything else
+raises ValueError instead of being silently skipped.
+"""
+from collections import namedtuple
 from pathlib import Path
+import gzip
+import mmap
 import re
 from enum import Enum
-from typing import BinaryIO, Iterable
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Pattern, Sequence, Tuple
+
+import numpy as np
 
 from pydantic import validate_arguments
 
 line_start_ex = re.compile(b"INSERT INTO (.*?) VALUES ")
-# pylint: disable=anomalous-backslash-in-string
-categorylink_item_ex = re.compile(b"\((.*?),'(.*?)','(.*?)','(.*?)','(.*?)','(.*?)','(.*?)'\)")
-page_item_ex = re.compile(b"\((.*?),(.*?),'(.*?)',(.*?),(.*?),(.*?)\)")
-link_item_ex = re.compile(b"\((.*?),(.*?),'(.*?)',(.*?)\)")
+STATEMENT_START = b"INSERT INTO "
+QUOTED = rb"'[^'\\]*(?:\\.[^'\\]*)*'"  # a quoted string, with backslash escapes
+VALUE_PATTERNS = {
+    int: rb"(-?\d+|NULL)",
+    float: rb"([-+0-9.eE]+|NULL)",
+    str: rb"(" + QUOTED + rb"|[^,')]+)",  # usually quoted, but NULL or a number too
+}
+REST_OF_ROW = rb"(?:,(?:" + QUOTED + rb"|[^,')]*))*\)"  # columns left out of the schema
+escape_ex = re.compile(rb"\\(.)", re.DOTALL)
+MYSQL_ESCAPES = {
+    b"0": b"\x00",
+    b"b": b"\b",
+    b"n": b"\n",
+    b"r": b"\r",
+    b"t": b"\t",
+    b"Z": b"\x1a",
+}
 
 
 class LineEnum(str, Enum):
     CATEGORYLINK = "categorylink"
     LINK = "link"
     PAGE = "page"
-    # redirect = "redirect"
+    REDIRECT = "redirect"
+
+
+# leading columns of each table, in dump order. later columns are skipped
+SCHEMAS: Dict[LineEnum, Tuple[Tuple[str, type], ...]] = {
+    LineEnum.CATEGORYLINK: (
+        ("cl_from", int),
+        ("cl_to", str),
+        ("cl_sortkey", str),
+        ("cl_timestamp", str),
+        ("cl_sortkey_prefix", str),
+        ("cl_collation", str),
+        ("cl_type", str),
+    ),
+    LineEnum.LINK: (
+        ("pl_from", int),
+        ("pl_namespace", int),
+        ("pl_title", str),
+        ("pl_from_namespace", int),
+    ),
+    LineEnum.PAGE: (
+        ("page_id", int),
+        ("page_namespace", int),
+        ("page_title", str),
+        ("page_restrictions", str),
+        ("page_is_redirect", int),
+    ),
+    LineEnum.REDIRECT: (
+        ("rd_from", int),
+        ("rd_namespace", int),
+        ("rd_title", str),
+        ("rd_interwiki", str),
+        ("rd_fragment", str),
+    ),
+}
+NUMPY_TYPES = {int: np.int64, float: np.float64, str: object}
+
+
+def compile_row_ex(schema: Sequence[Tuple[str, type]]) -> Pattern:
+    """Regular expression matching one row, with a group for each column of schema"""
+    columns = rb",".join(VALUE_PATTERNS[kind] for _, kind in schema)
+    return re.compile(rb"\(" + columns + REST_OF_ROW, re.DOTALL)
+
+
+ROW_EXES = {line_type: compile_row_ex(schema) for line_type, schema in SCHEMAS.items()}
+ROW_TYPES = {
+    line_type: namedtuple(line_type.value.capitalize() + "Row", [name for name, _ in schema])
+    for line_type, schema in SCHEMAS.items()
+}
+
+
+def unescape(value: bytes) -> bytes:
+    """Undo MySQL's backslash escapes in a quoted string's contents"""
+    if b"\\" not in value:
+        return value
+    return escape_ex.sub(lambda match: MYSQL_ESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def convert(value: bytes, kind: type):
+    """Convert a column matched by a row expression (quotes included) to kind. NULL
+    is None"""
+    if value == b"NULL":
+        return None
+    if kind is str:
+        if value[:1] != b"'":
+            return value.decode("ascii")
+        return unescape(value[1:-1]).decode("utf-8", errors="replace")
+    return kind(value)
+
+
+def iter_values(line: bytes, line_type: LineEnum) -> Iterator[Tuple[bytes, ...]]:
+    """Yield the raw values (quotes included) of the schema columns of every row in an
+    INSERT INTO line of a line_type table
+
+    Raises
+    ------
+    ValueError
+        if line isn't an INSERT INTO ... VALUES statement, or has something that
+        isn't a row of the schema between its rows
+    """
+    start = line_start_ex.search(line)
+    if start is None:
+        msg = "not an INSERT INTO ... VALUES statement: {!r}"
+        msg = msg.format(line[:80])
+        raise ValueError(msg)
+    pos = end = start.end()
+    for match in ROW_EXES[line_type].finditer(line, pos):
+        if pos != start.end() and line[end:pos] != b",":
+            msg = "invalid {} row separator at byte {}: {!r}"
+            msg = msg.format(line_type.value, end, line[end : end + 80])
+            raise ValueError(msg)
+        if match.start() != pos:
+            msg = "invalid {} row at byte {}: {!r}"
+            msg = msg.format(line_type.value, pos, line[pos : pos + 80])
+            raise ValueError(msg)
+        end = match.end()
+        pos = end + 1  # skip the comma between rows
+        yield match.groups()
+    if line[end:].strip() not in (b";", b""):
+        msg = "invalid {} row at byte {}: {!r}"
+        msg = msg.format(line_type.value, end, line[end : end + 80])
+        raise ValueError(msg)
+
+
+def iter_rows(line: bytes, line_type: LineEnum) -> Iterator[tuple]:
+    """Yield every row of an INSERT INTO line as a ROW_TYPES[line_type] namedtuple
+    with the typed values of the schema's columns
+
+    Raises
+    ------
+    ValueError
+        see iter_values
+    """
+    kinds = [kind for _, kind in SCHEMAS[line_type]]
+    row_type = ROW_TYPES[line_type]
+    for values in iter_values(line, line_type):
+        yield row_type(*[convert(value, kind) for value, kind in zip(values, kinds)])
+
+
+def parse_columns(
+    lines: Iterable[bytes], line_type: LineEnum, columns: Sequence[str] = None
+) -> Dict[str, np.ndarray]:
+    """Parse a batch of INSERT INTO lines into one numpy array per column
+
+    Parameters
+    ----------
+    lines : Iterable[bytes]
+        INSERT INTO lines of a line_type table
+    line_type : LineEnum
+        table the lines are from
+    columns : Sequence[str], optional
+        names of the columns to keep, by default None (every column of the schema)
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        column name: values. int columns are int64 (NULL isn't allowed), float
+        columns float64 (NULL is nan), str columns object arrays of str/None
+
+    Raises
+    ------
+    ValueError
+        if a column isn't in the schema, or see iter_values
+    """
+    schema = SCHEMAS[line_type]
+    if columns is None:
+        columns = [name for name, _ in schema]
+    index = {name: (i, kind) for i, (name, kind) in enumerate(schema)}
+    for name in columns:
+        if name not in index:
+            msg = "{} isn't a column of {}. columns: {}"
+            msg = msg.format(name, line_type.value, list(index))
+            raise ValueError(msg)
+    picked = [index[name] for name in columns]
+    raw: List[list] = [[] for _ in columns]
+    for line in lines:
+        for values in iter_values(line, line_type):
+            for column, (i, _) in zip(raw, picked):
+                column.append(values[i])
+    arrays = {}
+    for name, (_, kind), column in zip(columns, picked, raw):
+        if kind is str:
+            arrays[name] = np.array([convert(value, str) for value in column], dtype=object)
+        elif b"NULL" in column:
+            values = [np.nan if value == b"NULL" else kind(value) for value in column]
+            arrays[name] = np.array(values, dtype=NUMPY_TYPES[kind])
+        else:  # numpy parses the digits itself
+            arrays[name] = np.array(column, dtype=np.bytes_).astype(NUMPY_TYPES[kind])
+    return arrays
 
 
 def data_lines_generator(file: BinaryIO):
@@ -25,17 +222,77 @@ def data_lines_generator(file: BinaryIO):
             yield line
 
 
+def open_sql_lines(sql_file: Path) -> Iterator[bytes]:
+    """Yield every INSERT INTO line of a .sql or .sql.gz file, streaming it (gzip
+    files are decompressed on the fly, never to disk)"""
+    opener = gzip.open if sql_file.suffix == ".gz" else open
+    with opener(sql_file, "rb") as file:
+        yield from data_lines_generator(file)
+
+
+def find_statement_ranges(data: bytes, num_ranges: int) -> List[Tuple[int, int]]:
+    """Split a mysqldump into about num_ranges byte ranges that each start at the
+    beginning of an INSERT INTO line, so every range can be parsed on its own
+
+    Parameters
+    ----------
+    data : bytes
+        the whole dump, e.g. an mmap.mmap of the .sql file
+    num_ranges : int
+        number of ranges to aim for. fewer are returned if there are fewer
+        statements, or if some statements are longer than len(data) / num_ranges
+
+    Returns
+    -------
+    ranges : List[Tuple[int, int]]
+        (start, end) byte offsets, in order, covering every statement. the header
+        before the first statement isn't included
+    """
+    if data[: len(STATEMENT_START)] == STATEMENT_START:
+        first = 0
+    else:
+        first = data.find(b"\n" + STATEMENT_START)
+        first = -1 if first == -1 else first + 1
+    if first == -1:
+        return []
+    starts = [first]
+    step = max(1, (len(data) - first) // max(1, num_ranges))
+    for target in range(first + step, len(data), step):
+        if target <= starts[-1]:
+            continue  # the previous statement ran past this target
+        start = data.find(b"\n" + STATEMENT_START, target - 1)
+        if start == -1:
+            break
+        starts.append(start + 1)
+    return list(zip(starts, starts[1:] + [len(data)]))
+
+
+def iter_statements(data: bytes, start: int, end: int) -> Iterator[bytes]:
+    """Yield each INSERT INTO line that starts in data[start:end]. start must be the
+    start of a line, like the ranges from find_statement_ranges"""
+    if data[start : start + len(STATEMENT_START)] == STATEMENT_START:
+        pos = start
+    else:
+        pos = data.find(b"\n" + STATEMENT_START, start)
+        pos = -1 if pos == -1 else pos + 1
+    while pos != -1 and pos < end:
+        line_end = data.find(b"\n", pos)
+        line_end = len(data) if line_end == -1 else line_end + 1
+        yield data[pos:line_end]
+        pos = data.find(b"\n" + STATEMENT_START, line_end - 1)
+        pos = -1 if pos == -1 else pos + 1
+
+
+def map_sql_file(sql_file: Path) -> mmap.mmap:
+    """Read-only memory map of an uncompressed .sql file"""
+    with open(sql_file, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
 @validate_arguments
 def get_line_iterator(line: bytes, line_type: LineEnum) -> Iterable:
+    """iter_rows(line, line_type), or None if line isn't an INSERT INTO statement"""
     if line_start_ex.search(line) is not None:
-        if line_type is LineEnum.CATEGORYLINK:
-            item_iter = categorylink_item_ex.finditer(line)
-        elif line_type is LineEnum.LINK:
-            item_iter = link_item_ex.finditer(line)
-        elif line_type is LineEnum.PAGE:
-            item_iter = page_item_ex.finditer(line)
-        # elif line_type is LineEnum.redirect:
-        #     pass # need to build
-        return item_iter
+        return iter_rows(line, line_type)
     else:
         return None
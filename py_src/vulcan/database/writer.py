@@ -0,0 +1,347 @@
+"""writer : commit batches of pages in a background thread while the next batch is parsed
+
+Without a writer, a worker stops parsing for the whole of every commit, and the
+database sits idle while the next batch is parsed. A BatchWriter hands each batch to
+a thread of its own through a bounded queue: one batch is committed while the worker
+keeps parsing, and at most queue_size more wait their turn. When the database falls
+behind, submit blocks until there is room on the queue, so a slow database slows the
+parser down instead of letting parsed pages pile up in memory.
+
+The commit (psycopg2 COPY, or the ORM) spends most of its time waiting on the
+server with the GIL released, so it overlaps with parsing in the same process.
+
+Every batch's statistics are kept as a BatchStats, and written to the stats file as
+soon as the batch is committed. Commits run in the writer thread, so the "commit"
+stage of timer() overlaps the parsing stages of the worker's timer, and the
+"commit_wait" stage is the time the parser was actually held up by the database.
+
+A fixed number of pages per batch is a poor fit for a dump where a page is anything
+from a stub to a featured article hundreds of times its size. A BatchSizer ends a
+batch once its pages hold a number of bytes of text instead, and after every commit
+moves that limit towards the bytes the database can commit in target_seconds, within
+configured bounds. Memory per batch stays bounded and commits stay about as long as
+the target, whatever the pages are like.
+"""
+import queue
+import threading
+
+from os import getpid
+from time import perf_counter_ns
+from typing import Callable, List, NamedTuple, Optional, TextIO
+
+from ..wikitools import WikipediaPage
+from ..wikitools.timing import StageTimer
+
+_STOP = object()  # put on the queue after the last batch
+
+
+class BatchStats(NamedTuple):
+    """Statistics of one committed batch (times in nanoseconds)"""
+
+    batch: int  # 0 for the first batch submitted
+    pages: int
+    size: int  # bytes of text in the pages, 0 without a BatchSizer
+    limit: int  # the BatchSizer's byte limit when the batch was submitted
+    blocked_ns: int  # submit waited for room on the queue
+    queued_ns: int  # from submit returning to the commit starting
+    commit_ns: int
+
+    def msg(self) -> str:
+        msg = "pid: {} batch {}: {} pages, {:.1f}/{:.1f} MB. "
+        msg += "blocked {:.3f}s, queued {:.3f}s, committed in {:.3f}s"
+        return msg.format(
+            getpid(),
+            self.batch,
+            self.pages,
+            self.size / 2**20,
+            self.limit / 2**20,
+            self.blocked_ns / 1e9,
+            self.queued_ns / 1e9,
+            self.commit_ns / 1e9,
+        )
+
+
+def page_size(page: WikipediaPage) -> int:
+    """Characters of text in page, about the bytes of its COPY row and of memory it
+    holds"""
+    size = len(page.title)
+    for strings in (page.headings, page.sections, page.links):
+        size += sum(len(string) for string in strings)
+    return size
+
+
+class BatchSizer:
+    """Decides when a batch of pages is full, by the bytes of text in it, and adapts
+    the byte limit to the commit latency
+
+    Parameters
+    ----------
+    target_seconds : float, optional
+        commit latency to aim for, by default 2.0
+    min_bytes : int, optional
+        smallest byte limit, by default 4 MB
+    max_bytes : int, optional
+        largest byte limit, by default 256 MB. bounds the memory held by a batch
+        (a page larger than the limit is a batch on its own)
+    max_pages : int, optional
+        pages a batch can hold however small they are, by default 20000
+    start_bytes : int, optional
+        byte limit until the first commit, by default None (min_bytes)
+
+    Raises
+    ------
+    ValueError
+        if target_seconds isn't positive, or the byte limits aren't
+        1 <= min_bytes <= start_bytes <= max_bytes, or max_pages < 1
+    """
+
+    def __init__(
+        self,
+        target_seconds: float = 2.0,
+        min_bytes: int = 4 << 20,
+        max_bytes: int = 256 << 20,
+        max_pages: int = 20000,
+        start_bytes: int = None,
+    ) -> None:
+        if start_bytes is None:
+            start_bytes = min_bytes
+        if target_seconds <= 0:
+            msg = "target_seconds ({}) must be positive"
+            msg = msg.format(target_seconds)
+            raise ValueError(msg)
+        if not 1 <= min_bytes <= start_bytes <= max_bytes:
+            msg = "byte limits must be 1 <= min_bytes ({}) <= start_bytes ({}) <= max_bytes ({})"
+            msg = msg.format(min_bytes, start_bytes, max_bytes)
+            raise ValueError(msg)
+        if max_pages < 1:
+            msg = "max_pages ({}) must be at least 1"
+            msg = msg.format(max_pages)
+            raise ValueError(msg)
+        self.target_seconds = target_seconds
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.limit = start_bytes
+        self.pages = 0  # in the batch being filled
+        self.size = 0
+
+    def add(self, page: WikipediaPage) -> bool:
+        """Count page in the batch being filled, and return True if the batch is full"""
+        self.pages += 1
+        self.size += page_size(page)
+        return self.full()
+
+    def full(self) -> bool:
+        """Has the batch being filled reached the byte or page limit?"""
+        return self.size >= self.limit or self.pages >= self.max_pages
+
+    def take(self) -> int:
+        """Bytes of the batch being filled, starting a new batch"""
+        size = self.size
+        self.pages, self.size = 0, 0
+        return size
+
+    def observe(self, size: int, commit_ns: int) -> None:
+        """Move the limit halfway towards the bytes that commit in target_seconds at the
+        rate a batch of size bytes committed in commit_ns"""
+        if size == 0 or commit_ns <= 0:
+            return
+        ideal = size * self.target_seconds * 1e9 / commit_ns
+        limit = int((self.limit + ideal) / 2)
+        self.limit = min(max(limit, self.min_bytes), self.max_bytes)
+
+
+class BatchWriter:
+    """Context manager that commits batches in a background thread, in the order they
+    are submitted
+
+    Parameters
+    ----------
+    commit : Callable[[List], None]
+        commits a batch. only ever called from one thread at a time
+    queue_size : int, optional
+        batches that can wait while another is committed, by default 1. 0 commits
+        every batch in the submitting thread, without a background thread
+    stats_file : TextIO, optional
+        file to write every batch's BatchStats.msg() to, by default None. written
+        from the writer thread, so the caller shouldn't write to it until close()
+    sizer : BatchSizer, optional
+        sizer the caller fills batches with, by default None. every submit takes
+        the sizer's batch, and every commit's latency adapts its limit
+
+    Raises
+    ------
+    TypeError
+        if queue_size isn't an int
+    ValueError
+        if queue_size < 0
+
+    Notes
+    -----
+    If commit raises, the batches still on the queue are dropped and the exception is
+    re-raised by the next submit() or by close(). If the body of the with statement
+    raises, the batch being committed is finished and the rest are dropped.
+    """
+
+    def __init__(
+        self,
+        commit: Callable[[List], None],
+        queue_size: int = 1,
+        stats_file: TextIO = None,
+        sizer: BatchSizer = None,
+    ) -> None:
+        if not isinstance(queue_size, int):
+            msg = "queue_size must be an int. invalid queue_size: {}"
+            msg = msg.format(queue_size)
+            raise TypeError(msg)
+        if queue_size < 0:
+            msg = "queue_size ({}) must be at least 0"
+            msg = msg.format(queue_size)
+            raise ValueError(msg)
+        self.commit = commit
+        self.queue_size = queue_size
+        self.stats_file = stats_file
+        self.sizer = sizer
+        if sizer is not None:
+            sizer.take()  # drop what a previous writer didn't submit
+        self.batches: List[BatchStats] = []
+        self._submitted = 0
+        self._error: Optional[Exception] = None
+        self._stop = threading.Event()
+        self._closed = False
+        self._thread = None
+        if queue_size != 0:
+            # a slot for the batch being committed and every batch that can wait
+            self._slots = threading.Semaphore(queue_size + 1)
+            self._queue = queue.SimpleQueue()
+            self._thread = threading.Thread(target=self._write, name="writer", daemon=True)
+            self._thread.start()
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _commit(
+        self,
+        batch: int,
+        pages: List,
+        size: int,
+        limit: int,
+        on_commit: Optional[Callable],
+        blocked: int,
+        queued: int,
+    ) -> None:
+        num_pages = len(pages)  # commit_list_to_db empties the list
+        start = perf_counter_ns()
+        self.commit(pages)
+        commit_ns = perf_counter_ns() - start
+        if self.sizer is not None:
+            self.sizer.observe(size, commit_ns)
+        if on_commit is not None:
+            on_commit()
+        stats = BatchStats(batch, num_pages, size, limit, blocked, start - queued, commit_ns)
+        self.batches.append(stats)
+        if self.stats_file is not None:
+            self.stats_file.write(stats.msg() + "\n")
+
+    def _write(self) -> None:
+        """Background thread: commit the queued batches until _STOP"""
+        while not self._stop.is_set():
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            try:
+                self._commit(*item)
+            except Exception as e:  # pylint: disable=broad-except
+                self._error = e  # re-raised in the submitting thread
+                self._stop.set()
+            self._slots.release()
+
+    def _raise(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        raise ValueError("the writer was closed")
+
+    def submit(self, pages: List, on_commit: Callable[[], None] = None) -> None:
+        """Commit pages after the batches already submitted, blocking while queue_size
+        batches are waiting
+
+        Parameters
+        ----------
+        pages : List
+            batch to commit. the writer owns it from now on, so don't reuse it
+        on_commit : Callable[[], None], optional
+            called (in the writer thread) once pages are committed, e.g. to save a
+            checkpoint, by default None
+        """
+        if self._closed or self._stop.is_set():
+            self._raise()
+        batch = self._submitted
+        self._submitted += 1
+        size, limit = 0, 0
+        if self.sizer is not None:
+            size, limit = self.sizer.take(), self.sizer.limit
+        start = perf_counter_ns()
+        if self._thread is None:
+            self._commit(batch, pages, size, limit, on_commit, 0, start)
+            return
+        while not self._slots.acquire(timeout=0.1):
+            if self._stop.is_set():
+                self._raise()
+        queued = perf_counter_ns()
+        self._queue.put((batch, pages, size, limit, on_commit, queued - start, queued))
+
+    def close(self) -> None:
+        """Commit every batch still on the queue and stop the writer thread
+
+        Raises
+        ------
+        Exception
+            whatever commit raised, if it failed
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            if self._error is not None:
+                self._raise()
+
+    def abort(self) -> None:
+        """Stop the writer thread once the batch being committed is, dropping the rest"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._stop.set()
+            self._queue.put(_STOP)  # in case the thread is waiting on an empty queue
+            self._thread.join()
+
+    def timer(self) -> StageTimer:
+        """StageTimer with a "commit" stage (time committing) and a "commit_wait" stage
+        (time submit blocked on a full queue) over every committed batch"""
+        timer = StageTimer()
+        for stats in self.batches:
+            timer.add("commit", stats.commit_ns)
+            if stats.blocked_ns != 0:
+                timer.add("commit_wait", stats.blocked_ns)
+        return timer
+
+    def stats_msg(self) -> str:
+        """Totals over every committed batch, for the stats file"""
+        timer = self.timer()
+        msg = "writer: {} batches, {} pages, {:.1f} MB. committing {:.1f}s, parser blocked {:.1f}s"
+        return msg.format(
+            len(self.batches),
+            sum(stats.pages for stats in self.batches),
+            sum(stats.size for stats in self.batches) / 2**20,
+            timer.seconds("commit"),
+            timer.seconds("commit_wait"),
+        )
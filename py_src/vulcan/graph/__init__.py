@@ -0,0 +1,2 @@
+from .csr import CSRGraph
+from .build import build_csr
@@ -0,0 +1,305 @@
+"""build : build a CSRGraph from a stream of links too big to sort in memory
+
+build_csr is an external distribution sort in three passes over the links:
+
+1. spill: every chunk of (source, target) page ids is mapped to node indices and
+   appended to a spill file, while the out- and in-degree of every node is counted.
+   Only the per-node counts (two int64 arrays) stay in memory.
+2. distribute: the counts split the nodes into ranges holding about memory_edges links
+   each, and the spill file is read in chunks and each link appended to its range's
+   bucket file.
+3. sort: one bucket at a time is read into memory, sorted and deduplicated, and its
+   neighbours appended to the CSR array. Buckets are in node order, so the array is
+   written sequentially and the offsets follow from the deduplicated degrees.
+
+Steps 2 and 3 run once by source (out-neighbours) and once by target (in-neighbours).
+Peak memory is about memory_edges links plus the per-node arrays, whatever the number
+of links.
+"""
+import shutil
+
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from sqlalchemy.orm import sessionmaker
+
+from database.models import Page
+from database.redirect import RedirectMap
+from database.sql import LineEnum, open_sql_lines, parse_columns
+from wikitools.transliterate import transliterate_cached
+from .csr import (
+    ARRAY_NAMES,
+    CSRGraph,
+    NODE_DTYPE,
+    OFFSETS_DTYPE,
+    PAGE_IDS_NAME,
+    save_meta,
+)
+
+SPILL_NAME = "edges.spill"
+BUCKET_NAME = "bucket_{}.spill"
+
+
+def to_nodes(page_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Node index of each of ids in the sorted page_ids, -1 where it isn't a node"""
+    if len(page_ids) == 0:
+        return np.full(len(ids), -1, dtype=np.int64)
+    nodes = np.searchsorted(page_ids, ids)
+    clipped = np.minimum(nodes, len(page_ids) - 1)
+    return np.where(page_ids[clipped] == ids, clipped, -1)
+
+
+def spill_edges(
+    edge_chunks: Iterable[Tuple[np.ndarray, np.ndarray]], page_ids: np.ndarray, spill: BinaryIO
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Append the (source, target) nodes of every link between two nodes to spill
+
+    Returns
+    -------
+    out_counts, in_counts : np.ndarray
+        number of spilled links from and to each node, including repeated links
+    dropped : int
+        links with a source or target that isn't a node
+    """
+    num_nodes = len(page_ids)
+    out_counts = np.zeros(num_nodes, dtype=OFFSETS_DTYPE)
+    in_counts = np.zeros(num_nodes, dtype=OFFSETS_DTYPE)
+    dropped = 0
+    for sources, targets in edge_chunks:
+        sources = to_nodes(page_ids, np.asarray(sources, dtype=np.int64))
+        targets = to_nodes(page_ids, np.asarray(targets, dtype=np.int64))
+        keep = (sources != -1) & (targets != -1)
+        dropped += len(keep) - int(np.count_nonzero(keep))
+        pairs = np.empty((int(np.count_nonzero(keep)), 2), dtype=NODE_DTYPE)
+        pairs[:, 0] = sources[keep]
+        pairs[:, 1] = targets[keep]
+        out_counts += np.bincount(pairs[:, 0], minlength=num_nodes)
+        in_counts += np.bincount(pairs[:, 1], minlength=num_nodes)
+        pairs.tofile(spill)
+    return out_counts, in_counts, dropped
+
+
+def bucket_bounds(counts: np.ndarray, memory_edges: int) -> List[int]:
+    """Split the nodes into ranges [bounds[i], bounds[i + 1]) of about memory_edges
+    links each. A node with more links than that gets a range of its own"""
+    cumulative = np.cumsum(counts)
+    bounds = [0]
+    while bounds[-1] < len(counts):
+        start = bounds[-1]
+        before = int(cumulative[start - 1]) if start != 0 else 0
+        end = int(np.searchsorted(cumulative, before + memory_edges, "right"))
+        bounds.append(max(end, start + 1))
+    return bounds
+
+
+def iter_spill(spill_path: Path, chunk_edges: int) -> Iterator[np.ndarray]:
+    """(n, 2) arrays of the spilled (source, target) nodes, chunk_edges at a time"""
+    with open(spill_path, "rb") as spill:
+        while True:
+            pairs = np.fromfile(spill, dtype=NODE_DTYPE, count=2 * chunk_edges)
+            if len(pairs) == 0:
+                return
+            if len(pairs) % 2 != 0:
+                msg = "{} is truncated"
+                msg = msg.format(spill_path)
+                raise ValueError(msg)
+            yield pairs.reshape(-1, 2)
+
+
+def write_direction(
+    spill_path: Path,
+    key: int,
+    counts: np.ndarray,
+    page_ids: np.ndarray,
+    memory_edges: int,
+    offsets_path: Path,
+    neighbours_path: Path,
+) -> int:
+    """Write the CSR offsets and neighbours of the spilled links grouped by column key
+    of the spill (0: by source, for out-neighbours. 1: by target, for in-neighbours)
+
+    Returns
+    -------
+    num_edges : int
+        distinct links written
+    """
+    num_nodes = len(page_ids)
+    bounds = bucket_bounds(counts, memory_edges)
+    bucket_paths = [spill_path.with_name(BUCKET_NAME.format(i)) for i in range(len(bounds) - 1)]
+    if len(bucket_paths) == 1:
+        bucket_paths = [spill_path]  # everything fits in memory, no need to distribute
+    else:
+        buckets = [open(path, "wb") for path in bucket_paths]
+        try:
+            for pairs in iter_spill(spill_path, memory_edges):
+                bucket_of = np.searchsorted(bounds, pairs[:, key], "right") - 1
+                order = np.argsort(bucket_of, kind="stable")
+                sizes = np.bincount(bucket_of, minlength=len(buckets))
+                start = 0
+                for bucket, size in zip(buckets, sizes):
+                    pairs[order[start : start + size]].tofile(bucket)
+                    start += size
+        finally:
+            for bucket in buckets:
+                bucket.close()
+    degrees = np.zeros(num_nodes, dtype=OFFSETS_DTYPE)
+    with open(neighbours_path, "wb") as neighbours:
+        for bucket_path, low, high in zip(bucket_paths, bounds, bounds[1:]):
+            pairs = np.fromfile(bucket_path, dtype=NODE_DTYPE).reshape(-1, 2)
+            # one uint64 per link, node in the high half, so sorting groups links by
+            # node and orders each node's neighbours. unique drops repeated links
+            links = np.unique(
+                (pairs[:, key].astype(np.uint64) << np.uint64(32))
+                | pairs[:, 1 - key].astype(np.uint64)
+            )
+            del pairs
+            nodes = (links >> np.uint64(32)).astype(np.int64)
+            others = (links & np.uint64(0xFFFFFFFF)).astype(np.int64)
+            degrees[low:high] += np.bincount(nodes - low, minlength=high - low)
+            page_ids[others].astype(NODE_DTYPE).tofile(neighbours)
+            if bucket_path != spill_path:
+                bucket_path.unlink()
+    offsets = np.zeros(num_nodes + 1, dtype=OFFSETS_DTYPE)
+    np.cumsum(degrees, out=offsets[1:])
+    offsets.tofile(offsets_path)
+    return int(offsets[-1])
+
+
+def build_csr(
+    path: Path,
+    edge_chunks: Iterable[Tuple[np.ndarray, np.ndarray]],
+    page_ids: Iterable[int],
+    memory_edges: int = 50_000_000,
+) -> CSRGraph:
+    """Build a graph directory from a stream of links, with an external sort so the
+    links never have to fit in memory
+
+    Parameters
+    ----------
+    path : Path
+        directory to write the graph to (created if needed, files in it replaced)
+    edge_chunks : Iterable[Tuple[np.ndarray, np.ndarray]]
+        (source page ids, target page ids) arrays, e.g. from pagelinks_edge_chunks.
+        Links from or to pages that aren't in page_ids are dropped, and repeated links
+        are kept once
+    page_ids : Iterable[int]
+        ids of the graph's pages (nodes)
+    memory_edges : int, optional
+        links sorted in memory at once, by default 50_000_000 (about 1 GB of memory)
+
+    Returns
+    -------
+    graph : CSRGraph
+        the graph that was written
+
+    Raises
+    ------
+    TypeError
+        if memory_edges isn't an int
+    ValueError
+        if memory_edges < 1, or a page id doesn't fit in 32 bits
+    """
+    if not isinstance(memory_edges, int):
+        msg = "memory_edges must be an int. invalid memory_edges: {}"
+        msg = msg.format(memory_edges)
+        raise TypeError(msg)
+    if memory_edges < 1:
+        msg = "memory_edges ({}) must be at least 1"
+        msg = msg.format(memory_edges)
+        raise ValueError(msg)
+    page_ids = np.unique(np.fromiter(page_ids, dtype=np.int64))
+    if len(page_ids) != 0 and (page_ids[0] < 0 or page_ids[-1] > np.iinfo(NODE_DTYPE).max):
+        msg = "page ids must fit in {}. invalid page ids: {} to {}"
+        msg = msg.format(np.dtype(NODE_DTYPE).name, page_ids[0], page_ids[-1])
+        raise ValueError(msg)
+    path.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.joinpath("tmp")
+    tmp_path.mkdir(exist_ok=True)
+    spill_path = tmp_path.joinpath(SPILL_NAME)
+    with open(spill_path, "wb") as spill:
+        out_counts, in_counts, _ = spill_edges(edge_chunks, page_ids, spill)
+    num_edges = write_direction(
+        spill_path,
+        0,
+        out_counts,
+        page_ids,
+        memory_edges,
+        path.joinpath(ARRAY_NAMES["out_offsets"]),
+        path.joinpath(ARRAY_NAMES["out_targets"]),
+    )
+    del out_counts
+    write_direction(
+        spill_path,
+        1,
+        in_counts,
+        page_ids,
+        memory_edges,
+        path.joinpath(ARRAY_NAMES["in_offsets"]),
+        path.joinpath(ARRAY_NAMES["in_sources"]),
+    )
+    shutil.rmtree(tmp_path)
+    np.save(path.joinpath(PAGE_IDS_NAME), page_ids.astype(NODE_DTYPE))
+    save_meta(path, len(page_ids), num_edges)  # last, so a partial build can't be opened
+    return CSRGraph(path)
+
+
+def load_title_ids(session_gen: sessionmaker, batch_size: int = 100000) -> Dict[str, int]:
+    """page_title: page_id of every page in the page table, titles transliterated like
+    the links and the RedirectMap"""
+    sess = session_gen()
+    query = sess.query(Page.page_title, Page.page_id)
+    title_ids = {
+        transliterate_cached(row.page_title): row.page_id for row in query.yield_per(batch_size)
+    }
+    sess.close()
+    return title_ids
+
+
+def pagelinks_edge_chunks(
+    sql_file: Path,
+    title_ids: Dict[str, int],
+    redirect_map: Optional[RedirectMap] = None,
+    lines_per_chunk: int = 16,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield the links to ns 0 pages in a pagelinks.sql (or .sql.gz) dump as (source
+    page ids, target page ids) arrays for build_csr
+
+    Parameters
+    ----------
+    sql_file : Path
+        pagelinks table dump
+    title_ids : Dict[str, int]
+        page_title: page_id of the link targets, from load_title_ids (transliterated)
+    redirect_map : RedirectMap, optional
+        resolve links to redirects to the page they redirect to, by default None
+        (links to redirects are dropped)
+    lines_per_chunk : int, optional
+        INSERT INTO lines per chunk, by default 16 (a few hundred thousand links)
+    """
+    lines = []
+    for line in open_sql_lines(sql_file):
+        lines.append(line)
+        if len(lines) == lines_per_chunk:
+            yield link_ids(lines, title_ids, redirect_map)
+            lines = []
+    if len(lines) != 0:
+        yield link_ids(lines, title_ids, redirect_map)
+
+
+def link_ids(
+    lines: List[bytes], title_ids: Dict[str, int], redirect_map: Optional[RedirectMap]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(source page ids, target page ids) of the links to ns 0 pages in lines, -1 for
+    targets that aren't in title_ids. link titles are transliterated to match
+    title_ids and redirect_map"""
+    columns = parse_columns(lines, LineEnum.LINK, ["pl_from", "pl_namespace", "pl_title"])
+    in_main = columns["pl_namespace"] == 0
+    titles = [
+        transliterate_cached(title.replace("_", " ")) for title in columns["pl_title"][in_main]
+    ]
+    if redirect_map is not None:
+        titles = redirect_map.resolve_links(titles)
+    targets = np.fromiter((title_ids.get(title, -1) for title in titles), dtype=np.int64)
+    return columns["pl_from"][in_main], targets
@@ -0,0 +1,154 @@
+"""csr : read-only link graph stored as memory-mapped CSR (compressed sparse row) arrays
+
+A graph directory (written by graph.build.build_csr) holds
+
+meta.json
+    version, number of nodes and edges
+page_ids.npy
+    the page id of every node, sorted. node i is page page_ids[i]
+out_offsets.i64, out_targets.u32
+    out-neighbours of node i (as page ids) are out_targets[out_offsets[i]:out_offsets[i+1]]
+in_offsets.i64, in_sources.u32
+    the same for in-neighbours (backlinks)
+
+The offset and neighbour arrays are opened with numpy.memmap, so opening a graph reads
+nothing but page_ids, and the neighbours of a page are a slice of the mapping: a
+NumPy view that doesn't copy anything, with the OS paging in only what's used.
+"""
+import json
+
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+GRAPH_VERSION = 1
+META_NAME = "meta.json"
+PAGE_IDS_NAME = "page_ids.npy"
+OFFSETS_DTYPE = np.int64
+NODE_DTYPE = np.uint32  # enwiki page ids are < 2**32
+ARRAY_NAMES = {
+    "out_offsets": "out_offsets.i64",
+    "out_targets": "out_targets.u32",
+    "in_offsets": "in_offsets.i64",
+    "in_sources": "in_sources.u32",
+}
+
+
+def save_meta(path: Path, num_nodes: int, num_edges: int) -> None:
+    """Write meta.json for a graph directory"""
+    meta = {"version": GRAPH_VERSION, "num_nodes": num_nodes, "num_edges": num_edges}
+    with open(path.joinpath(META_NAME), "w") as meta_file:
+        json.dump(meta, meta_file, indent=1)
+
+
+def load_meta(path: Path) -> Dict[str, int]:
+    """Read meta.json of a graph directory
+
+    Raises
+    ------
+    FileNotFoundError
+        if path isn't a graph directory
+    ValueError
+        if the graph was written by another version of build_csr
+    """
+    meta_path = path.joinpath(META_NAME)
+    if not meta_path.is_file():
+        msg = "{} isn't a graph directory: {} is missing"
+        msg = msg.format(path, META_NAME)
+        raise FileNotFoundError(msg)
+    with open(meta_path, "r") as meta_file:
+        meta = json.load(meta_file)
+    if meta.get("version") != GRAPH_VERSION:
+        msg = "graph in {} is version {}, expected {}. rebuild it"
+        msg = msg.format(path, meta.get("version"), GRAPH_VERSION)
+        raise ValueError(msg)
+    return meta
+
+
+class CSRGraph:
+    """Link graph between pages, memory mapped from a directory written by build_csr
+
+    Parameters
+    ----------
+    path : Path
+        graph directory
+
+    Attributes
+    ----------
+    num_nodes : int
+        number of pages
+    num_edges : int
+        number of distinct links between them
+    page_ids : np.ndarray
+        sorted page id of every node
+    """
+
+    def __init__(self, path: Path):
+        if not isinstance(path, Path):
+            msg = "path must be a pathlib.Path. invalid path: {}"
+            msg = msg.format(path)
+            raise TypeError(msg)
+        self.path = path
+        meta = load_meta(path)
+        self.num_nodes = meta["num_nodes"]
+        self.num_edges = meta["num_edges"]
+        self.page_ids = np.load(path.joinpath(PAGE_IDS_NAME))
+        self.out_offsets = self._map("out_offsets", OFFSETS_DTYPE, self.num_nodes + 1)
+        self.out_targets = self._map("out_targets", NODE_DTYPE, self.num_edges)
+        self.in_offsets = self._map("in_offsets", OFFSETS_DTYPE, self.num_nodes + 1)
+        self.in_sources = self._map("in_sources", NODE_DTYPE, self.num_edges)
+
+    def _map(self, name: str, dtype: type, length: int) -> np.ndarray:
+        if length == 0:  # mmap can't map empty files
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path.joinpath(ARRAY_NAMES[name]), dtype, "r", shape=(length,))
+
+    def __len__(self) -> int:
+        return self.num_nodes
+
+    def __contains__(self, page_id: int) -> bool:
+        i = np.searchsorted(self.page_ids, page_id)
+        return i < self.num_nodes and self.page_ids[i] == page_id
+
+    def node(self, page_id: int) -> int:
+        """Index of page_id's node
+
+        Raises
+        ------
+        KeyError
+            if page_id isn't in the graph
+        """
+        i = int(np.searchsorted(self.page_ids, page_id))
+        if i == self.num_nodes or self.page_ids[i] != page_id:
+            raise KeyError(page_id)
+        return i
+
+    def out_neighbours(self, page_id: int) -> np.ndarray:
+        """Sorted page ids page_id links to, as a read-only view of the graph's mapping"""
+        i = self.node(page_id)
+        return self.out_targets[self.out_offsets[i] : self.out_offsets[i + 1]]
+
+    def in_neighbours(self, page_id: int) -> np.ndarray:
+        """Sorted page ids that link to page_id, as a read-only view of the graph's
+        mapping"""
+        i = self.node(page_id)
+        return self.in_sources[self.in_offsets[i] : self.in_offsets[i + 1]]
+
+    def out_degree(self, page_id: int) -> int:
+        """Number of pages page_id links to"""
+        i = self.node(page_id)
+        return int(self.out_offsets[i + 1] - self.out_offsets[i])
+
+    def in_degree(self, page_id: int) -> int:
+        """Number of pages that link to page_id"""
+        i = self.node(page_id)
+        return int(self.in_offsets[i + 1] - self.in_offsets[i])
+
+    def out_degrees(self) -> np.ndarray:
+        """Out-degree of every node, in page_ids order"""
+        return np.diff(self.out_offsets)
+
+    def in_degrees(self) -> np.ndarray:
+        """In-degree of every node, in page_ids order"""
+        return np.diff(self.in_offsets)
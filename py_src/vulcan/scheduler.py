@@ -0,0 +1,233 @@
+"""scheduler : event-driven scheduler that runs work units in worker processes
+
+Every worker process has its own pipe. The main process blocks in
+multiprocessing.connection.wait on the pipes and process sentinels of the busy workers,
+so a unit is dispatched the moment a worker finishes its previous one, and a worker
+that dies is noticed as soon as it exits. Units are dispatched largest-first so the
+run ends on the smallest units instead of one worker grinding through a big file while
+the others idle. Workers exit after max_units_per_worker units and are replaced by
+fresh processes, which returns any memory the parsers leaked to the OS.
+
+Workers are always forked, whatever the default start method, so they inherit the
+module globals the main process set up before run (e.g. a shared title filter).
+"""
+
+import multiprocessing as mp
+import traceback
+
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional
+
+_FORK = mp.get_context("fork")
+
+
+class WorkUnit(NamedTuple):
+    """A call of the scheduler's target. size orders the units (largest first), e.g.
+    the compressed size of the bytes the unit parses"""
+
+    key: Hashable
+    size: int
+    args: tuple
+
+
+class UnitError(NamedTuple):
+    """A unit whose target raised, or whose worker died while running it"""
+
+    unit: WorkUnit
+    message: str
+
+
+class _Worker:
+    """A worker process, the main process's end of its pipe and its current unit"""
+
+    __slots__ = ("process", "conn", "unit", "units_done")
+
+    def __init__(self, process: mp.Process, conn: Connection) -> None:
+        self.process = process
+        self.conn = conn
+        self.unit: Optional[WorkUnit] = None
+        self.units_done = 0
+
+
+def _worker_loop(target: Callable, conn: Connection, max_units: Optional[int]) -> None:
+    """Run target on the args received from conn until None is received or max_units
+    units are done, sending back ("ok", result) or ("error", traceback) for each"""
+    units_done = 0
+    while max_units is None or units_done < max_units:
+        args = conn.recv()
+        if args is None:
+            break
+        try:
+            conn.send(("ok", target(*args)))
+        except Exception:  # pylint: disable=broad-except
+            conn.send(("error", traceback.format_exc()))
+        units_done += 1
+    conn.close()
+
+
+class Scheduler:
+    """Run target(*unit.args) for every WorkUnit in a set of worker processes
+
+    Parameters
+    ----------
+    target : Callable
+        function to run for each unit. its return value must be picklable
+    max_workers : int
+        number of worker processes running at once
+    max_units_per_worker : int, optional
+        units a worker runs before it exits and is replaced, by default None (workers
+        live until there are no units left). 1 gives every unit a fresh process
+    on_result : Callable[[WorkUnit, Any], None], optional
+        called in the main process with each unit and target's return value as soon
+        as the unit finishes, by default None
+    on_error : Callable[[UnitError], None], optional
+        called in the main process for each unit that raised or whose worker died,
+        by default None
+    name : str, optional
+        prefix of the worker process names, by default "worker"
+
+    Raises
+    ------
+    TypeError
+        if target isn't callable or max_workers/max_units_per_worker aren't ints
+    ValueError
+        if max_workers or max_units_per_worker is less than 1
+    """
+
+    def __init__(
+        self,
+        target: Callable,
+        max_workers: int,
+        max_units_per_worker: int = None,
+        on_result: Callable[[WorkUnit, Any], None] = None,
+        on_error: Callable[[UnitError], None] = None,
+        name: str = "worker",
+    ) -> None:
+        if not callable(target):
+            msg = "invalid target. target must be callable, not {}"
+            msg = msg.format(type(target))
+            raise TypeError(msg)
+        for param, value in [
+            ("max_workers", max_workers),
+            ("max_units_per_worker", max_units_per_worker),
+        ]:
+            if value is None and param == "max_units_per_worker":
+                continue
+            if not isinstance(value, int):
+                msg = "invalid {}. {} must be an int, not {}"
+                msg = msg.format(param, param, type(value))
+                raise TypeError(msg)
+            if value < 1:
+                msg = "{} ({}) must be at least 1".format(param, value)
+                raise ValueError(msg)
+        self.target = target
+        self.max_workers = max_workers
+        self.max_units_per_worker = max_units_per_worker
+        self.on_result = on_result
+        self.on_error = on_error
+        self.name = name
+        self.workers_started = 0
+        self.errors: List[UnitError] = []
+
+    def _start_worker(self) -> _Worker:
+        main_conn, worker_conn = _FORK.Pipe()
+        process = _FORK.Process(
+            target=_worker_loop,
+            name="{}_{}".format(self.name, self.workers_started),
+            args=(self.target, worker_conn, self.max_units_per_worker),
+        )
+        process.start()
+        worker_conn.close()  # only the worker uses its end, so EOF means it died
+        self.workers_started += 1
+        mp.get_logger().info("started worker %s (pid %i)", process.name, process.pid)
+        return _Worker(process, main_conn)
+
+    def _stop_worker(self, worker: _Worker, send_stop: bool) -> None:
+        if send_stop:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass  # already exited
+        worker.conn.close()
+        worker.process.join()
+        mp.get_logger().info("joined worker %s (pid %i)", worker.process.name, worker.process.pid)
+
+    def _fail(self, unit: WorkUnit, message: str) -> None:
+        error = UnitError(unit, message)
+        self.errors.append(error)
+        mp.get_logger().error("work unit %s failed: %s", unit.key, message)
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def run(self, units: Iterable[WorkUnit]) -> List[UnitError]:
+        """Run every unit, largest first, and wait for all of them to finish
+
+        Parameters
+        ----------
+        units : Iterable[WorkUnit]
+            units to run
+
+        Returns
+        -------
+        errors : List[UnitError]
+            units that raised or whose worker died. they aren't retried
+        """
+        pending = sorted(units, key=lambda unit: unit.size)  # pop() takes the largest
+        idle: List[_Worker] = []
+        busy: Dict[Connection, _Worker] = {}
+        while len(pending) != 0 or len(busy) != 0:
+            # dispatch while there are units and free slots
+            while len(pending) != 0 and len(busy) < self.max_workers:
+                fresh = len(idle) == 0
+                worker = idle.pop() if not fresh else self._start_worker()
+                worker.unit = pending.pop()
+                try:
+                    worker.conn.send(worker.unit.args)
+                except (BrokenPipeError, OSError):  # died before it got the unit
+                    worker.conn.close()
+                    worker.process.join()
+                    msg = "worker {} died with exit code {}"
+                    msg = msg.format(worker.process.name, worker.process.exitcode)
+                    if fresh:  # a new worker can't take it either
+                        self._fail(worker.unit, msg)
+                    else:  # died while idle, so run the unit on a fresh worker
+                        mp.get_logger().warning("%s, restarting unit %s", msg, worker.unit.key)
+                        pending.append(worker.unit)
+                    continue
+                busy[worker.conn] = worker
+            sentinels = {worker.process.sentinel: worker for worker in busy.values()}
+            ready = wait(list(busy) + list(sentinels))
+            finished = []
+            for obj in ready:
+                worker = busy.get(obj) or sentinels.get(obj)
+                if worker is None or worker in finished:
+                    continue  # both its pipe and sentinel were ready
+                finished.append(worker)
+                try:
+                    status, value = worker.conn.recv()
+                except (EOFError, OSError):  # died without sending a result
+                    worker.process.join()
+                    msg = "worker {} died with exit code {}"
+                    self._fail(
+                        worker.unit, msg.format(worker.process.name, worker.process.exitcode)
+                    )
+                    del busy[worker.conn]
+                    worker.conn.close()
+                    continue
+                del busy[worker.conn]
+                worker.units_done += 1
+                if status == "ok":
+                    if self.on_result is not None:
+                        self.on_result(worker.unit, value)
+                else:
+                    self._fail(worker.unit, value)
+                worker.unit = None
+                if worker.units_done == self.max_units_per_worker:
+                    self._stop_worker(worker, send_stop=False)  # recycle
+                else:
+                    idle.append(worker)
+            if len(pending) == 0:  # no more work for the idle workers
+                for worker in idle:
+                    self._stop_worker(worker, send_stop=True)
+                idle = []
+        return self.errors
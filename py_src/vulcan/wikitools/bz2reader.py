@@ -0,0 +1,146 @@
+"""bz2reader : file-like reader that decompresses a (multistream) .bz2 file in a
+background thread, so decompression overlaps with XML parsing in the reading thread
+
+bz2 releases the GIL while it decompresses, so the decompression thread runs in
+parallel with iterparse and wikicode extraction instead of alternating with them.
+"""
+import bz2
+import io
+import queue
+import threading
+
+from pathlib import Path
+
+READ_SIZE = 256 * 1024  # bytes of compressed data decompressed at a time
+_EOF = object()  # put on the queue after the last decompressed chunk
+
+
+class ThreadedBZ2Reader(io.RawIOBase):
+    """Read-only file object for the decompressed contents of bytes [start, end) of a
+    .bz2 file, decompressed ahead of the reader by a background thread
+
+    Parameters
+    ----------
+    path : Path
+        path of the .bz2 file. every bz2 stream in [start, end) is decompressed, like
+        bz2.open does for multistream files
+    start : int, optional
+        byte offset of the first bz2 stream to read, by default 0
+    end : int, optional
+        byte offset where the last bz2 stream ends, by default None (end of file)
+    prefix : bytes, optional
+        bytes returned before the decompressed data, by default b""
+    suffix : bytes, optional
+        bytes returned after the decompressed data, by default b""
+    queue_size : int, optional
+        maximum number of decompressed chunks waiting to be read, by default 16.
+        bounds the memory used when the reader is slower than the decompressor
+
+    Raises
+    ------
+    EOFError
+        from read() if the compressed data ends in the middle of a bz2 stream
+    OSError
+        from read() if the data isn't valid bz2
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        start: int = 0,
+        end: int = None,
+        prefix: bytes = b"",
+        suffix: bytes = b"",
+        queue_size: int = 16,
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.start = start
+        self.end = end
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._buffer = prefix
+        self._pos = 0
+        self._suffix = suffix
+        self._eof = False
+        self._thread = threading.Thread(
+            target=self._decompress, name="bz2-{}".format(path.name), daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        """Put item on the queue, giving up if the reader was closed"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decompress(self) -> None:
+        """Background thread: read, decompress and queue every stream in [start, end)"""
+        try:
+            with open(self.path, "rb") as file:
+                file.seek(self.start)
+                remaining = None if self.end is None else self.end - self.start
+                decompressor = bz2.BZ2Decompressor()
+                in_stream = False  # decompressor has data from an unfinished stream
+                while not self._stop.is_set():
+                    size = READ_SIZE if remaining is None else min(READ_SIZE, remaining)
+                    compressed = file.read(size)
+                    if compressed == b"":
+                        break
+                    if remaining is not None:
+                        remaining -= len(compressed)
+                    while compressed:
+                        data = decompressor.decompress(compressed)
+                        in_stream = True
+                        if data and not self._put(data):
+                            return
+                        if decompressor.eof:  # start the next stream with the leftovers
+                            compressed = decompressor.unused_data
+                            decompressor = bz2.BZ2Decompressor()
+                            in_stream = False
+                        else:
+                            compressed = b""
+                if in_stream and not self._stop.is_set():
+                    msg = "{} ended before the end-of-stream marker was reached"
+                    raise EOFError(msg.format(self.path.name))
+            self._put(_EOF)
+        except Exception as e:  # pylint: disable=broad-except
+            self._put(e)  # re-raised in the reading thread
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        """Copy the next decompressed bytes into b, blocking until some are ready"""
+        while self._pos == len(self._buffer):
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is _EOF:
+                self._eof = True
+                item = self._suffix
+            elif isinstance(item, Exception):
+                self._eof = True
+                raise item
+            self._buffer = item
+            self._pos = 0
+        size = min(len(b), len(self._buffer) - self._pos)
+        b[:size] = self._buffer[self._pos : self._pos + size]
+        self._pos += size
+        return size
+
+    def close(self) -> None:
+        """Stop the decompression thread and close the reader"""
+        if not self.closed:
+            self._stop.set()
+            while self._thread.is_alive():
+                try:  # unblock the thread if it is waiting on a full queue
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self._thread.join(timeout=0.1)
+        super().close()
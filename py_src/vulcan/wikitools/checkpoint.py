@@ -0,0 +1,119 @@
+"""checkpoint : module for persisting how far a WikiXMLFile has been loaded, so a
+killed run can resume at the last committed bz2 stream instead of the start of the file
+"""
+
+import json
+import os
+
+from pathlib import Path
+from typing import Dict, Optional
+
+from .wikixml import WikiXMLFile
+
+
+def get_checkpoint_path(file: WikiXMLFile, directory: Path = Path("logs")) -> Path:
+    """Get the path of the checkpoint file for a WikiXMLFile
+
+    Unlike the stats and duplicates files, the name doesn't contain a timestamp or pid
+    so a restarted run finds the checkpoint of the previous run
+
+    Parameters
+    ----------
+    file : WikiXMLFile
+        file the checkpoint belongs to
+    directory : Path, optional
+        directory checkpoints are stored in, by default logs
+
+    Returns
+    -------
+    checkpoint_path : Path
+        path like logs/checkpoint_20460153_20570392.json
+    """
+    name = "checkpoint_{}_{}.json".format(file.start_idx, file.end_idx)
+    return directory.joinpath(name)
+
+
+def save_checkpoint(
+    path: Path,
+    file: WikiXMLFile,
+    offset: int,
+    page_id: int,
+    complete: bool = False,
+    pages: int = None,
+) -> None:
+    """Atomically write a checkpoint after a chunk of file has been committed
+
+    Parameters
+    ----------
+    path : Path
+        path of the checkpoint file, from get_checkpoint_path
+    file : WikiXMLFile
+        file being loaded. its counters are saved so resumed runs report totals
+    offset : int
+        byte offset of the last bz2 stream whose pages have all been committed
+    page_id : int
+        id of the last page in that stream
+    complete : bool, optional
+        True if every stream in file has been committed, by default False
+    pages : int, optional
+        pages extracted up to the end of the stream, by default None (file.pages).
+        for checkpoints saved by a background writer, after the parser has moved on
+
+    Notes
+    -----
+    The checkpoint is written to a temporary file that then replaces path, so a crash
+    while writing leaves the previous checkpoint intact instead of a truncated one
+    """
+    state = {
+        "path": file.path.name,
+        "offset": offset,
+        "page_id": page_id,
+        "complete": complete,
+        "pages": file.pages if pages is None else pages,
+        "additions": file.additions,
+        "duplicates": file.duplicates,
+        "errors": file.errors,
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as tmp_file:
+        json.dump(state, tmp_file)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: Path, file: WikiXMLFile) -> Optional[Dict]:
+    """Load a checkpoint and restore file's counters from it
+
+    Parameters
+    ----------
+    path : Path
+        path of the checkpoint file, from get_checkpoint_path
+    file : WikiXMLFile
+        file being loaded. its pages/additions/duplicates/errors counters are set to
+        the values saved in the checkpoint
+
+    Returns
+    -------
+    state : Optional[Dict]
+        dict with the keys written by save_checkpoint, or None if there is no
+        checkpoint for file
+
+    Raises
+    ------
+    ValueError
+        if the checkpoint at path was written for a different file
+    """
+    if not path.is_file():
+        return None
+    with open(path, "r") as checkpoint_file:
+        state = json.load(checkpoint_file)
+    if state["path"] != file.path.name:
+        msg = "checkpoint {} belongs to {}, not {}"
+        msg = msg.format(path, state["path"], file.path.name)
+        raise ValueError(msg)
+    file.pages = state["pages"]
+    file.additions = state["additions"]
+    file.duplicates = state["duplicates"]
+    file.errors = state["errors"]
+    return state
@@ -0,0 +1,156 @@
+"""fastscan : linear scanners for [[wikilinks]] and ==headings== in raw wikitext
+
+These scanners are much faster than mwparserfromhell.parse, but only understand
+plain links and headings. Whenever a page contains markup that could change how
+mwparserfromhell would read a link or heading (comments, <nowiki> and the other
+unparsed tags, templates or HTML inside a link, unbalanced brackets, ...), the scanner
+returns None so the caller can fall back to mwparserfromhell for that page.
+"""
+
+import re
+
+from typing import List, Optional
+
+from mwparserfromhell.definitions import PARSER_BLACKLIST
+
+# markup whose contents mwparserfromhell doesn't parse as wikicode
+UNPARSED_EX = re.compile(
+    r"<!--|<\s*(?:{})\b".format("|".join(PARSER_BLACKLIST)),
+    flags=re.IGNORECASE,
+)
+# characters that make a link's title/text more than plain text after strip_code
+LINK_MARKUP_EX = re.compile(r"[{}<>&'\[\]\n]")
+INNER_LINK_EX = re.compile(r"\[\[([^\[\]]*)\]\]")
+HEADING_LINE_EX = re.compile(r"^=.*=[ \t]*$", flags=re.MULTILINE)
+HEADING_EX = re.compile(r"^(={1,6})([^=\n](?:.*[^=\n])?)\1[ \t]*$")
+HEADING_MARKUP_EX = re.compile(r"[{}<>&'\[\]]")
+
+
+def is_unparsed(text: str) -> bool:
+    """Check if text has comments or tags whose contents mwparserfromhell doesn't parse"""
+    return UNPARSED_EX.search(text) is not None
+
+
+def strip_link(content: str) -> Optional[str]:
+    """Strip the inside of a [[wikilink]] the way mwparserfromhell's strip_code does
+
+    Parameters
+    ----------
+    content : str
+        everything between the outer [[ and ]], which can contain nested links in the
+        link's text
+
+    Returns
+    -------
+    stripped : Optional[str]
+        the link's text (with nested links replaced by their own stripped text) if it
+        has a |, else its title. None if the title or text contains other markup
+    """
+    split = content.find("|")
+    if split == -1:
+        title, text = content, None
+    else:
+        title, text = content[:split], content[split + 1 :]
+    if LINK_MARKUP_EX.search(title) is not None:
+        return None
+    if text is None:
+        return title
+    # replace innermost links with their stripped text until none are left
+    while "[[" in text:
+        replaced = INNER_LINK_EX.sub(_strip_inner_link, text)
+        if replaced == text:
+            return None
+        text = replaced
+    if LINK_MARKUP_EX.search(text) is not None:
+        return None
+    return text
+
+
+def _strip_inner_link(matches) -> str:
+    stripped = strip_link(matches.group(1))
+    if stripped is None:
+        return matches.group(0)  # leave it in place so strip_link returns None
+    return stripped
+
+
+def scan_wikilinks(text: str) -> Optional[List[str]]:
+    """Find every [[wikilink]] in text and strip it, like filter_wikilinks + strip_code
+
+    Parameters
+    ----------
+    text : str
+        raw wikitext of a page
+
+    Returns
+    -------
+    links : Optional[List[str]]
+        stripped links in the same order mwparserfromhell.filter_wikilinks returns
+        them (an outer link before the links nested in its text). links aren't
+        filtered or transliterated. None if the page is ambiguous and has to be
+        parsed with mwparserfromhell
+
+    Notes
+    -----
+    Scans text once, matching each ]] with the last unclosed [[
+    """
+    if text is None:
+        return []
+    if is_unparsed(text):
+        return None
+    spans = []  # (start, end) of the content of every closed link
+    open_links = []
+    pos = 0
+    while True:
+        next_open = text.find("[[", pos)
+        next_close = text.find("]]", pos)
+        if next_close == -1:
+            if len(open_links) != 0 or next_open != -1:
+                return None  # unclosed link
+            break
+        if next_open != -1 and next_open < next_close:
+            if text.startswith("[[[", next_open):
+                return None  # single brackets directly around a link
+            open_links.append(next_open + 2)
+            pos = next_open + 2
+        else:
+            if len(open_links) != 0:
+                spans.append((open_links.pop(), next_close))
+            pos = next_close + 2
+    links = []
+    for start, end in sorted(spans):
+        stripped = strip_link(text[start:end])
+        if stripped is None:
+            return None
+        links.append(stripped)
+    return links
+
+
+def scan_headings(text: str) -> Optional[List[str]]:
+    """Find the titles of every ==heading== in text, like filter_headings
+
+    Parameters
+    ----------
+    text : str
+        raw wikitext of a page
+
+    Returns
+    -------
+    headings : Optional[List[str]]
+        stripped heading titles in the order they appear. None if the page is
+        ambiguous (unbalanced = signs, markup in a heading, unparsed tags) and has to
+        be parsed with mwparserfromhell
+    """
+    if text is None:
+        return []
+    if is_unparsed(text):
+        return None
+    headings = []
+    for line in HEADING_LINE_EX.finditer(text):
+        matches = HEADING_EX.match(line.group(0))
+        if matches is None:
+            return None  # unbalanced heading, e.g. ===Title==
+        title = matches.group(2)
+        if HEADING_MARKUP_EX.search(title) is not None:
+            return None
+        headings.append(title.strip())
+    return headings
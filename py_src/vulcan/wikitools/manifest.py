@@ -0,0 +1,300 @@
+"""manifest : cached description of every file in a database dump, stored as a sidecar
+JSON file (manifest.json) in the dump's directory
+
+Scanning a dump (matching file names, counting streams and articles, hashing files)
+is slow, so it is done once and saved. Later runs reuse the saved entry of every file
+whose size and modification time haven't changed, and only rescan the others.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from .wikixml import WikiXMLFile, wikifile_num_articles_longest_article
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+HASH_READ_SIZE = 1 << 20
+DUMP_FILE_EX = re.compile(r"^(.+)wiki-(.+)-pages-articles-multistream(.+)\.xml-p(\d+)p(\d+)\.bz2$")
+
+
+class FileManifest(NamedTuple):
+    """Manifest entry of one .xml-p(.+)p(.+).bz2 file in a dump
+
+    articles and longest_title are None if the file's articles weren't counted
+    """
+
+    name: str
+    start_idx: int
+    end_idx: int
+    size: int  # compressed size in bytes
+    mtime_ns: int
+    streams: Optional[int]  # bz2 streams listed in the index, None without an index
+    articles: Optional[int]
+    longest_title: Optional[str]
+    md5: str
+    sha1: str
+
+    def wiki_file(self, data_path: Path) -> WikiXMLFile:
+        """WikiXMLFile for this entry in the dump at data_path"""
+        return WikiXMLFile(self.start_idx, self.end_idx, data_path.joinpath(self.name))
+
+    def is_current(self, path: Path) -> bool:
+        """Check if the file at path is the one this entry describes"""
+        if not path.is_file():
+            return False
+        stat = path.stat()
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def streams_per_unit(self, unit_bytes: int) -> int:
+        """How many of this file's streams make a work unit of ~unit_bytes compressed
+        bytes (at least 1)"""
+        if self.streams is None or self.size == 0:
+            return 1
+        return max(1, round(self.streams * unit_bytes / self.size))
+
+
+def file_digests(path: Path) -> Dict[str, str]:
+    """md5 and sha1 hex digests of the file at path, computed in a single read"""
+    md5, sha1 = hashlib.md5(), hashlib.sha1()
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(HASH_READ_SIZE)
+            if data == b"":
+                break
+            md5.update(data)
+            sha1.update(data)
+    return {"md5": md5.hexdigest(), "sha1": sha1.hexdigest()}
+
+
+def scan_file(wiki_file: WikiXMLFile, count_articles: bool = True) -> FileManifest:
+    """Describe a dump file: its size, streams, articles and checksums
+
+    Parameters
+    ----------
+    wiki_file : WikiXMLFile
+        file to scan
+    count_articles : bool, optional
+        count the articles and find the longest title, by default True. this
+        decompresses and parses the whole file, so it is by far the slowest part
+
+    Returns
+    -------
+    FileManifest
+    """
+    stat = wiki_file.path.stat()
+    streams = len(wiki_file.stream_ranges()) if wiki_file.has_index() else None
+    articles, longest_title = None, None
+    if count_articles:
+        articles, longest_title = wikifile_num_articles_longest_article(wiki_file)
+    digests = file_digests(wiki_file.path)
+    return FileManifest(
+        wiki_file.path.name,
+        wiki_file.start_idx,
+        wiki_file.end_idx,
+        stat.st_size,
+        stat.st_mtime_ns,
+        streams,
+        articles,
+        longest_title,
+        digests["md5"],
+        digests["sha1"],
+    )
+
+
+def find_dump_files(data_path: Path) -> List[WikiXMLFile]:
+    """WikiXMLFiles for every .xml-p(.+)p(.+).bz2 file in data_path, ordered by
+    start_idx"""
+    files = []
+    for item in data_path.iterdir():
+        matches = DUMP_FILE_EX.match(item.name)
+        if matches is None:
+            continue  # skip if the file isn't part of a pages-articles-multistream
+        files.append(WikiXMLFile(int(matches.group(4)), int(matches.group(5)), item))
+    return sorted(files, key=lambda file: file.start_idx)
+
+
+def get_manifest_path(data_path: Path) -> Path:
+    return data_path.joinpath(MANIFEST_NAME)
+
+
+def load_manifest(data_path: Path) -> Optional[Dict[str, FileManifest]]:
+    """Load the manifest saved in data_path
+
+    Returns
+    -------
+    manifest : Optional[Dict[str, FileManifest]]
+        file name: entry, ordered by start_idx. None if there is no manifest or it
+        was written by an incompatible version
+    """
+    path = get_manifest_path(data_path)
+    if not path.is_file():
+        return None
+    with open(path, "r") as manifest_file:
+        saved = json.load(manifest_file)
+    if saved.get("version") != MANIFEST_VERSION:
+        return None
+    entries = [FileManifest(**entry) for entry in saved["files"]]
+    entries.sort(key=lambda entry: entry.start_idx)
+    return {entry.name: entry for entry in entries}
+
+
+def save_manifest(data_path: Path, manifest: Dict[str, FileManifest]) -> None:
+    """Atomically write manifest to data_path"""
+    path = get_manifest_path(data_path)
+    entries = sorted(manifest.values(), key=lambda entry: entry.start_idx)
+    saved = {"version": MANIFEST_VERSION, "files": [entry._asdict() for entry in entries]}
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as tmp_file:
+        json.dump(saved, tmp_file, indent=1)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+
+
+def build_manifest(
+    data_path: Path,
+    max_workers: int = None,
+    count_articles: bool = True,
+    refresh: bool = False,
+) -> Dict[str, FileManifest]:
+    """Load the manifest of the dump in data_path, scanning (in parallel) every file
+    that is new or has changed since it was saved, and save it again if needed
+
+    Parameters
+    ----------
+    data_path : Path
+        directory with the .xml-p(.+)p(.+).bz2 files
+    max_workers : int, optional
+        processes to scan files with, by default None (one per cpu)
+    count_articles : bool, optional
+        see scan_file, by default True. entries without article counts are rescanned
+        when count_articles is True
+    refresh : bool, optional
+        rescan every file even if its entry is current, by default False
+
+    Returns
+    -------
+    manifest : Dict[str, FileManifest]
+        file name: entry for every file currently in data_path, ordered by start_idx
+
+    Raises
+    ------
+    FileNotFoundError
+        if data_path doesn't exist
+    NotADirectoryError
+        if data_path is a file
+    """
+    if not data_path.exists():
+        raise FileNotFoundError("Could not find directory {}".format(data_path))
+    if data_path.is_file():
+        msg = "data_path '{}' is a file, not the directory containing the dump files"
+        raise NotADirectoryError(msg.format(data_path))
+    saved = load_manifest(data_path) or {}
+    manifest = {}
+    to_scan = []
+    for wiki_file in find_dump_files(data_path):
+        entry = saved.get(wiki_file.path.name)
+        if (
+            refresh
+            or entry is None
+            or not entry.is_current(wiki_file.path)
+            or (count_articles and entry.articles is None)
+        ):
+            to_scan.append(wiki_file)
+        else:
+            manifest[entry.name] = entry
+    if len(to_scan) != 0:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            scans = executor.map(scan_file, to_scan, [count_articles] * len(to_scan))
+            for entry in scans:
+                manifest[entry.name] = entry
+    manifest = dict(sorted(manifest.items(), key=lambda item: item[1].start_idx))
+    if len(to_scan) != 0 or manifest.keys() != saved.keys():
+        save_manifest(data_path, manifest)
+    return manifest
+
+
+def read_checksums(path: Path) -> Dict[str, str]:
+    """Read a published checksum list (e.g. enwiki-20210420-md5sums.txt), with a
+    "<hex digest>  <file name>" line for every file in the dump
+
+    Returns
+    -------
+    checksums : Dict[str, str]
+        file name: lowercase hex digest
+    """
+    checksums = {}
+    with open(path, "r") as checksum_file:
+        for line in checksum_file:
+            parts = line.split()
+            if len(parts) == 2:
+                checksums[parts[1].lstrip("*")] = parts[0].lower()
+    return checksums
+
+
+def verify_checksums(
+    data_path: Path,
+    manifest: Dict[str, FileManifest],
+    max_workers: int = None,
+    rehash: bool = False,
+) -> Dict[str, List[str]]:
+    """Check every file in manifest against the dump's published md5/sha1 lists
+    (*-md5sums.txt and *-sha1sums.txt files in data_path)
+
+    Parameters
+    ----------
+    data_path : Path
+        directory with the dump files and checksum lists
+    manifest : Dict[str, FileManifest]
+        from build_manifest
+    max_workers : int, optional
+        processes to hash files with when rehash is True, by default None
+    rehash : bool, optional
+        hash every file again (in parallel) instead of trusting the digests saved in
+        the manifest, by default False
+
+    Returns
+    -------
+    problems : Dict[str, List[str]]
+        file name: problems (mismatched or missing checksums) for every file that
+        didn't verify. empty if every file matches
+
+    Raises
+    ------
+    FileNotFoundError
+        if data_path has no md5sums or sha1sums list
+    """
+    published = {}  # algorithm: file name: digest
+    for algorithm in ["md5", "sha1"]:
+        for path in data_path.glob("*-{}sums.txt".format(algorithm)):
+            published.setdefault(algorithm, {}).update(read_checksums(path))
+    if len(published) == 0:
+        msg = "no *-md5sums.txt or *-sha1sums.txt checksum lists in {}"
+        raise FileNotFoundError(msg.format(data_path))
+    names = list(manifest)
+    if rehash:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            paths = [data_path.joinpath(name) for name in names]
+            digests = dict(zip(names, executor.map(file_digests, paths)))
+    else:
+        digests = {name: manifest[name]._asdict() for name in names}
+    problems = {}
+    for name in names:
+        for algorithm, checksums in published.items():
+            expected = checksums.get(name)
+            if expected is None:
+                problem = "{} missing from the published {} list".format(name, algorithm)
+            elif expected != digests[name][algorithm]:
+                problem = "{} mismatch: expected {}, got {}".format(
+                    algorithm, expected, digests[name][algorithm]
+                )
+            else:
+                continue
+            problems.setdefault(name, []).append(problem)
+    return problems
@@ -0,0 +1,270 @@
+"""synthetic : generate synthetic pages-articles-multistream dump files and their
+multistream index files, for tests and benchmarks that can't download a real dump
+
+Files are laid out like the real enwiki dumps: a <siteinfo> header stream, one bz2
+stream per pages_per_stream pages, a closing </mediawiki> stream, and an index file
+with an offset:page_id:title line for every page.
+"""
+
+import bz2
+import math
+import random
+
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+from .wikixml import WikiXMLFile, get_index_path
+
+MEDIAWIKI_NS = "http://www.mediawiki.org/xml/export-0.10/"
+NAMESPACES = {1: "Talk", 2: "User", 4: "Wikipedia", 10: "Template", 14: "Category"}
+WORDS = [
+    "quantum", "mechanics", "theory", "physics", "energy", "particle", "wave", "field",
+    "history", "city", "river", "music", "album", "species", "football", "election",
+    "Zürich", "Schrödinger", "café", "Москва", "東京", "naïve",
+]  # fmt: skip
+
+
+class SyntheticPage(NamedTuple):
+    """A page to write to a synthetic dump. pages with a redirect are redirects to
+    the page with that title"""
+
+    page_id: int
+    title: str
+    text: str
+    ns: int = 0
+    redirect: Optional[str] = None
+
+
+def make_article(
+    rng: random.Random,
+    titles: List[str],
+    median_words: int = 300,
+    size_sigma: float = 1.0,
+    link_density: float = 0.05,
+) -> str:
+    """Make the wikitext of a synthetic article
+
+    Parameters
+    ----------
+    rng : random.Random
+        source of randomness
+    titles : List[str]
+        titles to link to
+    median_words : int, optional
+        median length of an article in words, by default 300
+    size_sigma : float, optional
+        sigma of the lognormal distribution of article lengths, by default 1.0. like
+        real articles, most are short and a few are very long
+    link_density : float, optional
+        fraction of words that are [[wikilinks]], by default 0.05
+
+    Returns
+    -------
+    str
+        wikitext with a lead, ==headings==, links, templates, refs and a category
+    """
+    num_words = max(1, int(rng.lognormvariate(math.log(median_words), size_sigma)))
+    sections = []
+    words = []
+    for i in range(num_words):
+        roll = rng.random()
+        if roll < link_density:
+            title = rng.choice(titles)
+            if rng.random() < 0.3:
+                words.append("[[{}|{}]]".format(title, rng.choice(WORDS)))
+            else:
+                words.append("[[{}]]".format(title))
+        elif roll < link_density + 0.01:
+            words.append("{{{{cite web|title={}}}}}".format(rng.choice(WORDS)))
+        elif roll < link_density + 0.015:
+            words.append("<ref>{} p. {}</ref>".format(rng.choice(WORDS), i))
+        else:
+            words.append(rng.choice(WORDS))
+        if len(words) >= 80 and rng.random() < 0.02:  # start a new section
+            sections.append(" ".join(words))
+            level = "=" * rng.choice([2, 2, 2, 3])
+            words = ["{0} {1} {2} {0}\n".format(level, rng.choice(WORDS).title(), len(sections))]
+    sections.append(" ".join(words))
+    sections.append("[[Category:{}]]".format(rng.choice(WORDS).title()))
+    return "\n\n".join(sections)
+
+
+def generate_pages(
+    num_pages: int,
+    start_id: int = 1,
+    median_words: int = 300,
+    size_sigma: float = 1.0,
+    link_density: float = 0.05,
+    redirect_fraction: float = 0.1,
+    other_ns_fraction: float = 0.1,
+    seed: int = 0,
+) -> List[SyntheticPage]:
+    """Generate pages with consecutive ids, like a real dump file
+
+    Parameters
+    ----------
+    num_pages : int
+        number of pages to generate
+    start_id : int, optional
+        page id of the first page, by default 1
+    median_words, size_sigma, link_density : optional
+        see make_article
+    redirect_fraction : float, optional
+        fraction of pages that are ns 0 redirects to another article, by default 0.1
+    other_ns_fraction : float, optional
+        fraction of pages in namespaces other than 0 (Talk, User, Category, ...), by
+        default 0.1
+    seed : int, optional
+        seed for the generator, by default 0. the same arguments always generate the
+        same pages
+
+    Returns
+    -------
+    pages : List[SyntheticPage]
+        pages ordered by page_id
+    """
+    rng = random.Random(seed)
+    titles = [
+        "{} {} {}".format(rng.choice(WORDS).title(), rng.choice(WORDS), i) for i in range(num_pages)
+    ]
+    pages = []
+    for i, title in enumerate(titles):
+        page_id = start_id + i
+        roll = rng.random()
+        if roll < other_ns_fraction:
+            ns = rng.choice(list(NAMESPACES))
+            title = "{}:{}".format(NAMESPACES[ns], title)
+            text = make_article(rng, titles, median_words // 4, size_sigma, link_density)
+            pages.append(SyntheticPage(page_id, title, text, ns))
+        elif roll < other_ns_fraction + redirect_fraction:
+            target = rng.choice(titles)
+            pages.append(
+                SyntheticPage(page_id, title, "#REDIRECT [[{}]]".format(target), 0, target)
+            )
+        else:
+            text = make_article(rng, titles, median_words, size_sigma, link_density)
+            pages.append(SyntheticPage(page_id, title, text))
+    return pages
+
+
+def page_xml(page: SyntheticPage) -> str:
+    """Serialize page like a <page> element of a pages-articles dump"""
+    xml = "  <page>\n    <title>{}</title>\n".format(escape(page.title))
+    xml += "    <ns>{}</ns>\n    <id>{}</id>\n".format(page.ns, page.page_id)
+    if page.redirect is not None:
+        xml += "    <redirect title={} />\n".format(quoteattr(page.redirect))
+    xml += "    <revision>\n      <id>{}</id>\n".format(page.page_id * 100)
+    xml += "      <timestamp>2021-04-20T00:00:00Z</timestamp>\n"
+    xml += "      <contributor>\n        <id>7</id>\n      </contributor>\n"
+    xml += '      <text bytes="{}" xml:space="preserve">{}</text>\n'.format(
+        len(page.text.encode("utf-8")), escape(page.text)
+    )
+    xml += "      <sha1>sha{}</sha1>\n".format(page.page_id)
+    xml += "    </revision>\n  </page>\n"
+    return xml
+
+
+def write_multistream(
+    directory: Path,
+    pages: Iterable[tuple],
+    pages_per_stream: int = 100,
+    file_number: int = 1,
+    wiki: str = "enwiki",
+    date: str = "20210420",
+) -> WikiXMLFile:
+    """Write pages to a multistream .xml-p(.+)p(.+).bz2 file and its index file
+
+    Parameters
+    ----------
+    directory : Path
+        directory to write the files to
+    pages : Iterable[tuple]
+        SyntheticPages (or tuples of their fields) ordered by page_id
+    pages_per_stream : int, optional
+        pages in each bz2 stream, by default 100 (like the real dumps)
+    file_number : int, optional
+        number of the file in the dump, by default 1
+    wiki : str, optional
+        name of the wiki, by default "enwiki"
+    date : str, optional
+        date of the dump, by default "20210420"
+
+    Returns
+    -------
+    WikiXMLFile
+        the file that was written. its index is at its index_path
+    """
+    pages = [SyntheticPage(*page) for page in pages]
+    start_idx, end_idx = pages[0].page_id, pages[-1].page_id
+    name = "{}-{}-pages-articles-multistream{}.xml-p{}p{}.bz2"
+    path = directory.joinpath(name.format(wiki, date, file_number, start_idx, end_idx))
+    header = '<mediawiki xmlns="{}" version="0.10" xml:lang="en">\n'.format(MEDIAWIKI_NS)
+    header += "  <siteinfo>\n    <sitename>Wikipedia</sitename>\n    <namespaces>\n"
+    header += '      <namespace key="0" case="first-letter" />\n'
+    for key, namespace in NAMESPACES.items():
+        header += '      <namespace key="{}" case="first-letter">{}</namespace>\n'.format(
+            key, namespace
+        )
+    header += "    </namespaces>\n  </siteinfo>\n"
+    index_lines = []
+    with open(path, "wb") as xml_file:
+        xml_file.write(bz2.compress(header.encode("utf-8")))
+        for i in range(0, len(pages), pages_per_stream):
+            offset = xml_file.tell()
+            stream = ""
+            for page in pages[i : i + pages_per_stream]:
+                stream += page_xml(page)
+                index_lines.append("{}:{}:{}\n".format(offset, page.page_id, page.title))
+            xml_file.write(bz2.compress(stream.encode("utf-8")))
+        xml_file.write(bz2.compress(b"</mediawiki>\n"))
+    with bz2.open(get_index_path(path), "wt", encoding="utf-8") as index_file:
+        index_file.writelines(index_lines)
+    return WikiXMLFile(start_idx, end_idx, path)
+
+
+def write_dump(
+    directory: Path,
+    num_files: int,
+    pages_per_file: int,
+    pages_per_stream: int = 100,
+    seed: int = 0,
+    **page_options,
+) -> List[WikiXMLFile]:
+    """Write a contiguous synthetic dump of num_files multistream files
+
+    Parameters
+    ----------
+    directory : Path
+        directory to write the files to
+    num_files : int
+        number of files in the dump
+    pages_per_file : int
+        number of pages in each file. page ids run from 1 to num_files * pages_per_file
+    pages_per_stream : int, optional
+        see write_multistream
+    seed : int, optional
+        seed for the first file, by default 0. file i uses seed + i
+    page_options
+        passed to generate_pages (median_words, size_sigma, link_density,
+        redirect_fraction, other_ns_fraction)
+
+    Returns
+    -------
+    files : List[WikiXMLFile]
+        the files that were written, ordered by start_idx
+    """
+    files = []
+    for i in range(num_files):
+        pages = generate_pages(
+            pages_per_file, start_id=i * pages_per_file + 1, seed=seed + i, **page_options
+        )
+        files.append(write_multistream(directory, pages, pages_per_stream, file_number=i + 1))
+    return files
+
+
+def iter_articles(pages: Iterable[SyntheticPage]) -> Iterator[SyntheticPage]:
+    """Pages that the ETL loads: ns 0 pages that aren't redirects"""
+    for page in pages:
+        if page.ns == 0 and page.redirect is None:
+            yield page
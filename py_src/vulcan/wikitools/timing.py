@@ -0,0 +1,125 @@
+"""timing : lightweight per-stage timers and counters for the ETL hot loop
+
+A StageTimer accumulates the monotonic (time.perf_counter_ns) wall time and the
+number of calls of every named stage. Timing a stage costs well under a microsecond,
+so the timers can stay on in production. Timers are plain dicts underneath, so
+workers can send them to the main process (as_dict/from_dict) to be merged.
+
+Stages can be nested (e.g. transliteration inside link extraction). Pass the names
+of nested stages to report() so they aren't counted twice in the total.
+"""
+
+from time import perf_counter_ns
+from typing import Dict, Iterable, Tuple
+
+
+class _Stage:
+    """Context manager that adds the time spent inside it to one stage of a timer"""
+
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer: "StageTimer", name: str) -> None:
+        self.timer = timer
+        self.name = name
+        self.start = 0
+
+    def __enter__(self) -> "_Stage":
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.timer.add(self.name, perf_counter_ns() - self.start)
+
+
+class StageTimer:
+    """Wall time and call counts per named stage
+
+    Examples
+    --------
+    >>> timer = StageTimer()
+    >>> with timer.stage("links"):
+    ...     links = get_links()
+    >>> timer.count("pages")
+    >>> print(timer.report())
+    """
+
+    def __init__(self) -> None:
+        self.times: Dict[str, int] = {}  # stage: total nanoseconds
+        self.counts: Dict[str, int] = {}  # stage/counter: number of calls/events
+
+    def stage(self, name: str) -> _Stage:
+        """Context manager that times its body as one call of stage name"""
+        return _Stage(self, name)
+
+    def add(self, name: str, nanoseconds: int, count: int = 1) -> None:
+        """Add count calls taking nanoseconds in total to stage name"""
+        self.times[name] = self.times.get(name, 0) + nanoseconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def count(self, name: str, count: int = 1) -> None:
+        """Add count to counter name, without any time"""
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def merge(self, other: "StageTimer") -> "StageTimer":
+        """Add every stage and counter of other to self, and return self"""
+        for name, nanoseconds in other.times.items():
+            self.times[name] = self.times.get(name, 0) + nanoseconds
+        for name, count in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+        return self
+
+    def reset(self) -> None:
+        """Remove every stage and counter"""
+        self.times.clear()
+        self.counts.clear()
+
+    def seconds(self, name: str) -> float:
+        """Total time spent in stage name, in seconds"""
+        return self.times.get(name, 0) / 1e9
+
+    def as_dict(self) -> Dict[str, Dict[str, int]]:
+        """Picklable/JSON-able copy of the timer, for sending it between processes"""
+        return {"times": dict(self.times), "counts": dict(self.counts)}
+
+    @classmethod
+    def from_dict(cls, timer_dict: Dict[str, Dict[str, int]]) -> "StageTimer":
+        """Rebuild a timer from as_dict()"""
+        timer = cls()
+        timer.times.update(timer_dict["times"])
+        timer.counts.update(timer_dict["counts"])
+        return timer
+
+    def report(self, title: str = "stage timings", nested: Iterable[str] = ()) -> str:
+        """Multi-line summary with each stage's calls, total time, time per call and
+        share of the total time, followed by the counters that aren't stages
+
+        Parameters
+        ----------
+        title : str, optional
+            first line of the summary, by default "stage timings"
+        nested : Iterable[str], optional
+            stages timed inside other stages, left out of the total, by default ()
+        """
+        nested = set(nested)
+        total = sum(ns for name, ns in self.times.items() if name not in nested)
+        lines = ["{}: {:.3f}s timed".format(title, total / 1e9)]
+        for name, nanoseconds in sorted(self.times.items(), key=_by_time, reverse=True):
+            calls = self.counts[name]
+            line = "  {:<14} {:>10} calls {:>10.3f}s {:>10.1f}us/call {:>6.1%}"
+            lines.append(
+                line.format(
+                    name,
+                    calls,
+                    nanoseconds / 1e9,
+                    nanoseconds / calls / 1e3 if calls != 0 else 0.0,
+                    nanoseconds / total if total != 0 else 0.0,
+                )
+            )
+        for name, count in sorted(self.counts.items()):
+            if name not in self.times:
+                lines.append("  {:<14} {:>10}".format(name, count))
+        return "\n".join(lines)
+
+
+def _by_time(item: Tuple[str, int]) -> int:
+    return item[1]
@@ -0,0 +1,111 @@
+"""transliterate : unidecode transliteration of unicode to ascii for wikitext, with an
+ascii fast path and a per-process LRU cache for short, frequently repeated strings
+
+Most English Wikipedia text is already ascii, so strings are only passed to unidecode
+when they aren't, and then only their non-ascii runs are. Link targets and titles
+repeat millions of times across a dump, so transliterate_cached memoizes them in a
+bounded LRU cache that is shared by everything in the worker process.
+"""
+
+import re
+
+from functools import lru_cache
+from typing import Dict
+
+from unidecode import unidecode
+
+from .timing import StageTimer
+
+DEFAULT_CACHE_SIZE = 1 << 16  # strings kept by transliterate_cached
+NON_ASCII_EX = re.compile(r"[^\x00-\x7f]+")
+# time spent transliterating non-ascii strings (cache hits and ascii aren't counted)
+TIMER = StageTimer()
+
+
+def transliterate(text: str) -> str:
+    """Transliterate text to ascii, giving the same result as unidecode(text)
+
+    Parameters
+    ----------
+    text : str
+        text to transliterate. use transliterate_cached for short strings that repeat
+        (links and titles)
+
+    Returns
+    -------
+    str
+        text itself if it is already ascii, else text with every run of non-ascii
+        characters replaced by its unidecode transliteration
+    """
+    if text.isascii():
+        return text
+    with TIMER.stage("transliterate"):
+        return NON_ASCII_EX.sub(_unidecode_run, text)
+
+
+def _unidecode_run(matches) -> str:
+    return unidecode(matches.group(0))
+
+
+_cached_transliterate = lru_cache(maxsize=DEFAULT_CACHE_SIZE)(transliterate)
+
+
+def transliterate_cached(text: str) -> str:
+    """transliterate for links and titles, memoizing non-ascii strings in an LRU cache
+
+    ascii strings take the fast path and never touch the cache, so they don't count
+    towards cache_stats()
+    """
+    if text.isascii():
+        return text
+    return _cached_transliterate(text)
+
+
+def set_cache_size(maxsize: int) -> None:
+    """Replace the transliterate_cached cache with an empty one holding maxsize strings
+
+    Raises
+    ------
+    TypeError
+        if maxsize isn't an int
+    ValueError
+        if maxsize is negative
+    """
+    global _cached_transliterate  # pylint: disable=global-statement
+    if not isinstance(maxsize, int):
+        msg = "invalid maxsize. maxsize must be an int, not {}"
+        msg = msg.format(type(maxsize))
+        raise TypeError(msg)
+    if maxsize < 0:
+        msg = "maxsize ({}) must be at least 0".format(maxsize)
+        raise ValueError(msg)
+    _cached_transliterate = lru_cache(maxsize=maxsize)(transliterate)
+
+
+def cache_stats() -> Dict[str, float]:
+    """Statistics of the transliterate_cached cache in this process
+
+    Returns
+    -------
+    stats : Dict[str, float]
+        hits, misses, size (strings currently cached), maxsize and hit_rate
+        (hits / lookups, 0.0 before the first lookup)
+    """
+    info = _cached_transliterate.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups != 0 else 0.0,
+    }
+
+
+def cache_stats_msg() -> str:
+    """One line summary of cache_stats() for log files"""
+    stats = cache_stats()
+    msg = "transliteration cache: {:.1%} hit rate ({} hits, {} misses, {}/{} strings)"
+    return msg.format(
+        stats["hit_rate"], stats["hits"], stats["misses"], stats["size"], stats["maxsize"]
+    )
@@ -1,10 +1,11 @@
 import multiprocessing as mp
-import re
+import os
 
 from pathlib import Path
 from typing import Dict, List
 
 from wikitools import WikiXMLFile
+from wikitools.manifest import DUMP_FILE_EX, find_dump_files, get_manifest_path, load_manifest
 
 
 def is_dump_contiguous(wiki_files: List[WikiXMLFile]) -> bool:
@@ -71,13 +72,19 @@ def find_missing_dump_files(
     return result
 
 
-def load_wikifile_list(data_path: Path) -> List[WikiXMLFile]:
+def load_wikifile_list(data_path: Path, use_manifest: bool = True) -> List[WikiXMLFile]:
     """Load and create WikiXMLFiles for all .xml-p(.+)p(.+).bz2 files
 
     Parameters
     ----------
     data_path : Path
         path to where the .xml-p(.+)p(.+).bz2 files are stored
+    use_manifest : bool, optional
+        take the files from the manifest saved in data_path by
+        manifest.build_manifest if there is one, by default True. only the files
+        in the manifest are checked (with a stat each) and only the names that
+        aren't in it are matched. a warning is logged and every file name is matched
+        again if the manifest is missing files or any file changed since it was built
 
     Returns
     -------
@@ -101,20 +108,21 @@ def load_wikifile_list(data_path: Path) -> List[WikiXMLFile]:
                 data_path
             )
         )
-    unsorted_files = []
-    for item in data_path.iterdir():
-        if (
-            re.search(
-                r"^(.+)wiki-(.+)-pages-articles-multistream(.+).xml-p(.+)p(.+).bz2$",
-                str(item),
+    if use_manifest:
+        manifest = load_manifest(data_path)
+        if manifest is not None:
+            current = all(
+                entry.is_current(data_path.joinpath(name)) for name, entry in manifest.items()
             )
-            is None
-        ):
-            continue  # skip if the file isn't part of a pages-articles-multistream
-        start_idx, end_idx = re.split(
-            r"wiki-(.+)-pages-articles-multistream(.+).xml-p(.+)p(.+).bz2",
-            str(item),
-        )[3:5]
-        unsorted_files.append(WikiXMLFile(int(start_idx), int(end_idx), item))
-    sorted_files = sorted(unsorted_files, key=lambda file: file.start_idx)
-    return sorted_files
+            if current:  # a file that isn't in the manifest makes it stale too
+                new_names = [
+                    name
+                    for name in os.listdir(data_path)
+                    if name not in manifest and DUMP_FILE_EX.match(name) is not None
+                ]
+                current = len(new_names) == 0
+            if current:
+                return [entry.wiki_file(data_path) for entry in manifest.values()]
+            load_logger = mp.get_logger()
+            load_logger.warning("%s is out of date, rebuild it", get_manifest_path(data_path))
+    return find_dump_files(data_path)
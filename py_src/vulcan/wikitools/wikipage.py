@@ -3,7 +3,7 @@ about a Wikipedia page
 """
 from typing import List
 
-from ..database import Page
+from ..database import PageText
 
 
 class WikipediaPage(object):
@@ -98,10 +98,10 @@ class WikipediaPage(object):
         """Make sqlalchemy representation of self
         Returns
         -------
-        page : models.Page
-            self represented as a Page from models.py to add to a database
+        page : models.PageText
+            self represented as a PageText from models.py to add to a database
         """
-        page = Page(
+        page = PageText(
             title=self.title,
             headings=self.headings,
             sections=self.sections,
@@ -1,20 +1,59 @@
 import bz2
+import io
 import re
 
+from bisect import bisect_left
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterator, List, Tuple
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from xml.etree.ElementTree import iterparse, Element
 
 import mwparserfromhell as wp
 
-from unidecode import unidecode
+from mwparserfromhell.nodes import Heading
+from mwparserfromhell.wikicode import Wikicode
+
+from . import fastscan
+from .bz2reader import ThreadedBZ2Reader
+from .timing import StageTimer
+from .transliterate import transliterate, transliterate_cached
+
+READ_SIZE = 1 << 20  # bytes of compressed data read at a time
+PAGE_EVENTS = ("start", "end")  # iterparse events iter_pages needs
+
+
+class IndexEntry(NamedTuple):
+    """A single line (offset:page_id:title) of a multistream index file"""
+
+    offset: int
+    page_id: int
+    title: str
+
+
+class XMLPage(NamedTuple):
+    """A <page> from a Wikipedia database dump, as yielded by iter_pages"""
+
+    page_id: int
+    title: str
+    ns: int
+    revision_id: int
+    timestamp: str
+    sha1: str
+    redirect: Optional[str]
+    text: Element
 
 
 class WikiXMLFile(object):
     """Represent an XML chunk of a Wikipedia database dump"""
 
-    def __init__(self, start_idx: int, end_idx: int, path: Path, chunk_size: int = 2000) -> None:
+    def __init__(
+        self,
+        start_idx: int,
+        end_idx: int,
+        path: Path,
+        chunk_size: int = 2000,
+        index_path: Path = None,
+    ) -> None:
         if not isinstance(start_idx, int):
             msg = "WikiXMLFile.start_idx must be an integer. invalid start_idx: {}"
             msg = msg.format(start_idx)
@@ -27,6 +66,12 @@ class WikiXMLFile(object):
             msg = "WikiXMLFile.path must be a pathlib.Path. invalid path: {}"
             msg = msg.format(path)
             raise TypeError(msg)
+        if index_path is None:
+            index_path = get_index_path(path)
+        elif not isinstance(index_path, Path):
+            msg = "WikiXMLFile.index_path must be a pathlib.Path. invalid index_path: {}"
+            msg = msg.format(index_path)
+            raise TypeError(msg)
         if start_idx > end_idx:
             msg = "start_idx ({}) must be less than end_idx ({})"
             msg = msg.format(start_idx, end_idx)
@@ -34,11 +79,16 @@ class WikiXMLFile(object):
         self.start_idx = start_idx
         self.end_idx = end_idx
         self.path = path
+        self.index_path = index_path
         self.chunk_size = chunk_size
         self.pages = 0
         self.additions = 0
         self.duplicates = 0
         self.errors = 0
+        self._index = None
+        self._page_ids = None
+        self._stream_offsets = None
+        self._root_tag = None
 
     def __eq__(self, other):
         """Equality method
@@ -64,6 +114,18 @@ class WikiXMLFile(object):
         else:
             return True
 
+    def __getstate__(self):
+        """Drop the cached index when pickling (e.g. to send self to another process)
+
+        The index can have hundreds of thousands of entries, and it's cheaper for a
+        worker to reload it than to receive it through a pipe
+        """
+        state = self.__dict__.copy()
+        state["_index"] = None
+        state["_page_ids"] = None
+        state["_stream_offsets"] = None
+        return state
+
     def is_real_xml_bz2(self):
         """Checks if the file specified in self.path is really a bzipped xml file
 
@@ -83,12 +145,18 @@ class WikiXMLFile(object):
         return True
 
     @contextmanager
-    def parser(self):
+    def parser(self, events: Tuple[str, ...] = ("end",), threaded: bool = False):
         """Context manager to yield a parser (iterator from
         xml.etree.ElementTree.iterparse) for the .xml.bz2 file at self.path
 
         Parameters
         ----------
+        events : Tuple[str, ...], optional
+            events for iterparse to report, by default ("end",). use PAGE_EVENTS for
+            parsers passed to iter_pages
+        threaded : bool, optional
+            decompress the file in a background thread (ThreadedBZ2Reader) so it
+            overlaps with parsing, by default False
 
         Yields
         -------
@@ -104,19 +172,295 @@ class WikiXMLFile(object):
             msg = "unable to create iterparser because the path is invalid: {}"
             msg = msg.format(self.path.as_posix())
             raise FileNotFoundError(msg)
-        file = bz2.open(self.path, "r")
-        parser = iterparse(file)
+        if threaded:
+            file = ThreadedBZ2Reader(self.path)
+        else:
+            file = bz2.open(self.path, "r")
+        parser = iterparse(file, events=events)
+        try:
+            yield parser
+        finally:
+            file.close()
+
+    def has_index(self) -> bool:
+        """Checks if the multistream index file for self.path exists"""
+        return self.index_path.is_file()
+
+    def load_index(self) -> List[IndexEntry]:
+        """Load (and cache) the multistream index file at self.index_path
+
+        Returns
+        -------
+        index : List[IndexEntry]
+            one entry per page in the file, in the order they appear in the index
+
+        Raises
+        ------
+        FileNotFoundError
+            if the index file doesn't exist
+
+        Notes
+        -----
+        Each line of the index has the form offset:page_id:title, where offset is the
+        byte offset of the bz2 stream (~100 pages each) containing the page. Titles can
+        contain colons, so only the first two colons are used as separators.
+        """
+        if self._index is not None:
+            return self._index
+        if not self.has_index():
+            msg = "unable to load multistream index because the path is invalid: {}"
+            msg = msg.format(self.index_path.as_posix())
+            raise FileNotFoundError(msg)
+        index = []
+        with bz2.open(self.index_path, "rt", encoding="utf-8") as index_file:
+            for line in index_file:
+                line = line.rstrip("\n")
+                if line == "":
+                    continue
+                offset, page_id, title = line.split(":", 2)
+                index.append(IndexEntry(int(offset), int(page_id), title))
+        self._index = index
+        self._page_ids = [entry.page_id for entry in index]
+        self._stream_offsets = sorted(set(entry.offset for entry in index))
+        return self._index
+
+    def stream_ranges(self) -> List[Tuple[int, int]]:
+        """Byte ranges of every bz2 stream containing pages in self.path
+
+        Returns
+        -------
+        ranges : List[Tuple[start : int, end : int]]
+            [start, end) byte offsets of each stream listed in the index, ordered by
+            offset. The header stream (<siteinfo>) isn't listed in the index, so it
+            isn't part of any range. The range of the last stream ends at the end of the
+            file, so it also contains the closing </mediawiki> stream
+        """
+        self.load_index()
+        ends = self._stream_offsets[1:] + [self.path.stat().st_size]
+        return list(zip(self._stream_offsets, ends))
+
+    def read_streams(self, start: int, end: int) -> bytes:
+        """Decompress all of the bz2 streams stored in bytes [start, end) of self.path
+
+        Parameters
+        ----------
+        start : int
+            byte offset of the first stream to decompress
+        end : int
+            byte offset where the last stream to decompress ends
+
+        Returns
+        -------
+        data : bytes
+            decompressed contents of the streams, concatenated
+
+        Raises
+        ------
+        ValueError
+            if [start, end) doesn't contain only complete bz2 streams
+        """
+        with open(self.path, "rb") as file:
+            file.seek(start)
+            compressed = file.read(end - start)
+        chunks = []
+        while compressed:
+            decompressor = bz2.BZ2Decompressor()
+            try:
+                chunks.append(decompressor.decompress(compressed))
+            except OSError as e:
+                msg = "bytes [{}, {}) of {} don't start with a bz2 stream"
+                msg = msg.format(start, end, self.path.name)
+                raise ValueError(msg) from e
+            if not decompressor.eof:
+                msg = "bytes [{}, {}) of {} end in the middle of a bz2 stream"
+                msg = msg.format(start, end, self.path.name)
+                raise ValueError(msg)
+            compressed = decompressor.unused_data
+        return b"".join(chunks)
+
+    def root_tag(self) -> bytes:
+        """Get the opening <mediawiki> tag (with its xmlns) from the header stream
+
+        Streams in the middle of the file are just a series of <page> elements, so
+        they have to be wrapped in the original root element for their tags to be
+        namespaced the same way they are when parsing the whole file
+        """
+        if self._root_tag is None:
+            decompressor = bz2.BZ2Decompressor()
+            header = b""
+            with open(self.path, "rb") as file:
+                while not decompressor.eof:
+                    compressed = file.read(READ_SIZE)
+                    if compressed == b"":
+                        break
+                    header += decompressor.decompress(compressed)
+            matches = re.search(rb"<mediawiki[^>]*>", header)
+            if matches is None:
+                msg = "unable to find the <mediawiki> root element in the header of {}"
+                msg = msg.format(self.path.name)
+                raise ValueError(msg)
+            self._root_tag = matches.group(0)
+        return self._root_tag
+
+    def work_units(self, streams_per_unit: int = 20) -> List[Tuple[int, int]]:
+        """Split self.path into byte ranges of consecutive bz2 streams
+
+        Parameters
+        ----------
+        streams_per_unit : int, optional
+            how many streams (~100 pages each) to put in each unit, by default 20
+
+        Returns
+        -------
+        units : List[Tuple[start : int, end : int]]
+            [start, end) byte ranges that can each be parsed on their own with
+            self.stream_parser(start, end). together they cover every stream in
+            the index exactly once
+        """
+        ranges = self.stream_ranges()
+        units = []
+        for i in range(0, len(ranges), streams_per_unit):
+            unit_ranges = ranges[i : i + streams_per_unit]
+            units.append((unit_ranges[0][0], unit_ranges[-1][1]))
+        return units
+
+    def stream_offset(self, page_id: int) -> int:
+        """Byte offset of the bz2 stream containing page_id
+
+        Raises
+        ------
+        KeyError
+            if page_id isn't listed in the index
+        """
+        index = self.load_index()
+        i = bisect_left(self._page_ids, page_id)
+        if i == len(index) or self._page_ids[i] != page_id:
+            msg = "page_id {} isn't listed in {}".format(page_id, self.index_path.name)
+            raise KeyError(msg)
+        return index[i].offset
+
+    @contextmanager
+    def stream_parser(
+        self,
+        start: int,
+        end: int = None,
+        events: Tuple[str, ...] = ("end",),
+        threaded: bool = False,
+    ):
+        """Context manager to yield a parser (iterator from
+        xml.etree.ElementTree.iterparse) for the bz2 streams in bytes [start, end)
+
+        Parameters
+        ----------
+        start : int
+            byte offset of a stream listed in the index
+        end : int, optional
+            byte offset where the last stream to parse ends, by default None (only
+            parse the single stream starting at start). when end is given, the index
+            isn't loaded, so units from self.work_units can be parsed in other
+            processes without reloading it
+        events : Tuple[str, ...], optional
+            see self.parser
+        threaded : bool, optional
+            decompress [start, end) in a background thread while it is parsed instead
+            of decompressing it all into memory first, by default False. use it for
+            ranges spanning many streams
+
+        Yields
+        -------
+        parser : Iterator
+            from xml.etree.ElementTree.iterparse. yields the same tags (namespaced by
+            the root <mediawiki> element) as self.parser()
+
+        Raises
+        ------
+        FileNotFoundError
+            if the file or its index doesn't actually exist
+        ValueError
+            if start isn't the offset of a stream in the index, or [start, end)
+            doesn't contain only complete streams. when threaded, invalid streams
+            raise OSError or EOFError from the parser instead
+        """
+        if not self.is_real_xml_bz2():
+            msg = "unable to create iterparser because the path is invalid: {}"
+            msg = msg.format(self.path.as_posix())
+            raise FileNotFoundError(msg)
+        if end is None:
+            ranges = self.stream_ranges()
+            i = bisect_left(self._stream_offsets, start)
+            if i == len(self._stream_offsets) or self._stream_offsets[i] != start:
+                msg = "start ({}) isn't the offset of a stream in {}"
+                msg = msg.format(start, self.index_path.name)
+                raise ValueError(msg)
+            end = ranges[i][1]
+        if threaded:
+            # only the range ending at the end of the file has the closing stream
+            suffix = b"" if end >= self.path.stat().st_size else b"</mediawiki>"
+            file = ThreadedBZ2Reader(self.path, start, end, prefix=self.root_tag(), suffix=suffix)
+        else:
+            body = self.read_streams(start, end)
+            body = re.sub(rb"</mediawiki>\s*$", b"", body)
+            file = io.BytesIO(self.root_tag() + body + b"</mediawiki>")
+        parser = iterparse(file, events=events)
         try:
             yield parser
         finally:
             file.close()
 
+    @contextmanager
+    def page_parser(self, page_id: int, events: Tuple[str, ...] = ("end",)):
+        """Context manager to yield a parser for the stream containing page_id
+
+        Parameters
+        ----------
+        page_id : int
+            id of a page listed in the index
+        events : Tuple[str, ...], optional
+            see self.parser
+
+        Yields
+        -------
+        parser : Iterator
+            see self.stream_parser. the parser starts at the beginning of the stream,
+            so pages before page_id in the same stream are yielded first
+
+        Raises
+        ------
+        KeyError
+            if page_id isn't listed in the index
+        """
+        with self.stream_parser(self.stream_offset(page_id), events=events) as parser:
+            yield parser
+
 
 ###################
 # Utility methods #
 ###################
 
 
+def get_index_path(path: Path) -> Path:
+    """Get the path of the multistream index file that goes with a .xml-p(.+)p(.+).bz2
+
+    Parameters
+    ----------
+    path : Path
+        path to a file like
+        enwiki-20210420-pages-articles-multistream16.xml-p20460153p20570392.bz2
+
+    Returns
+    -------
+    index_path : Path
+        path to the file's index, like
+        enwiki-20210420-pages-articles-multistream-index16.txt-p20460153p20570392.bz2
+    """
+    name = re.sub(
+        r"-pages-articles-multistream(.*)\.xml-p",
+        r"-pages-articles-multistream-index\1.txt-p",
+        path.name,
+    )
+    return path.with_name(name)
+
+
 def get_headings_sections(
     element: Element,
 ) -> Tuple[List[str], List[str]]:
@@ -144,7 +488,7 @@ def get_headings_sections(
     up (THEORY: something in parser is stopping their reference counts from going to 0)
     - Length of clean_headings is enforced to be same as length of clean_sections
     - This function will also transliterate any unicode to ascii using the unidecode
-    (https://github.com/avian2/unidecode) module
+    (https://github.com/avian2/unidecode) module, through wikitools.transliterate
     """
     if not isinstance(element, Element):
         msg = "invalid element. element must be an xml.etree.ElementTree.Element"
@@ -177,7 +521,7 @@ def get_headings_sections(
     clean_sections = []
     for section in raw_sections:
         wikicode_free_section = wp.parse(section).strip_code().strip()
-        unicode_transliterated_section = unidecode(wikicode_free_section)
+        unicode_transliterated_section = transliterate(wikicode_free_section)
         clean_sections.append(unicode_transliterated_section)
         del wikicode_free_section
         del unicode_transliterated_section
@@ -206,7 +550,7 @@ def get_pagelinks(
     Notes
     -----
     This function will also transliterate any unicode to ascii using the unidecode
-    (https://github.com/avian2/unidecode) module
+    (https://github.com/avian2/unidecode) module, through wikitools.transliterate
     """
     if not isinstance(element, Element):
         msg = "invalid element. element must be an xml.etree.ElementTree.Element"
@@ -216,19 +560,273 @@ def get_pagelinks(
     clean_pagelinks = []
     for raw_link in raw_pagelinks:
         clean_link = wp.parse(raw_link).strip_code()
-        if not isinstance(clean_link, str):
-            continue  # drop non-strings
-        if re.search(r"thumb\|(.+)", clean_link) is not None:
-            continue  # drop image links
-        if re.search(r"Category:(.+)", clean_link) is not None:
-            continue  # drop category links
-        if clean_link.strip() == "":
-            continue  # drop empty/whitespace-only strings
-        clean_link = unidecode(clean_link)
+        if not is_article_link(clean_link):
+            continue
+        clean_link = transliterate_cached(clean_link)
         clean_pagelinks.append(clean_link)
     return clean_pagelinks
 
 
+def is_article_link(clean_link: str) -> bool:
+    """Check if a stripped pagelink should be kept as a link to another article
+
+    Parameters
+    ----------
+    clean_link : str
+        wikilink after strip_code (its text if it has any, else its title)
+
+    Returns
+    -------
+    bool
+        False for non-strings, image links, category links and empty/whitespace-only
+        strings, else True
+    """
+    if not isinstance(clean_link, str):
+        return False  # drop non-strings
+    if re.search(r"thumb\|(.+)", clean_link) is not None:
+        return False  # drop image links
+    if re.search(r"Category:(.+)", clean_link) is not None:
+        return False  # drop category links
+    if clean_link.strip() == "":
+        return False  # drop empty/whitespace-only strings
+    return True
+
+
+def clean_wikilinks(wikicode: Wikicode) -> List[str]:
+    """Strip, filter and transliterate every wikilink in a parsed article, like
+    get_pagelinks does without reparsing each link"""
+    links = []
+    for raw_link in wikicode.filter_wikilinks():
+        clean_link = Wikicode([raw_link]).strip_code()
+        if not is_article_link(clean_link):
+            continue
+        links.append(transliterate_cached(clean_link))
+    return links
+
+
+def clean_heading_titles(wikicode: Wikicode) -> List[str]:
+    """Strip the titles of every heading in a parsed article and prepend 'Lead', like
+    get_headings_sections does. Articles without headings have no headings at all"""
+    raw_headings = wikicode.filter_headings()
+    clean_headings = []
+    if len(raw_headings) != 0:
+        clean_headings.append("Lead")
+    for heading in raw_headings:
+        clean_headings.append(heading.title.strip_code().strip())
+    return clean_headings
+
+
+def get_headings_sections_links(
+    element: Element,
+    timer: StageTimer = None,
+) -> Tuple[List[str], List[str], List[str]]:
+    """Extract headings, cleaned sections and pagelinks from an article Element,
+    parsing its wikicode only once
+
+    Returns the same values as get_headings_sections and get_pagelinks, which each
+    parse the whole article and then reparse every section/link on its own
+
+    Parameters
+    ----------
+    element : Element
+        xml.etree.ElementTree.Element, the element to extract from
+    timer : StageTimer, optional
+        timer to add the time of the parse, links, headings and sections stages to,
+        by default None
+
+    Returns
+    -------
+    Tuple[clean_headings : List[str], clean_sections : List[str], links : List[str]]
+        see get_headings_sections and get_pagelinks
+
+    Notes
+    -----
+    Sections are stripped straight from the top-level nodes between headings of the
+    single parse tree. If a heading isn't a top-level node (e.g. it is inside a tag
+    that spans several sections), the tree can't be split on it, so the sections
+    are split and reparsed the same way get_headings_sections does.
+    """
+    if not isinstance(element, Element):
+        msg = "invalid element. element must be an xml.etree.ElementTree.Element"
+        raise TypeError(msg)
+    if timer is None:
+        timer = StageTimer()
+    with timer.stage("parse"):
+        wikicode = wp.parse(element.text)
+    with timer.stage("links"):
+        links = clean_wikilinks(wikicode)
+    with timer.stage("headings"):
+        clean_headings = clean_heading_titles(wikicode)
+    with timer.stage("sections"):
+        nodes = list(wikicode.nodes)
+        heading_idxs = [i for i, node in enumerate(nodes) if isinstance(node, Heading)]
+        if len(heading_idxs) != len(clean_headings) - 1:  # some headings are nested in other nodes
+            timer.count("sections_reparsed")
+            _, clean_sections = get_headings_sections(element)
+            return clean_headings, clean_sections, links
+        clean_sections = []
+        if len(clean_headings) != 0:
+            starts = [0] + [i + 1 for i in heading_idxs]
+            ends = heading_idxs + [len(nodes)]
+            for start, end in zip(starts, ends):
+                wikicode_free_section = Wikicode(nodes[start:end]).strip_code().strip()
+                clean_sections.append(transliterate(wikicode_free_section))
+    return clean_headings, clean_sections, links
+
+
+def get_headings_links_fast(
+    element: Element,
+    timer: StageTimer = None,
+) -> Tuple[List[str], List[str]]:
+    """Extract headings and pagelinks from an article Element with the linear scanners
+    in wikitools.fastscan, for builds that only need the link graph
+
+    Parameters
+    ----------
+    element : Element
+        xml.etree.ElementTree.Element, the element to extract from
+    timer : StageTimer, optional
+        timer to add the time of the scan, parse (only for ambiguous pages) and links
+        stages to, by default None
+
+    Returns
+    -------
+    Tuple[clean_headings : List[str], links : List[str]]
+        the same headings as get_headings_sections and the same links as
+        get_pagelinks
+
+    Notes
+    -----
+    Pages the scanners flag as ambiguous are parsed with mwparserfromhell instead
+    (once, even if both the headings and the links need it)
+    """
+    if not isinstance(element, Element):
+        msg = "invalid element. element must be an xml.etree.ElementTree.Element"
+        raise TypeError(msg)
+    if timer is None:
+        timer = StageTimer()
+    with timer.stage("scan"):
+        raw_links = fastscan.scan_wikilinks(element.text)
+        raw_headings = fastscan.scan_headings(element.text)
+    if raw_links is None or raw_headings is None:
+        with timer.stage("parse"):
+            wikicode = wp.parse(element.text)
+    with timer.stage("links"):
+        if raw_links is None:
+            links = clean_wikilinks(wikicode)
+        else:
+            links = [transliterate_cached(link) for link in raw_links if is_article_link(link)]
+    if raw_headings is None:
+        clean_headings = clean_heading_titles(wikicode)
+    elif len(raw_headings) != 0:
+        clean_headings = ["Lead"] + raw_headings
+    else:
+        clean_headings = []
+    return clean_headings, links
+
+
+def iter_pages(
+    parser: Iterator,
+    namespaces: Iterable[int] = (0,),
+    include_redirects: bool = False,
+) -> Iterator[XMLPage]:
+    """Stream the pages in namespaces from a parser, keeping memory flat for any file size
+
+    Parameters
+    ----------
+    parser : Iterator
+        iterator from WikiXMLFile.parser, stream_parser or page_parser, created with
+        events=PAGE_EVENTS
+    namespaces : Iterable[int], optional
+        namespaces (the <ns> element of each page) to yield pages from, by default
+        (0,) (Main/Article). All namespaces are documented at
+        https://en.wikipedia.org/wiki/Wikipedia:Namespace
+    include_redirects : bool, optional
+        also yield redirect pages, by default False
+
+    Yields
+    ------
+    page : XMLPage
+        page id, title (not unidecoded), namespace, id, timestamp and sha1 of the
+        latest revision, title the page redirects to (None if it isn't a redirect)
+        and the <text> Element. The page's Elements are cleared as soon as the next
+        page is requested, so use the text Element before then
+
+    Raises
+    ------
+    TypeError
+        if parser isn't an Iterator
+    ValueError
+        if parser doesn't report start events
+
+    Notes
+    -----
+    Tag names are qualified with the root element's xmlns once, so each event is
+    dispatched with plain string comparisons. Every completed <page> is cleared and
+    removed from the root, so the tree never holds more than one page.
+    """
+    if not isinstance(parser, Iterator):
+        msg = "parser must be an iterator from xml.etree.ElementTree.parser(). invalid parser: {}"
+        msg = msg.format(parser)
+        raise TypeError(msg)
+    namespaces = frozenset(namespaces)
+    event, root = next(parser)
+    if event != "start":
+        msg = "parser must report start events. create it with events=PAGE_EVENTS"
+        raise ValueError(msg)
+    xmlns = root.tag[: root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+    page_tag = xmlns + "page"
+    revision_tag = xmlns + "revision"
+    title_tag = xmlns + "title"
+    ns_tag = xmlns + "ns"
+    id_tag = xmlns + "id"
+    redirect_tag = xmlns + "redirect"
+    timestamp_tag = xmlns + "timestamp"
+    sha1_tag = xmlns + "sha1"
+    text_tag = xmlns + "text"
+
+    in_revision = False
+    page_id, title, ns, redirect = None, None, None, None
+    revision_id, timestamp, sha1, text = None, None, None, None
+    for event, elem in parser:
+        tag = elem.tag
+        if event == "start":
+            if tag == revision_tag:
+                in_revision = True
+            continue
+        if tag == text_tag:
+            text = elem
+        elif tag == id_tag:
+            # the first <id> in a page is the page's, the first in its revision is the
+            # revision's. later ones belong to the revision's <contributor>
+            if not in_revision and page_id is None:
+                page_id = int(elem.text)
+            elif in_revision and revision_id is None:
+                revision_id = int(elem.text)
+        elif tag == title_tag:
+            title = elem.text
+        elif tag == ns_tag:
+            ns = int(elem.text)
+        elif tag == timestamp_tag:
+            timestamp = elem.text
+        elif tag == sha1_tag:
+            sha1 = elem.text
+        elif tag == redirect_tag:
+            redirect = elem.get("title")
+        elif tag == revision_tag:
+            in_revision = False
+        elif tag == page_tag:
+            if ns in namespaces and (include_redirects or redirect is None):
+                yield XMLPage(page_id, title, ns, revision_id, timestamp, sha1, redirect, text)
+            elem.clear()
+            try:
+                root.remove(elem)
+            except ValueError:
+                pass  # page wasn't a direct child of the root
+            page_id, title, ns, redirect = None, None, None, None
+            revision_id, timestamp, sha1, text = None, None, None, None
+
+
 def get_next_title_element(
     parser: Iterator,
 ) -> Tuple[str, Element]:
@@ -306,7 +904,7 @@ def get_next_title_element(
         matches = re.search(r"{(.+)}(text)", elem.tag)
         if matches is not None:
             if title is not None:
-                return unidecode(title), elem
+                return transliterate_cached(title), elem
         # article redirect (redirect) matcher
         matches = re.search(r"{(.+)}(redirect)", elem.tag)
         if matches is not None:
@@ -350,17 +948,13 @@ def wikifile_num_articles_longest_article(wiki_file: WikiXMLFile) -> Tuple[int,
     num_articles = 0
     max_title_len = 0
     longest_title = None
-    with wiki_file.parser() as parser:
-        while True:
-            title, elem = None, None
-            try:
-                title, elem = get_next_title_element(parser)
-                num_articles += 1
-            except StopIteration:
-                return num_articles, longest_title
+    with wiki_file.parser(events=PAGE_EVENTS) as parser:
+        for page in iter_pages(parser):
+            if len(page.title) > 200:
+                continue  # no valid titles appear to be over 200 characters
+            num_articles += 1
+            title = transliterate_cached(page.title)
             if len(title) > max_title_len:
                 max_title_len = len(title)
                 longest_title = title
-            del title
-            elem.clear()
-            del elem
+    return num_articles, longest_title
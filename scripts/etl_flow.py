@@ -1,23 +1,54 @@
 import datetime
+import functools
 import logging
 import multiprocessing as mp
-from time import sleep
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
 
 from os import getpid
 from pathlib import Path
 
-
 # local modules from PYTHONPATH
+import vulcan.wikitools.checkpoint as checkpoint
+import vulcan.wikitools.manifest as manifest
+import vulcan.wikitools.transliterate as transliterate
 import vulcan.wikitools.wikidump as wikidump
 import vulcan.wikitools.wikixml as wikixml
 
+import vulcan.database.bulk
 import vulcan.database.crud
 import vulcan.database.config
+import vulcan.database.models
 
+from vulcan.database.bloom import SharedBloomFilter
+from vulcan.database.writer import BatchSizer, BatchWriter
+from vulcan.scheduler import Scheduler, UnitError, WorkUnit
+from vulcan.wikitools.manifest import FileManifest
+from vulcan.wikitools.timing import StageTimer
 from vulcan.wikitools.wikixml import WikiXMLFile
 from vulcan.wikitools.wikipage import WikipediaPage
 
+# link-graph-only builds: find headings and links with the fast scanners and store
+# every section as an empty string instead of parsing and stripping the wikicode
+LINKS_ONLY = False
+# load pages with COPY through a staging table (database.bulk) instead of the ORM
+BULK_COPY = True
+# chunks parsed ahead while the writer thread commits the last one. 0 commits in the
+# parsing thread instead
+WRITER_QUEUE = 1
+# chunks are committed once their pages hold a number of bytes of text, adapted so a
+# commit takes about COMMIT_SECONDS (writer.BatchSizer), instead of every chunk_size pages
+COMMIT_SECONDS = 2.0
+CHUNK_BYTES = (4 << 20, 256 << 20)  # smallest and largest byte limit
+CHUNK_PAGES = 20000  # most pages in a chunk, however small they are
+# stage timings of every file/work unit this process has loaded
+WORKER_TIMER = StageTimer()
+NESTED_STAGES = ("transliterate",)  # timed inside the links and sections stages
+# shared memory filter of committed titles, set by dump_etl before the workers are
+# forked so they inherit it. only its probable duplicates are looked up in the database
+TITLE_FILTER: Optional[SharedBloomFilter] = None
+# chunk byte limit learned by this process, carried over between files and work units
+BATCH_SIZER: Optional[BatchSizer] = None
+
 
 def closing_msg(file: WikiXMLFile):
 
@@ -31,136 +62,522 @@ def closing_msg(file: WikiXMLFile):
     return close_msg
 
 
-def get_stats_dup_names(file: WikiXMLFile) -> Tuple[str, str]:
+def get_stats_dup_names(file: WikiXMLFile, offset: int = None) -> Tuple[str, str]:
     worker_start = datetime.datetime.now().isoformat()
-    dup_name = "logs/duplicates_{}_{}_{}.txt"
-    dup_name = dup_name.format(file.start_idx, file.end_idx, worker_start)
-    stats_name = "logs/statspid_{}_{}_{}_{}.txt"
-    stats_name = stats_name.format(
-        getpid(), worker_start, file.start_idx, file.end_idx)
+    file_range = "{}_{}".format(file.start_idx, file.end_idx)
+    if offset is not None:  # work unit inside the file
+        file_range += "_{}".format(offset)
+    dup_name = "logs/duplicates_{}_{}.txt"
+    dup_name = dup_name.format(file_range, worker_start)
+    stats_name = "logs/statspid_{}_{}_{}.txt"
+    stats_name = stats_name.format(getpid(), worker_start, file_range)
     return stats_name, dup_name
 
 
-def file_etl(file: WikiXMLFile):
-    """[summary]
+def finish_timer(timer: StageTimer, stats_file: TextIO) -> None:
+    """Add the transliteration time since the last call to timer, add timer to this
+    worker's totals and write both to stats_file"""
+    timer.merge(transliterate.TIMER)
+    transliterate.TIMER.reset()
+    WORKER_TIMER.merge(timer)
+    stats_file.write(timer.report(nested=NESTED_STAGES) + "\n")
+    title = "worker {} stage timings".format(getpid())
+    stats_file.write(WORKER_TIMER.report(title, NESTED_STAGES) + "\n")
+
+
+def commit_pages(
+    file: WikiXMLFile,
+    pages: List[WikipediaPage],
+    session_generator,
+    stats_file: TextIO,
+    duplicates_file: TextIO,
+    timer: StageTimer = None,
+) -> None:
+    """Commit pages to the database and add the results to file's counters (and the
+    time it took to timer's commit stage)"""
+    if timer is None:
+        timer = StageTimer()
+    if BULK_COPY:
+        commit_list_to_db = vulcan.database.bulk.copy_list_to_db
+    else:
+        commit_list_to_db = vulcan.database.crud.commit_list_to_db
+    with timer.stage("commit"):
+        add, dup, err = commit_list_to_db(
+            file, pages, session_generator, stats_file, duplicates_file, TITLE_FILTER
+        )
+    file.additions += add
+    file.duplicates += dup
+    file.errors += err
+
 
-    [extended_summary]
+def batch_writer(
+    file: WikiXMLFile, session_generator, stats_file: TextIO, duplicates_file: TextIO
+) -> BatchWriter:
+    """BatchWriter that commits chunks of file's pages with commit_pages, in a
+    background thread unless WRITER_QUEUE is 0, and sizes them with this process's
+    BatchSizer. Merge its timer() into the worker's timer once it is closed"""
+    global BATCH_SIZER  # pylint: disable=global-statement
+    if BATCH_SIZER is None:
+        BATCH_SIZER = BatchSizer(COMMIT_SECONDS, *CHUNK_BYTES, max_pages=CHUNK_PAGES)
+
+    def commit(pages: List[WikipediaPage]) -> None:
+        commit_pages(file, pages, session_generator, stats_file, duplicates_file)
+
+    return BatchWriter(commit, WRITER_QUEUE, stats_file, BATCH_SIZER)
+
+
+def parser_pages(
+    file: WikiXMLFile, parser, timer: StageTimer = None
+) -> Iterator[Tuple[int, WikipediaPage]]:
+    """Yield the page id and a WikipediaPage for every article in parser, counting them
+    in file.pages
+
+    parser must be created with events=wikixml.PAGE_EVENTS. The time spent waiting on
+    the parser (decompression and XML parsing), extracting and building each page is
+    added to timer
+    """
+    if timer is None:
+        timer = StageTimer()
+    xml_pages = wikixml.iter_pages(parser)
+    while True:
+        with timer.stage("xml"):
+            xml_page = next(xml_pages, None)
+        if xml_page is None:
+            return
+        if len(xml_page.title) > 200:
+            continue  # no valid titles appear to be over 200 characters
+        title = transliterate.transliterate_cached(xml_page.title)
+        element = xml_page.text
+        if LINKS_ONLY:
+            headings, links = wikixml.get_headings_links_fast(element, timer)
+            sections = [""] * len(headings)
+        else:
+            headings, sections, links = wikixml.get_headings_sections_links(element, timer)
+        with timer.stage("page"):
+            page = WikipediaPage(title, headings, sections, links)
+        timer.count("links_found", len(links))
+        file.pages += 1
+        page_id = xml_page.page_id
+        del title, element, headings, sections, xml_page
+        yield page_id, page
+
+
+def etl_parser(
+    file: WikiXMLFile,
+    parser,
+    session_generator,
+    stats_file: TextIO,
+    duplicates_file: TextIO,
+    timer: StageTimer = None,
+):
+    """Extract every article from parser and commit them to the database in chunks,
+    each committed by a background writer (batch_writer) while the next is parsed
 
     Parameters
     ----------
     file : WikiXMLFile
-        [description]
+        file the parser reads from. its pages/additions/duplicates/errors counters
+        are updated in place
+    parser : Iterator
+        iterparse iterator from file.parser() or file.stream_parser(), created with
+        events=wikixml.PAGE_EVENTS
+    session_generator : sessionmaker
+        sessionmaker to commit pages with
+    stats_file : TextIO
+        file to write commit statistics to
+    duplicates_file : TextIO
+        file to write the titles of duplicate pages to
+    timer : StageTimer, optional
+        timer to add the time of every stage to, by default None
+    """
+    if timer is None:
+        timer = StageTimer()
+    pages = []
+    with batch_writer(file, session_generator, stats_file, duplicates_file) as writer:
+        for _, page in parser_pages(file, parser, timer):
+            pages.append(page)
+            if writer.sizer.add(page):
+                writer.submit(pages)  # committed while the next chunk is parsed
+                pages = []
+        writer.submit(pages)
+    timer.merge(writer.timer())
+    stats_file.write(writer.stats_msg() + "\n")
+
+
+def etl_streams(
+    file: WikiXMLFile,
+    session_generator,
+    stats_file: TextIO,
+    duplicates_file: TextIO,
+    checkpoint_path: Path,
+    timer: StageTimer = None,
+) -> None:
+    """Extract and commit every article in file, saving a checkpoint at the bz2 stream
+    boundary after every committed chunk
+
+    Chunks are only committed at stream boundaries (once the BatchSizer says the
+    chunk is full), so the checkpoint can record the last stream whose pages are all
+    in the database. If there is a checkpoint from a previous run,
+    loading resumes at the stream after it. The streams are decompressed in a
+    background thread while the pages are parsed.
+
+    Parameters
+    ----------
+    file : WikiXMLFile
+        file to load. must have a multistream index
+    session_generator : sessionmaker
+        sessionmaker to commit pages with
+    stats_file : TextIO
+        file to write commit statistics to
+    duplicates_file : TextIO
+        file to write the titles of duplicate pages to
+    checkpoint_path : Path
+        path of the checkpoint file for file
+    timer : StageTimer, optional
+        timer to add the time of every stage to, by default None
+
+    Notes
+    -----
+    A stream is known to be finished once a page from a later stream is parsed, since
+    streams are read in order. If a run dies after committing a chunk but before its
+    checkpoint is written, the resumed run re-extracts that chunk and its pages are
+    counted as duplicates.
+    """
+    etl_logger = mp.get_logger()
+    state = checkpoint.load_checkpoint(checkpoint_path, file)
+    ranges = file.stream_ranges()
+    last_page_ids = {}  # stream offset: id of the last page in the stream
+    for entry in file.load_index():
+        last_page_ids[entry.offset] = entry.page_id
+    if state is not None:
+        msg = "resuming {} after stream {} (page id {})"
+        msg = msg.format(file.path.name, state["offset"], state["page_id"])
+        etl_logger.info(msg)
+        stats_file.write(msg + "\n")
+        ranges = [(start, end) for start, end in ranges if start > state["offset"]]
+    if len(ranges) == 0:
+        return
+    if timer is None:
+        timer = StageTimer()
+    pages = []
+    stream = ranges[0][0]  # offset of the stream the last page came from
+    with file.stream_parser(
+        ranges[0][0], ranges[-1][1], events=wikixml.PAGE_EVENTS, threaded=True
+    ) as parser, batch_writer(file, session_generator, stats_file, duplicates_file) as writer:
+        for page_id, page in parser_pages(file, parser, timer):
+            offset = file.stream_offset(page_id)
+            if offset != stream and writer.sizer.full():  # stream finished
+                # checkpoint once the writer has committed the chunk. file.pages
+                # already counts page, the first of the next stream
+                save = functools.partial(
+                    checkpoint.save_checkpoint,
+                    checkpoint_path,
+                    file,
+                    stream,
+                    last_page_ids[stream],
+                    pages=file.pages - 1,
+                )
+                writer.submit(pages, save)
+                pages = []
+            stream = offset
+            pages.append(page)
+            writer.sizer.add(page)
+        last_stream = ranges[-1][0]
+        save = functools.partial(
+            checkpoint.save_checkpoint,
+            checkpoint_path,
+            file,
+            last_stream,
+            last_page_ids[last_stream],
+            complete=True,
+        )
+        writer.submit(pages, save)
+    timer.merge(writer.timer())
+    stats_file.write(writer.stats_msg() + "\n")
+
+
+def file_etl(file: WikiXMLFile, db_uri: str = None) -> Tuple[int, int, int, int, dict]:
+    """Extract, transform, and load every article in file into the database
+
+    If file has a multistream index, it is loaded one bz2 stream at a time and a
+    checkpoint is saved after every commit, so a killed run resumes where it
+    stopped. Files that a previous run already finished are skipped.
+
+    Parameters
+    ----------
+    file : WikiXMLFile
+        file to load
+    db_uri : str, optional
+        uri of the database to load into, by default None (config.DATABASE_URI)
 
     Returns
     -------
-    [type]
-        [description]
+    Tuple[pages : int, additions : int, duplicates : int, errors : int, timings : dict]
+        file's counters (including those restored from a checkpoint) and
+        StageTimer.as_dict() for this run, once the whole file has been committed
     """
     etl_logger = mp.get_logger()
+    checkpoint_path = checkpoint.get_checkpoint_path(file)
+    state = checkpoint.load_checkpoint(checkpoint_path, file) if file.has_index() else None
+    if state is not None and state["complete"]:
+        etl_logger.info("%s was already loaded by a previous run, skipping", file.path.name)
+        return file.pages, file.additions, file.duplicates, file.errors, StageTimer().as_dict()
     # database
-    session_generator = database.config.get_sessionmaker()
+    session_generator = vulcan.database.config.get_sessionmaker(db_uri)
     # loop
     stats_name, dup_name = get_stats_dup_names(file)
-    pages = []
-    with file.parser() as parser, open(dup_name, "w") as duplicates_file, open(
-        stats_name, "w"
-    ) as stats_file:
-        while True:
-            try:
-                title, element = wikixml.get_next_title_element(parser)
-                if file.pages >= 2000:
-                    raise StopIteration
-            except StopIteration:
-                add, dup, err = database.crud.commit_list_to_db(
-                    file, pages, session_generator, stats_file, duplicates_file
-                )
-                file.additions += add
-                file.duplicates += dup
-                file.errors += err
-                # closing-specific
-                close_msg = closing_msg(file)
-                etl_logger.info(close_msg)
-                stats_file.write(close_msg + "\n")
-                return 0
-
-            links = wikixml.get_pagelinks(element)
-            headings, sections = wikixml.get_headings_sections(element)
-            page = WikipediaPage(title, headings, sections, links)
-            pages.append(page)
-            file.pages += 1
-            element.clear()
-            del title, element, headings, sections, page
-            # every chunksize
-            if file.pages % file.chunk_size == 0:
-                add, dup, err = database.crud.commit_list_to_db(
-                    file, pages, session_generator, stats_file, duplicates_file
-                )
-                file.additions += add
-                file.duplicates += dup
-                file.errors += err
-                pages = []  # reset pages after committing the existing ones
+    timer = StageTimer()
+    with open(dup_name, "w") as duplicates_file, open(stats_name, "w") as stats_file:
+        if file.has_index():
+            etl_streams(
+                file, session_generator, stats_file, duplicates_file, checkpoint_path, timer
+            )
+        else:
+            with file.parser(events=wikixml.PAGE_EVENTS, threaded=True) as parser:
+                etl_parser(file, parser, session_generator, stats_file, duplicates_file, timer)
+        # closing-specific
+        close_msg = closing_msg(file)
+        etl_logger.info(close_msg)
+        stats_file.write(close_msg + "\n")
+        stats_file.write(transliterate.cache_stats_msg() + "\n")
+        stats_file.write(vulcan.database.config.pool_stats_msg(db_uri) + "\n")
+        finish_timer(timer, stats_file)
+    return file.pages, file.additions, file.duplicates, file.errors, timer.as_dict()
+
+
+def stream_etl(file: WikiXMLFile, start: int, end: int) -> Tuple[int, int, int, int, dict]:
+    """Extract, transform, and load the articles in bytes [start, end) of file
+
+    Intended to run in a process pool on the work units from file.work_units(), so
+    several processes can share a single file
+
+    Parameters
+    ----------
+    file : WikiXMLFile
+        file the work unit belongs to. the copy sent to the worker starts with all
+        of its counters at 0
+    start : int
+        byte offset of the first bz2 stream in the unit
+    end : int
+        byte offset where the last bz2 stream in the unit ends
+
+    Returns
+    -------
+    Tuple[pages : int, additions : int, duplicates : int, errors : int, timings : dict]
+        counters and StageTimer.as_dict() for this unit only, to be added to the
+        parent's file
+    """
+    file.pages, file.additions, file.duplicates, file.errors = 0, 0, 0, 0
+    session_generator = vulcan.database.config.get_sessionmaker()
+    stats_name, dup_name = get_stats_dup_names(file, start)
+    timer = StageTimer()
+    with file.stream_parser(start, end, events=wikixml.PAGE_EVENTS, threaded=True) as parser, open(
+        dup_name, "w"
+    ) as duplicates_file, open(stats_name, "w") as stats_file:
+        etl_parser(file, parser, session_generator, stats_file, duplicates_file, timer)
+        stats_file.write(transliterate.cache_stats_msg() + "\n")
+        stats_file.write(vulcan.database.config.pool_stats_msg() + "\n")
+        finish_timer(timer, stats_file)
+    return file.pages, file.additions, file.duplicates, file.errors, timer.as_dict()
+
+
+def dump_etl(
+    files: List[WikiXMLFile],
+    max_workers: int,
+    main_stats: TextIO,
+    main_timer: StageTimer = None,
+    streams_per_unit: int = None,
+    units_per_worker: int = 1,
+    dump_manifest: Dict[str, FileManifest] = None,
+    unit_bytes: int = None,
+    title_filter: SharedBloomFilter = None,
+    title_filter_path: Path = None,
+) -> List[UnitError]:
+    """Load every file with a Scheduler, either one process per file (file_etl) or one
+    bz2 stream work unit at a time (stream_etl)
+
+    Units are dispatched largest-first as soon as a worker is free, so the run ends on
+    the smallest units. Each file's totals and stage timings are written to
+    main_stats as soon as its last unit finishes.
+
+    Parameters
+    ----------
+    files : List[WikiXMLFile]
+        files to load
+    max_workers : int
+        number of worker processes
+    main_stats : TextIO
+        main process's log file
+    main_timer : StageTimer, optional
+        timer to add the stage timings of every unit to, by default None
+    streams_per_unit : int, optional
+        number of bz2 streams (~100 pages each) in every work unit, by default None
+        (one unit per file). every file must have a multistream index if set
+    units_per_worker : int, optional
+        units a worker loads before it is replaced by a fresh process, by default 1
+    dump_manifest : Dict[str, FileManifest], optional
+        manifest of the dump (manifest.build_manifest), by default None. unit sizes
+        are taken from it instead of stat-ing every file
+    unit_bytes : int, optional
+        size each file's stream work units to ~unit_bytes compressed bytes using the
+        stream counts in dump_manifest instead of a fixed streams_per_unit, by default
+        None. requires dump_manifest
+    title_filter : SharedBloomFilter, optional
+        filter of committed titles shared by the workers, by default None (every
+        title is looked up in the database)
+    title_filter_path : Path, optional
+        where to save title_filter every time a file finishes, so a resumed run
+        starts with it, by default None (not saved)
+
+    Returns
+    -------
+    errors : List[UnitError]
+        units that failed. their files' totals only include the other units
+    """
+    main_logger = mp.get_logger()
+    if main_timer is None:
+        main_timer = StageTimer()
+    if unit_bytes is not None and dump_manifest is None:
+        raise ValueError("unit_bytes requires dump_manifest")
+    global TITLE_FILTER  # pylint: disable=global-statement
+    TITLE_FILTER = title_filter  # inherited by the workers when they are forked
+    by_stream = streams_per_unit is not None or unit_bytes is not None
+    by_name = {file.path.name: file for file in files}
+    remaining: Dict[str, int] = {}  # work units left to finish for each file
+    file_timers: Dict[str, StageTimer] = {}
+    units = []
+    for file in files:
+        name = file.path.name
+        file_timers[name] = StageTimer()
+        entry = dump_manifest.get(name) if dump_manifest is not None else None
+        if not by_stream:
+            size = entry.size if entry is not None else file.path.stat().st_size
+            units.append(WorkUnit((name, 0), size, (file,)))
+            remaining[name] = 1
+        else:
+            if unit_bytes is not None:
+                file_units = file.work_units(entry.streams_per_unit(unit_bytes))
+            else:
+                file_units = file.work_units(streams_per_unit)
+            for start, end in file_units:
+                units.append(WorkUnit((name, start), end - start, (file, start, end)))
+            remaining[name] = len(file_units)
+        msg = "queued {} work units from {}".format(remaining[name], name)
+        main_logger.info(msg)
+        main_stats.write(msg + "\n")
+
+    def finish_unit(name: str) -> None:
+        remaining[name] -= 1
+        if remaining[name] == 0:
+            file = by_name[name]
+            close_msg = closing_msg(file)
+            main_logger.info(close_msg)
+            main_stats.write(close_msg + "\n")
+            file_timer = file_timers.pop(name)
+            main_stats.write(file_timer.report(nested=NESTED_STAGES) + "\n")
+            main_timer.merge(file_timer)
+            if title_filter is not None and title_filter_path is not None:
+                title_filter.save(title_filter_path)
+
+    def on_result(unit: WorkUnit, result: tuple) -> None:
+        name = unit.key[0]
+        file = by_name[name]
+        pages, additions, duplicates, errors, timings = result
+        file.pages += pages
+        file.additions += additions
+        file.duplicates += duplicates
+        file.errors += errors
+        file_timers[name].merge(StageTimer.from_dict(timings))
+        finish_unit(name)
+
+    def on_error(error: UnitError) -> None:
+        msg = "work unit {} failed:\n{}".format(error.unit.key, error.message)
+        main_stats.write(msg + "\n")
+        finish_unit(error.unit.key[0])
+
+    scheduler = Scheduler(
+        stream_etl if by_stream else file_etl,
+        max_workers,
+        max_units_per_worker=units_per_worker,
+        on_result=on_result,
+        on_error=on_error,
+        name="Xml_consumer",
+    )
+    return scheduler.run(units)
 
 
 if __name__ == "__main__":
     # change me to customize
     data_path = Path("/hdd/datasets/wikipedia_4_20_21")
-    sleep_time = 2  # in minutes
     MAX_WORKERS = 12  # nprocesses, 1 thread/process
+    STREAM_PARALLEL = False  # split files into bz2 stream work units instead of 1 process/file
+    STREAMS_PER_UNIT = 20  # ~100 pages per stream
+    UNIT_BYTES = None  # size stream work units by compressed bytes instead (e.g. 16 << 20)
+    VERIFY_CHECKSUMS = True  # check files against the dump's *-md5sums.txt/*-sha1sums.txt
+    UNITS_PER_WORKER = 50  # stream work units a worker loads before it is replaced
+    TRANSLITERATION_CACHE_SIZE = 1 << 16  # link/title transliterations cached per worker
+    # filter of committed titles for the ORM path (BULK_COPY = False)
+    TITLE_FILTER_CAPACITY = 8_000_000  # titles, a bit over the number of articles
+    TITLE_FILTER_PATH = Path("logs/title_filter.bin")  # loaded by a resumed run
+    TEXT_PARTITIONS = 0  # hash partition a new text table by title so workers don't contend
 
     # don't change below here
     logger = mp.log_to_stderr()
     logger.setLevel(logging.INFO)
-    files = wikidump.load_wikifile_list(data_path)
+    transliterate.set_cache_size(TRANSLITERATION_CACHE_SIZE)  # inherited by the workers
+    # scanned once, then only for new or changed files
+    dump_manifest = manifest.build_manifest(data_path, MAX_WORKERS)
+    if VERIFY_CHECKSUMS:
+        problems = manifest.verify_checksums(data_path, dump_manifest)
+        for name, file_problems in problems.items():
+            logger.error("%s failed verification: %s", name, "; ".join(file_problems))
+        if len(problems) != 0:
+            raise ValueError("{} dump files failed verification".format(len(problems)))
+    files = [entry.wiki_file(data_path) for entry in dump_manifest.values()]
+    if TEXT_PARTITIONS != 0:  # before any worker creates an unpartitioned text table
+        with vulcan.database.config.get_engine() as engine:
+            vulcan.database.models.create_all_tables(engine, TEXT_PARTITIONS)
     CHECK_FOR_CONTIGUOUS = wikidump.is_dump_contiguous(files)
     logger.info("database dump contiguous: %s", CHECK_FOR_CONTIGUOUS)
     # main thread log file
     main_start = datetime.datetime.now().isoformat()
     main_stats = open("logs/main_{}.txt".format(main_start), "w")
-    # workers
-    workers = []
-    worker_counter = 0
-    while len(files) != 0:
-        for i, worker in enumerate(workers):  # verify workers aren't dead
-            if worker.exitcode is not None:
-                workers.pop(i)
-                msg = "waiting to join completed worker {}".format(worker.pid)
-                logger.info(msg)
-                main_stats.write(msg + "\n")
-                worker.join()
-                msg = "successfully joined completed worker {}".format(
-                    worker.pid)
-                logger.info(msg)
-                main_stats.write(msg + "\n")
-        if len(workers) == MAX_WORKERS:  # if all workers still alive
-            logger.info(
-                "no completed workers. sleeping for %i minutes", sleep_time)
-            sleep(sleep_time * 60)  # wait 10 minutes
-            logger.info(
-                "main thread woke up, checking if there are any completed workers"
-            )
-        else:
-            for i in range(MAX_WORKERS - len(workers)):  # add workers
-                try:
-                    wikifile = files.pop(0)
-                    p = mp.Process(
-                        target=file_etl,
-                        name="Xml_consumer_{}".format(worker_counter),
-                        args=(wikifile,),
-                    )
-                    workers.append(p)
-                    p.start()
-                    msg = "started process pid - {}. worker count is {}"
-                    msg = msg.format(p.pid, len(workers))
-                    logger.info(msg)
-                    main_stats.write(msg + "\n")
-                    worker_counter += 1
-                except IndexError:  # reached end of list
-                    logger.info("all XML files have been assigned to workers")
-                    break
-
-    # wait for wikifiles to be consumed
-    logger.info("waiting for workers to finish")
-    for worker in workers:
-        worker.join()
+    main_timer = StageTimer()  # stage timings rolled up from every worker
+    title_filter = None  # COPY finds duplicates with ON CONFLICT, it doesn't need one
+    if not BULK_COPY and TITLE_FILTER_PATH.is_file():
+        # missing the titles committed after it was saved if the last run crashed.
+        # commit_list_to_db looks every title up once it hits one of them
+        title_filter = SharedBloomFilter.load(TITLE_FILTER_PATH)
+    elif not BULK_COPY:  # first run, or a database that was loaded another way
+        title_filter = SharedBloomFilter(TITLE_FILTER_CAPACITY)
+        seeded = title_filter.seed_from_db(vulcan.database.config.get_sessionmaker())
+        logger.info("seeded the title filter with %i titles", seeded)
+    if STREAM_PARALLEL:
+        dump_etl(
+            files,
+            MAX_WORKERS,
+            main_stats,
+            main_timer,
+            STREAMS_PER_UNIT,
+            UNITS_PER_WORKER,
+            dump_manifest,
+            UNIT_BYTES,
+            title_filter,
+            TITLE_FILTER_PATH,
+        )
+    else:  # a fresh process for every file
+        dump_etl(
+            files,
+            MAX_WORKERS,
+            main_stats,
+            main_timer,
+            dump_manifest=dump_manifest,
+            title_filter=title_filter,
+            title_filter_path=TITLE_FILTER_PATH,
+        )
+    if title_filter is not None:
+        title_filter.save(TITLE_FILTER_PATH)
+        title_filter.close()
+    main_stats.write(main_timer.report("all workers stage timings", NESTED_STAGES) + "\n")
     logger.info("all work complete")
     main_stats.close()
@@ -25,6 +25,7 @@ setup(
     install_requires=[
         "blist==1.3.6",
         "mwparserfromhell==0.6.2",
+        "numpy==1.20.3",
         "psycopg2==2.9.1",
         "pydantic==1.8.2",
         "SQLAlchemy==1.4.20",
@@ -34,6 +35,7 @@ setup(
     packages=[
         "vulcan",
         "vulcan.database",
+        "vulcan.graph",
         "vulcan.wikitools",
     ],
     # rust extensions are not zip safe, just like C-extensions.
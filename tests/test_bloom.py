@@ -0,0 +1,109 @@
+"""Tests for the database.bloom module
+
+Coverage
+--------
+SharedBloomFilter
+
+Missing
+-------
+SharedBloomFilter.seed_from_db
+
+"""
+import multiprocessing as mp
+import unittest
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from database.bloom import SharedBloomFilter, filter_size
+
+
+def add_titles(name, lock, titles):
+    title_filter = SharedBloomFilter.attach(name, lock)
+    title_filter.add_many(titles)
+    title_filter.close()
+
+
+class SharedBloomFilterTest(unittest.TestCase):
+    """Test SharedBloomFilter
+
+    Tests
+    -----
+    contains
+        is every added title found, with about error_rate false positives?
+    classify
+        are titles split into certain (exact set) and probable duplicates?
+    attach
+        are titles added by another process attached by name seen by the creator?
+    save_load
+        does a filter survive the round trip through save/load?
+    params
+        will the constructor raise the correct errors for invalid parameters?
+    """
+
+    def setUp(self):
+        self.filter = SharedBloomFilter(5000, 0.01)
+
+    def tearDown(self):
+        self.filter.close()
+
+    def test_contains(self):
+        self.assertEqual(filter_size(5000, 0.01), (47928, 7))
+        added = ["Title {}".format(i) for i in range(5000)]
+        self.filter.add_many(added)
+        self.filter.add("Ünïcödé title")
+        for title in added + ["Ünïcödé title"]:
+            self.assertIn(title, self.filter)
+        false_positives = sum("Other {}".format(i) in self.filter for i in range(10000))
+        self.assertLess(false_positives, 300)  # ~1% expected
+        self.assertAlmostEqual(self.filter.fill_ratio(), 0.5, delta=0.05)
+
+    def test_classify(self):
+        self.filter.add_many(["A", "B"])
+        certain, probable = self.filter.classify(["A", "B", "C"])
+        self.assertEqual((certain, probable), (set(), ["A", "B"]))
+        exact_filter = SharedBloomFilter(100, exact=True)
+        exact_filter.add("A")
+        certain, probable = exact_filter.classify(["A", "C"])
+        self.assertEqual((certain, probable), ({"A"}, []))
+        exact_filter.close()
+
+    def test_attach(self):
+        lock = self.filter.lock
+        titles = ["Worker {}".format(i) for i in range(100)]
+        process = mp.Process(target=add_titles, args=(self.filter.name, lock, titles))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        for title in titles:
+            self.assertIn(title, self.filter)
+        self.assertNotIn("Creator", self.filter)
+
+    def test_save_load(self):
+        self.filter.add_many(["A", "B"])
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir).joinpath("title_filter.bin")
+            self.filter.save(path)
+            loaded = SharedBloomFilter.load(path)
+            self.assertNotEqual(loaded.name, self.filter.name)
+            self.assertEqual((loaded.bits, loaded.hashes), (self.filter.bits, self.filter.hashes))
+            self.assertIn("A", loaded)
+            self.assertIn("B", loaded)
+            loaded.close()
+            path.write_bytes(path.read_bytes()[:-1])
+            with self.assertRaisesRegex(ValueError, "truncated"):
+                SharedBloomFilter.load(path)
+
+    def test_params(self):
+        with self.assertRaisesRegex(TypeError, "invalid capacity"):
+            SharedBloomFilter("10")
+        with self.assertRaisesRegex(TypeError, "invalid error_rate"):
+            SharedBloomFilter(10, 1)
+        with self.assertRaisesRegex(ValueError, r"capacity \(0\) must be at least 1"):
+            SharedBloomFilter(0)
+        with self.assertRaisesRegex(ValueError, "between 0 and 1"):
+            SharedBloomFilter(10, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,316 @@
+"""Tests for the database.bulk module
+
+Coverage
+--------
+copy_text
+array_literal
+page_row
+encode_rows
+copy_pages into a hash partitioned table (against a fake cursor)
+copy_list_to_db (against a fake cursor)
+crud.commit_list_to_db falling back to a savepoint per page (against a fake session)
+models.partitioned_text_ddl
+
+Missing
+-------
+copy_pages against a live PostgreSQL database
+
+"""
+import contextlib
+import io
+import os
+import re
+import unittest
+
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+import database.bulk as bulk
+import database.crud as crud
+import database.models as models
+
+from wikitools.wikipage import WikipediaPage
+from wikitools.wikixml import WikiXMLFile
+
+
+class FakeCursor:
+    """Records the COPY input and returns the titles not in existing from the INSERT.
+    If there are partitions, a title is in partition len(title) % modulus"""
+
+    def __init__(self, existing, partitions=()):
+        self.existing = existing
+        self.partitions = list(partitions)
+        self.copied = None
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+
+    def copy_expert(self, statement, buffer):
+        self.statements.append(statement)
+        self.copied = buffer.read()
+
+    def fetchall(self):
+        if self.statements[-1] == bulk.SELECT_PARTITIONS:
+            return self.partitions
+        titles = [line.split("\t")[0] for line in self.copied.splitlines()]
+        titles = [title for title in titles if title not in self.existing]
+        match = re.search(
+            r"satisfies_hash_partition\(\d+, (\d+), (\d+), title\)", self.statements[-1]
+        )
+        if match is not None:
+            modulus, remainder = int(match.group(1)), int(match.group(2))
+            titles = [title for title in titles if len(title) % modulus == remainder]
+        return [(title,) for title in titles]
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Just enough of a Session for session.connection().connection.cursor()"""
+
+    def __init__(self, cursor):
+        self.connection_proxy = type("Raw", (), {"cursor": lambda _: cursor})()
+        self.committed = False
+
+    def connection(self):
+        return type("Connection", (), {"connection": self.connection_proxy})
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeOrmSession:
+    """Just enough of a Session for crud.commit_list_to_db. The table holds the
+    titles in existing, and flushing one of them or a page with a heading over 200
+    characters fails"""
+
+    def __init__(self, existing=()):
+        self.existing = set(existing)
+        self.pending = []
+        self.committed = []
+        self.savepoints = 0
+
+    def query(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def __iter__(self):
+        return iter(SimpleNamespace(title=title) for title in self.existing)
+
+    def add(self, row):
+        self.pending.append(row)
+
+    def add_all(self, rows):
+        self.pending.extend(rows)
+
+    def flush(self):
+        for row in self.pending:
+            if row.title in self.existing:
+                raise IntegrityError("INSERT INTO text", {}, ValueError("duplicate key"))
+            if any(len(heading) > 200 for heading in row.headings):
+                raise ValueError("value too long for type character varying(200)")
+
+    @contextlib.contextmanager
+    def begin_nested(self):
+        self.savepoints += 1
+        start = len(self.pending)
+        try:
+            yield
+            self.flush()
+        except Exception:
+            del self.pending[start:]
+            raise
+
+    def commit(self):
+        self.flush()
+        self.committed.extend(row.title for row in self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+class EncodingTest(unittest.TestCase):
+    """Test the COPY text format encoders
+
+    Tests
+    -----
+    copy_text
+        are backslashes, tabs, newlines and carriage returns escaped, and None NULL?
+    array_literal
+        is every element quoted, with quotes and backslashes escaped?
+    page_row
+        is a page encoded as one tab-separated line, arrays escaped twice?
+    encode_rows
+        are rows of plain values encoded as tab-separated lines, None NULL?
+    """
+
+    def test_copy_text(self):
+        self.assertEqual(bulk.copy_text("plain"), "plain")
+        self.assertEqual(bulk.copy_text("a\tb\nc\rd\\e"), "a\\tb\\nc\\rd\\\\e")
+        self.assertEqual(bulk.copy_text(None), "\\N")
+        self.assertEqual(bulk.copy_text(""), "")
+
+    def test_array_literal(self):
+        self.assertEqual(bulk.array_literal([]), "{}")
+        self.assertEqual(bulk.array_literal(["a", "b c"]), '{"a","b c"}')
+        self.assertEqual(bulk.array_literal(["NULL", "{x,y}"]), '{"NULL","{x,y}"}')
+        self.assertEqual(bulk.array_literal(['say "hi"', "C:\\"]), '{"say \\"hi\\"","C:\\\\"}')
+
+    def test_page_row(self):
+        page = WikipediaPage("Tab\tTitle", ["Lead", "Quote"], ["line 1\nline 2", 'a "b"'], [])
+        row = bulk.page_row(page)
+        self.assertTrue(row.endswith("\n"))
+        self.assertEqual(row.count("\n"), 1)
+        fields = row[:-1].split("\t")
+        self.assertEqual(
+            fields,
+            ["Tab\\tTitle", '{"Lead","Quote"}', '{"line 1\\nline 2","a \\\\"b\\\\""}', "{}"],
+        )
+
+    def test_encode_rows(self):
+        buffer = bulk.encode_rows([(12, "A B"), (13, "Tab\tC"), (14, None)])
+        self.assertEqual(buffer.read(), "12\tA B\n13\tTab\\tC\n14\t\\N\n")
+        self.assertEqual(bulk.encode_rows([]).read(), "")
+
+
+class CopyPagesTest(unittest.TestCase):
+    """Test copy_pages
+
+    Tests
+    -----
+    partitions
+        is the staging table inserted into every hash partition once, starting from a
+        partition that depends on the pid?
+    rotate
+        does rotate start at index start, wrapping around?
+    ddl
+        is text created partitioned by hash of title, with one table per remainder?
+    """
+
+    def test_partitions(self):
+        bound = "FOR VALUES WITH (modulus 3, remainder {})"
+        partitions = [("text_p{}".format(i), 16384, bound.format(i)) for i in range(3)]
+        cursor = FakeCursor({"BB"}, partitions)
+        pages = [WikipediaPage(title, [], [], []) for title in ["A", "BB", "CCC", "DDDD"]]
+        inserted = bulk.copy_pages(cursor, pages)
+        self.assertEqual(sorted(inserted), ["A", "CCC", "DDDD"])
+        inserts = [statement for statement in cursor.statements if statement.startswith("INSERT")]
+        self.assertEqual(len(inserts), 3)
+        for statement in inserts:
+            self.assertIn("satisfies_hash_partition(16384, 3", statement)
+        names = [statement.split()[2] for statement in inserts]
+        self.assertEqual(sorted(names), ["text_p0", "text_p1", "text_p2"])
+        self.assertEqual(names[0], "text_p{}".format(os.getpid() % 3))
+        cursor = FakeCursor(set())
+        bulk.copy_pages(cursor, pages)
+        self.assertTrue(cursor.statements[-1].startswith("INSERT INTO text (title"))
+
+    def test_ddl(self):
+        statements = models.partitioned_text_ddl(postgresql.dialect(), 3)
+        self.assertEqual(len(statements), 4)
+        self.assertTrue(statements[0].startswith("CREATE TABLE text ("))
+        self.assertTrue(statements[0].endswith("PARTITION BY HASH (title)"))
+        self.assertEqual(
+            statements[3],
+            "CREATE TABLE text_p2 PARTITION OF text FOR VALUES WITH (MODULUS 3, REMAINDER 2)",
+        )
+        with self.assertRaisesRegex(ValueError, r"partitions \(1\) must be at least 2"):
+            models.partitioned_text_ddl(postgresql.dialect(), 1)
+
+    def test_rotate(self):
+        self.assertEqual(bulk.rotate([0, 1, 2], 4), [1, 2, 0])
+        self.assertEqual(bulk.rotate([], 4), [])
+
+
+class CopyListToDbTest(unittest.TestCase):
+    """Test copy_list_to_db
+
+    Tests
+    -----
+    counts
+        are pages already in the table and repeated within the batch counted and
+        written as duplicates, the list emptied, and the batch's pages logged?
+    fallback
+        is a batch that can't be copied committed page by page, each page in a
+        savepoint, with the bad pages counted as errors?
+    stale_filter
+        is a title that a stale filter calls new but is in the table counted as a
+        duplicate, after looking every title up?
+    """
+
+    def test_counts(self):
+        cursor = FakeCursor(existing={"B"})
+        session = FakeSession(cursor)
+        pages = [WikipediaPage(title, [], [], []) for title in ["A", "B", "C", "A"]]
+        duplicates_file, stats_file = io.StringIO(), io.StringIO()
+        file = WikiXMLFile(1, 4, Path("test"))
+        result = bulk.copy_list_to_db(file, pages, lambda: session, stats_file, duplicates_file)
+        self.assertEqual(result, (2, 2, 0))
+        self.assertRegex(stats_file.getvalue(), r"total - 4/\d+ \(0\.0 MB\)")
+        self.assertEqual(pages, [])
+        self.assertTrue(session.committed)
+        self.assertEqual(cursor.copied, "A\t{}\t{}\t{}\nB\t{}\t{}\t{}\nC\t{}\t{}\t{}\n")
+        self.assertEqual(sorted(duplicates_file.getvalue().split()), ["A", "B"])
+        self.assertEqual(bulk.copy_list_to_db(file, [], None, None, None), (0, 0, 0))
+
+    def test_fallback(self):
+        cursor = FakeCursor(existing=set())
+        cursor.copy_expert = mock.Mock(side_effect=ValueError("value too long"))
+        orm_session = FakeOrmSession()
+        sessions = iter([FakeSession(cursor), orm_session])
+        pages = [WikipediaPage("A", [], [], []), WikipediaPage("B", ["x" * 201], [""], [])]
+        pages.append(WikipediaPage("C", ["C"], [""], []))
+        file = WikiXMLFile(1, 3, Path("test"))
+        stats_file = io.StringIO()
+        result = bulk.copy_list_to_db(
+            file, pages, lambda: next(sessions), stats_file, io.StringIO()
+        )
+        self.assertEqual(result, (2, 0, 1))
+        self.assertEqual(orm_session.committed, ["A", "C"])
+        self.assertEqual(orm_session.savepoints, 3)
+        self.assertIn("COPY failed", stats_file.getvalue())
+        # the ORM path tries the whole batch first
+        orm_session = FakeOrmSession()
+        pages = [WikipediaPage("D", [], [], []), WikipediaPage("E", ["x" * 201], [""], [])]
+        result = crud.commit_list_to_db(
+            file, pages, lambda: orm_session, io.StringIO(), io.StringIO()
+        )
+        self.assertEqual(result, (1, 0, 1))
+        self.assertEqual(orm_session.committed, ["D"])
+
+    def test_stale_filter(self):
+        title_filter = mock.Mock()
+        title_filter.classify.return_value = (set(), [])  # every title certainly new
+        orm_session = FakeOrmSession(existing={"B"})
+        pages = [WikipediaPage(title, [], [], []) for title in ["A", "B", "C"]]
+        duplicates_file = io.StringIO()
+        file = WikiXMLFile(1, 3, Path("test"))
+        result = crud.commit_list_to_db(
+            file, pages, lambda: orm_session, io.StringIO(), duplicates_file, title_filter
+        )
+        self.assertEqual(result, (2, 1, 0))
+        self.assertEqual(orm_session.committed, ["A", "C"])
+        self.assertEqual(duplicates_file.getvalue(), "B\n")
+        title_filter.add_many.assert_called_once_with(["A", "C"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""Tests for the wikitools.bz2reader module
+
+Coverage
+--------
+ThreadedBZ2Reader
+
+Missing
+-------
+
+"""
+import bz2
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from wikitools.bz2reader import ThreadedBZ2Reader
+
+
+class ThreadedBZ2ReaderTest(unittest.TestCase):
+    """Test ThreadedBZ2Reader
+
+    Tests
+    -----
+    multistream
+        does reading the whole file return the same bytes as bz2.open?
+    byte_range
+        are only the streams in [start, end) read, between prefix and suffix?
+    small_queue
+        does a reader slower than the decompressor still get every byte?
+    truncated
+        does a stream cut off in the middle raise EOFError from read?
+    close
+        does closing the reader before the end stop the decompression thread?
+    """
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).joinpath("multistream.bz2")
+        self.streams = ["stream {} ".format(i).encode("utf-8") * (1000 * (i + 1)) for i in range(5)]
+        self.offsets = []
+        with open(self.path, "wb") as file:
+            for stream in self.streams:
+                self.offsets.append(file.tell())
+                file.write(bz2.compress(stream))
+            self.offsets.append(file.tell())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_multistream(self):
+        with bz2.open(self.path, "rb") as file:
+            expected = file.read()
+        with ThreadedBZ2Reader(self.path) as reader:
+            self.assertEqual(reader.read(), expected)
+            self.assertEqual(reader.read(), b"")
+
+    def test_byte_range(self):
+        start, end = self.offsets[1], self.offsets[3]
+        with ThreadedBZ2Reader(self.path, start, end, prefix=b"<", suffix=b">") as reader:
+            data = reader.read()
+        self.assertEqual(data, b"<" + self.streams[1] + self.streams[2] + b">")
+
+    def test_small_queue(self):
+        with ThreadedBZ2Reader(self.path, queue_size=1) as reader:
+            chunks = []
+            while True:
+                chunk = reader.read(7)
+                if chunk == b"":
+                    break
+                chunks.append(chunk)
+        self.assertEqual(b"".join(chunks), b"".join(self.streams))
+
+    def test_truncated(self):
+        end = self.offsets[2] - 10
+        with ThreadedBZ2Reader(self.path, 0, end) as reader:
+            with self.assertRaisesRegex(EOFError, "end-of-stream marker"):
+                reader.read()
+        with ThreadedBZ2Reader(self.path, self.offsets[0] + 1) as reader:
+            with self.assertRaises(OSError):
+                reader.read()
+
+    def test_close(self):
+        reader = ThreadedBZ2Reader(self.path, queue_size=1)
+        self.assertEqual(reader.read(6), b"stream")
+        reader.close()
+        self.assertTrue(reader.closed)
+        self.assertFalse(reader._thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Tests for the wikitools.checkpoint module
+
+Coverage
+--------
+get_checkpoint_path
+save_checkpoint
+load_checkpoint
+
+Missing
+-------
+
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+from wikitools.checkpoint import get_checkpoint_path, load_checkpoint, save_checkpoint
+from wikitools.wikixml import WikiXMLFile
+
+
+class CheckpointTest(unittest.TestCase):
+    """Test saving and loading WikiXMLFile checkpoints
+
+    Tests
+    -----
+    get_checkpoint_path
+        is the path stable across runs (no timestamp/pid)?
+    round_trip
+        are the offset, page id and counters restored?
+    missing
+        does loading a checkpoint that doesn't exist return None?
+    wrong_file
+        is a checkpoint from a different file rejected?
+    """
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.directory = Path(self.tmp_dir.name)
+        self.path = Path("enwiki-20210420-pages-articles-multistream16.xml-p20460153p20570392.bz2")
+        self.file = WikiXMLFile(20460153, 20570392, self.path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_get_checkpoint_path(self):
+        checkpoint_path = get_checkpoint_path(self.file, self.directory)
+        self.assertEqual(checkpoint_path.name, "checkpoint_20460153_20570392.json")
+        self.assertEqual(checkpoint_path, get_checkpoint_path(self.file, self.directory))
+
+    def test_round_trip(self):
+        checkpoint_path = get_checkpoint_path(self.file, self.directory)
+        self.file.pages, self.file.additions = 4000, 3998
+        self.file.duplicates, self.file.errors = 2, 0
+        save_checkpoint(checkpoint_path, self.file, 123456, 20460999)
+        self.assertFalse(checkpoint_path.with_name(checkpoint_path.name + ".tmp").exists())
+        resumed_file = WikiXMLFile(20460153, 20570392, self.path)
+        state = load_checkpoint(checkpoint_path, resumed_file)
+        self.assertEqual(state["offset"], 123456)
+        self.assertEqual(state["page_id"], 20460999)
+        self.assertFalse(state["complete"])
+        self.assertEqual(resumed_file.pages, 4000)
+        self.assertEqual(resumed_file.additions, 3998)
+        self.assertEqual(resumed_file.duplicates, 2)
+        self.assertEqual(resumed_file.errors, 0)
+        # a later checkpoint replaces the earlier one
+        save_checkpoint(checkpoint_path, self.file, 234567, 20470999, complete=True)
+        state = load_checkpoint(checkpoint_path, resumed_file)
+        self.assertEqual(state["offset"], 234567)
+        self.assertTrue(state["complete"])
+
+    def test_missing(self):
+        checkpoint_path = get_checkpoint_path(self.file, self.directory)
+        self.assertIsNone(load_checkpoint(checkpoint_path, self.file))
+
+    def test_wrong_file(self):
+        checkpoint_path = get_checkpoint_path(self.file, self.directory)
+        save_checkpoint(checkpoint_path, self.file, 123456, 20460999)
+        other_file = WikiXMLFile(20460153, 20570392, Path("other.xml-p20460153p20570392.bz2"))
+        with self.assertRaisesRegex(ValueError, "belongs to"):
+            load_checkpoint(checkpoint_path, other_file)
+
+
+if __name__ == "__main__":
+    unittest.main()
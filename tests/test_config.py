@@ -0,0 +1,114 @@
+"""Tests for the database.config module
+
+Coverage
+--------
+get_pooled_engine
+get_sessionmaker
+configure_pool
+pool_stats
+dispose_engines
+
+Missing
+-------
+statement_timeout_ms against a live PostgreSQL database
+
+"""
+import multiprocessing as mp
+import os
+import unittest
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from sqlalchemy import exc, text
+
+import database.config as config
+
+
+def use_engines(uri, inherited_engine, queue):
+    """in a forked child: is the registry empty, and can the parent's engine still
+    connect (with a new connection)?"""
+    engine = config.get_pooled_engine(uri)
+    with inherited_engine.connect() as connection:
+        value = connection.execute(text("SELECT 1")).scalar()
+        pid = connection.connection._connection_record.info["pid"]
+    queue.put((engine is not inherited_engine, value, pid == os.getpid()))
+
+
+class PooledEngineTest(unittest.TestCase):
+    """Test the pooled engine registry
+
+    Tests
+    -----
+    registry
+        is there one engine per uri, reused by get_sessionmaker?
+    stats
+        are checkouts, exhaustion and timeouts counted?
+    fork
+        does a forked child get its own engine, and replace connections it inherited?
+    configure_pool
+        are options applied to new engines, and unknown options a TypeError?
+    """
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.uri = "sqlite:///" + Path(self.tmp_dir.name).joinpath("test.db").as_posix()
+
+    def tearDown(self):
+        config.dispose_engines()
+        config.configure_pool(**config.PoolOptions()._asdict())
+        self.tmp_dir.cleanup()
+
+    def test_registry(self):
+        engine = config.get_pooled_engine(self.uri)
+        self.assertIs(config.get_pooled_engine(self.uri), engine)
+        other_uri = self.uri.replace("test.db", "other.db")
+        self.assertIsNot(config.get_pooled_engine(other_uri), engine)
+        session_gen = config.get_sessionmaker(self.uri)
+        with session_gen() as session:
+            self.assertIs(session.get_bind(), engine)
+            self.assertEqual(session.execute(text("SELECT 1")).scalar(), 1)
+        config.dispose_engines()
+        self.assertIsNot(config.get_pooled_engine(self.uri), engine)
+
+    def test_stats(self):
+        self.assertEqual(config.pool_stats(self.uri)["checkouts"], 0)
+        config.configure_pool(pool_size=1, max_overflow=0, pool_timeout=0.05)
+        engine = config.get_pooled_engine(self.uri)
+        with engine.connect():
+            with self.assertRaises(exc.TimeoutError):
+                engine.connect()
+        with engine.connect():
+            pass
+        stats = config.pool_stats(self.uri)
+        self.assertEqual(stats["checkouts"], 3)
+        self.assertEqual(stats["exhausted"], 1)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertGreaterEqual(stats["max_checkout_seconds"], 0.05)
+        self.assertIn("3 checkouts", config.pool_stats_msg(self.uri))
+
+    def test_fork(self):
+        engine = config.get_pooled_engine(self.uri)
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        context = mp.get_context("fork")
+        queue = context.Queue()
+        process = context.Process(target=use_engines, args=(self.uri, engine, queue))
+        process.start()
+        result = queue.get(timeout=10)
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(result, (True, 1, True))
+        with engine.connect() as connection:  # the parent's connection still works
+            self.assertEqual(connection.execute(text("SELECT 1")).scalar(), 1)
+
+    def test_configure_pool(self):
+        options = config.configure_pool(pool_size=3, pre_ping=False)
+        self.assertEqual((options.pool_size, options.pre_ping), (3, False))
+        self.assertEqual(config.get_pooled_engine(self.uri).pool.size(), 3)
+        with self.assertRaisesRegex(TypeError, "pool_sise isn't a pool option"):
+            config.configure_pool(pool_sise=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Tests for scripts/etl_flow.py
+
+Coverage
+--------
+etl_streams checkpoints saved by the background writer, and resuming from them
+
+Missing
+-------
+file_etl, stream_etl and dump_etl against a live PostgreSQL database
+
+"""
+import os
+import sys
+import unittest
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import wikitools.checkpoint as checkpoint
+import wikitools.synthetic as synthetic
+
+from database.writer import BatchSizer
+from wikitools.wikixml import WikiXMLFile
+
+# etl_flow is a script, not part of the package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1].joinpath("scripts")))
+import etl_flow  # pylint: disable=wrong-import-position,import-error
+
+
+class FakeCommit:
+    """Stands in for commit_pages: records the committed titles and counts them as
+    additions, and fails once fail_after batches have been committed"""
+
+    def __init__(self, fail_after: int = None):
+        self.titles = []
+        self.batches = 0
+        self.fail_after = fail_after
+
+    def __call__(self, file, pages, *args):
+        if self.batches == self.fail_after:
+            raise KeyError("database went away")
+        self.batches += 1
+        self.titles.extend(page.title for page in pages)
+        file.additions += len(pages)
+        pages.clear()
+
+
+class ResumeTest(unittest.TestCase):
+    """Test etl_streams' checkpoints
+
+    Tests
+    -----
+    resume
+        does a checkpoint saved by the writer thread count exactly the committed
+        pages, so a run resumed after a failed commit extracts every page once?
+    """
+
+    def setUp(self):
+        # stats, duplicates and checkpoints are written to logs/
+        self.cwd = os.getcwd()
+        self.tmp_dir = TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        Path("logs").mkdir()
+        Path("dump").mkdir()
+        pages = [(i, "Title {}".format(i), "text [[Link {}]]".format(i)) for i in range(1, 31)]
+        self.wiki_file = synthetic.write_multistream(Path("dump"), pages, pages_per_stream=3)
+        self.sizer = mock.patch.object(etl_flow, "BATCH_SIZER", BatchSizer(max_pages=5))
+        self.sizer.start()
+
+    def tearDown(self):
+        self.sizer.stop()
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def run_streams(self, commit: FakeCommit) -> WikiXMLFile:
+        file = WikiXMLFile(self.wiki_file.start_idx, self.wiki_file.end_idx, self.wiki_file.path)
+        checkpoint_path = checkpoint.get_checkpoint_path(file)
+        with mock.patch.object(etl_flow, "commit_pages", commit), open(
+            "logs/stats.txt", "a"
+        ) as stats_file, open("logs/duplicates.txt", "a") as duplicates_file:
+            etl_flow.etl_streams(file, None, stats_file, duplicates_file, checkpoint_path)
+        return file
+
+    def test_resume(self):
+        first = FakeCommit(fail_after=2)
+        with self.assertRaisesRegex(KeyError, "database went away"):
+            self.run_streams(first)
+        self.assertEqual(len(first.titles), 12)  # 2 chunks of 2 streams
+        state = checkpoint.load_checkpoint(
+            checkpoint.get_checkpoint_path(self.wiki_file), self.wiki_file
+        )
+        self.assertEqual((state["pages"], state["additions"]), (12, 12))
+        second = FakeCommit()
+        file = self.run_streams(second)
+        self.assertEqual(
+            sorted(first.titles + second.titles, key=lambda t: int(t.split()[1])),
+            ["Title {}".format(i) for i in range(1, 31)],
+        )
+        self.assertEqual((file.pages, file.additions), (30, 30))
+
+
+if __name__ == "__main__":
+    unittest.main()
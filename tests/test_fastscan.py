@@ -0,0 +1,90 @@
+"""Tests for the wikitools.fastscan module
+
+Coverage
+--------
+strip_link
+scan_wikilinks
+scan_headings
+
+Missing
+-------
+
+"""
+import unittest
+
+from wikitools.fastscan import scan_headings, scan_wikilinks, strip_link
+
+
+class StripLinkTest(unittest.TestCase):
+    """Test fastscan.strip_link
+
+    Tests
+    -----
+    title : links without a | strip to their title
+    text : links with a | strip to their text, nested links included
+    ambiguous : markup in the title or text returns None
+    """
+
+    def test_title(self):
+        self.assertEqual(strip_link("Albert Einstein"), "Albert Einstein")
+        self.assertEqual(strip_link("Category:Physics"), "Category:Physics")
+
+    def test_text(self):
+        self.assertEqual(strip_link("Niels Bohr|Bohr"), "Bohr")
+        self.assertEqual(strip_link("Foo|"), "")
+        self.assertEqual(
+            strip_link("File:Wave.png|thumb|A [[wave]] and [[Particle|particles]]"),
+            "thumb|A wave and particles",
+        )
+
+    def test_ambiguous(self):
+        self.assertIsNone(strip_link("{{template}}"))
+        self.assertIsNone(strip_link("Paris|''Paris''"))
+        self.assertIsNone(strip_link("A &amp; B"))
+        self.assertIsNone(strip_link("Foo|bar <br> baz"))
+
+
+class ScanWikilinksTest(unittest.TestCase):
+    """Test fastscan.scan_wikilinks
+
+    Tests
+    -----
+    order : outer links come before the links nested in them
+    ambiguous : unparsed tags, comments and unbalanced brackets return None
+    """
+
+    def test_order(self):
+        text = "[[A]] text [[File:X.png|thumb|[[B|b]] and [[C]]]] [[D|d]]"
+        self.assertEqual(scan_wikilinks(text), ["A", "thumb|b and C", "b", "C", "d"])
+        self.assertEqual(scan_wikilinks("no links ]] here"), [])
+        self.assertEqual(scan_wikilinks(None), [])
+
+    def test_ambiguous(self):
+        self.assertIsNone(scan_wikilinks("[[A]] <!-- [[B]] -->"))
+        self.assertIsNone(scan_wikilinks("<nowiki>[[A]]</nowiki>"))
+        self.assertIsNone(scan_wikilinks("[[A]] [[B"))
+        self.assertIsNone(scan_wikilinks("[[[A]]]"))
+
+
+class ScanHeadingsTest(unittest.TestCase):
+    """Test fastscan.scan_headings
+
+    Tests
+    -----
+    headings : balanced headings of every level are found, stripped of whitespace
+    ambiguous : unbalanced headings and markup in headings return None
+    """
+
+    def test_headings(self):
+        text = "lead\n== History ==\ntext == not a heading ==\n===Early===  \n====== Six ======"
+        self.assertEqual(scan_headings(text), ["History", "Early", "Six"])
+        self.assertEqual(scan_headings("no headings"), [])
+
+    def test_ambiguous(self):
+        self.assertIsNone(scan_headings("=== Unbalanced ==\n"))
+        self.assertIsNone(scan_headings("== [[Link]] heading ==\n"))
+        self.assertIsNone(scan_headings("== Heading ==\n<pre>\n== code ==\n</pre>"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+"""Tests for the graph package
+
+Coverage
+--------
+build.build_csr
+build.bucket_bounds
+build.pagelinks_edge_chunks
+csr.CSRGraph
+
+Missing
+-------
+build.load_title_ids
+
+"""
+
+import random
+import unittest
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+import graph.build as build
+import graph.csr as csr
+
+from database.redirect import RedirectMap
+
+
+def random_links(num_links: int, page_ids: list, seed: int) -> list:
+    """(source, target) links between page_ids, with repeats and links to missing pages"""
+    rng = random.Random(seed)
+    links = [(rng.choice(page_ids), rng.choice(page_ids)) for _ in range(num_links)]
+    links += links[:10]  # repeated links
+    links += [(page_ids[0], 999999), (999998, page_ids[1])]  # pages that aren't nodes
+    return links
+
+
+def chunked(links: list, size: int):
+    for start in range(0, len(links), size):
+        chunk = links[start : start + size]
+        yield np.array([s for s, _ in chunk]), np.array([t for _, t in chunk])
+
+
+class BuildCSRTest(unittest.TestCase):
+    """Test build_csr and CSRGraph
+
+    Tests
+    -----
+    neighbours
+        are the out- and in-neighbours of every page the distinct links from and to
+        it, sorted, whether or not the links are distributed to buckets?
+    views
+        are neighbours read-only views of the memory mapped arrays?
+    degrees
+        do the degrees match the neighbours?
+    bucket_bounds
+        are nodes split into ranges of about memory_edges links?
+    empty
+        can a graph without links or pages be built and opened?
+    errors
+        will build_csr and CSRGraph raise the correct errors?
+    """
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name).joinpath("graph")
+        self.page_ids = random.Random(0).sample(range(1, 5000), 300)
+        self.links = random_links(3000, self.page_ids, seed=1)
+        self.expected = set(link for link in self.links if max(link) < 999998)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_neighbours(self):
+        for memory_edges in [50, 10**6]:
+            graph = build.build_csr(
+                self.path, chunked(self.links, 128), self.page_ids, memory_edges
+            )
+            self.assertEqual(graph.num_nodes, 300)
+            self.assertEqual(graph.num_edges, len(self.expected))
+            for page_id in self.page_ids:
+                out_expected = sorted(t for s, t in self.expected if s == page_id)
+                in_expected = sorted(s for s, t in self.expected if t == page_id)
+                self.assertEqual(graph.out_neighbours(page_id).tolist(), out_expected)
+                self.assertEqual(graph.in_neighbours(page_id).tolist(), in_expected)
+            self.assertEqual(list(self.path.joinpath("tmp").glob("*")), [])
+
+    def test_views(self):
+        graph = build.build_csr(self.path, chunked(self.links, 128), self.page_ids)
+        neighbours = graph.out_neighbours(self.page_ids[0])
+        self.assertTrue(np.shares_memory(neighbours, graph.out_targets))
+        self.assertFalse(neighbours.flags.writeable)
+        reopened = csr.CSRGraph(self.path)
+        self.assertEqual(reopened.out_neighbours(self.page_ids[0]).tolist(), neighbours.tolist())
+
+    def test_degrees(self):
+        graph = build.build_csr(self.path, chunked(self.links, 128), self.page_ids, 100)
+        for page_id in self.page_ids[:50]:
+            self.assertEqual(graph.out_degree(page_id), len(graph.out_neighbours(page_id)))
+            self.assertEqual(graph.in_degree(page_id), len(graph.in_neighbours(page_id)))
+        self.assertEqual(graph.out_degrees().sum(), graph.num_edges)
+        self.assertEqual(graph.in_degrees().sum(), graph.num_edges)
+        self.assertIn(self.page_ids[0], graph)
+        self.assertNotIn(999999, graph)
+        with self.assertRaises(KeyError):
+            graph.out_neighbours(999999)
+
+    def test_bucket_bounds(self):
+        counts = np.array([3, 3, 3, 10, 0, 1, 2])
+        self.assertEqual(build.bucket_bounds(counts, 100), [0, 7])
+        self.assertEqual(build.bucket_bounds(counts, 6), [0, 2, 3, 4, 7])
+
+    def test_empty(self):
+        graph = build.build_csr(self.path, [], self.page_ids)
+        self.assertEqual((graph.num_nodes, graph.num_edges), (300, 0))
+        self.assertEqual(len(graph.in_neighbours(self.page_ids[5])), 0)
+        graph = build.build_csr(self.path, chunked(self.links, 128), [])
+        self.assertEqual((graph.num_nodes, graph.num_edges), (0, 0))
+
+    def test_errors(self):
+        with self.assertRaisesRegex(TypeError, "memory_edges must be an int"):
+            build.build_csr(self.path, [], self.page_ids, 1.5)
+        with self.assertRaisesRegex(ValueError, r"memory_edges \(0\) must be at least 1"):
+            build.build_csr(self.path, [], self.page_ids, 0)
+        with self.assertRaisesRegex(ValueError, "page ids must fit in uint32"):
+            build.build_csr(self.path, [], [1, 2**32])
+        with self.assertRaisesRegex(FileNotFoundError, "isn't a graph directory"):
+            csr.CSRGraph(self.path)
+        with self.assertRaisesRegex(TypeError, "path must be a pathlib.Path"):
+            csr.CSRGraph(str(self.path))
+
+
+class PagelinksTest(unittest.TestCase):
+    """Test pagelinks_edge_chunks
+
+    Tests
+    -----
+    chunks
+        are links to ns 0 pages resolved to page ids (by transliterated title),
+        through redirects if there's a RedirectMap, and other links dropped or -1?
+    """
+
+    def test_chunks(self):
+        lines = [
+            b"INSERT INTO `pagelinks` VALUES (1,0,'Anarchism',0),(1,1,'Anarchism',0),"
+            b"(2,0,'Anarchy',0);\n",
+            "INSERT INTO `pagelinks` VALUES (3,0,'Computer_science',0),(3,0,'Missing',0),"
+            "(3,0,'Beyoncé',0);\n".encode("utf-8"),
+        ]
+        title_ids = {"Anarchism": 10, "Computer science": 11, "Beyonce": 12}
+        redirect_map = RedirectMap({"Anarchy": "Anarchism"})
+        with TemporaryDirectory() as tmp_dir:
+            sql_path = Path(tmp_dir).joinpath("enwiki-20210520-pagelinks.sql")
+            sql_path.write_bytes(b"-- MySQL dump\n" + b"".join(lines))
+            chunks = list(build.pagelinks_edge_chunks(sql_path, title_ids, lines_per_chunk=1))
+            self.assertEqual(len(chunks), 2)
+            sources = np.concatenate([sources for sources, _ in chunks]).tolist()
+            targets = np.concatenate([targets for _, targets in chunks]).tolist()
+            self.assertEqual(
+                list(zip(sources, targets)), [(1, 10), (2, -1), (3, 11), (3, -1), (3, 12)]
+            )
+            chunks = build.pagelinks_edge_chunks(sql_path, title_ids, redirect_map)
+            sources, targets = next(chunks)
+            self.assertEqual(targets.tolist(), [10, 10, 11, -1, 12])
+
+
+if __name__ == "__main__":
+    unittest.main()
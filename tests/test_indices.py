@@ -0,0 +1,180 @@
+"""Tests for the database.indices module
+
+Coverage
+--------
+bulk_load_mode (against a fake engine)
+
+Missing
+-------
+bulk_load_mode, create_indices and drop_indices against a live PostgreSQL database
+
+"""
+import os
+import threading
+import unittest
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from sqlalchemy.dialects import postgresql
+
+import database.indices as indices
+
+INDEXES = [
+    (
+        "page",
+        "page_title_lower",
+        "CREATE INDEX page_title_lower ON public.page (lower(page_title))",
+    ),
+    ("page", "page_title", "CREATE INDEX page_title ON public.page (page_title)"),
+]
+FOREIGN_KEYS = [
+    ("talk", "talk_page_title_fkey", "FOREIGN KEY (page_title) REFERENCES page(page_title)")
+]
+
+
+class FakeConnection:
+    """Records every statement and answers the catalog queries"""
+
+    dialect = postgresql.dialect()
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execution_options(self, **options):
+        return self
+
+    def execute(self, statement, params=None):
+        if statement is indices.SECONDARY_INDEXES:
+            self.engine.tables = params["tables"]
+            return INDEXES
+        if statement is indices.FOREIGN_KEYS:
+            return FOREIGN_KEYS
+        if statement is indices.PARTITIONS:
+            return [row for row in self.engine.partitions if row[0] in params["tables"]]
+        with self.engine.lock:
+            self.engine.statements.append(str(statement))
+        return []
+
+
+class FakeEngine:
+    def __init__(self):
+        self.statements = []
+        self.tables = None
+        self.partitions = []  # (partitioned table, table, relkind) like PARTITIONS
+        self.lock = threading.Lock()
+
+    def begin(self):
+        return FakeConnection(self)
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class BulkLoadModeTest(unittest.TestCase):
+    """Test bulk_load_mode
+
+    Tests
+    -----
+    order
+        are foreign keys and indexes dropped and tables made UNLOGGED on entry, and
+        restored in the opposite order on exit?
+    restored_on_error
+        is the schema restored when the body raises?
+    default_tables
+        are all of the models' tables used by default?
+    partitioned
+        are the partitions of a partitioned table made UNLOGGED, instead of the table?
+    """
+
+    def setUp(self):
+        # create_logger writes to logs/ in the working directory
+        self.cwd = os.getcwd()
+        self.tmp_dir = TemporaryDirectory()
+        Path(self.tmp_dir.name).joinpath("logs").mkdir()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_order(self):
+        engine = FakeEngine()
+        with indices.bulk_load_mode(engine, ["page"], index_workers=2) as deferred:
+            self.assertEqual(deferred.indexes, INDEXES)
+            self.assertEqual(
+                engine.statements,
+                [
+                    "ALTER TABLE talk DROP CONSTRAINT talk_page_title_fkey",
+                    "DROP INDEX page_title_lower",
+                    "DROP INDEX page_title",
+                    "ALTER TABLE page SET UNLOGGED",
+                ],
+            )
+            engine.statements = []
+        self.assertEqual(engine.statements[0], "ALTER TABLE page SET LOGGED")
+        builds = engine.statements[1:-1]
+        self.assertEqual(len(builds), 6)  # set_config, CREATE INDEX, RESET for each
+        self.assertEqual(
+            sorted(s for s in builds if s.startswith("CREATE")),
+            sorted(statement for _, _, statement in INDEXES),
+        )
+        self.assertEqual(
+            engine.statements[-1],
+            "ALTER TABLE talk ADD CONSTRAINT talk_page_title_fkey " + FOREIGN_KEYS[0][2],
+        )
+
+    def test_restored_on_error(self):
+        engine = FakeEngine()
+        with self.assertRaises(KeyError):
+            with indices.bulk_load_mode(engine, ["page"]):
+                engine.statements = []
+                raise KeyError("load failed")
+        self.assertEqual(engine.statements[0], "ALTER TABLE page SET LOGGED")
+        self.assertTrue(engine.statements[-1].startswith("ALTER TABLE talk ADD CONSTRAINT"))
+
+    def test_default_tables(self):
+        engine = FakeEngine()
+        with indices.bulk_load_mode(engine):
+            pass
+        self.assertIn("page", engine.tables)
+        self.assertIn("text", engine.tables)
+        self.assertLess(engine.tables.index("page"), engine.tables.index("talk"))
+
+    def test_partitioned(self):
+        engine = FakeEngine()
+        engine.partitions = [
+            ("text", "text", "p"),
+            ("text", "text_0", "r"),
+            ("text", "text_1", "r"),
+        ]
+        with indices.bulk_load_mode(engine, ["page", "text"]) as deferred:
+            self.assertEqual(deferred.tables, ["page", "text_0", "text_1"])
+            self.assertEqual(
+                engine.statements[-3:],
+                [
+                    "ALTER TABLE page SET UNLOGGED",
+                    "ALTER TABLE text_0 SET UNLOGGED",
+                    "ALTER TABLE text_1 SET UNLOGGED",
+                ],
+            )
+            engine.statements = []
+        self.assertEqual(
+            engine.statements[:3],
+            [
+                "ALTER TABLE page SET LOGGED",
+                "ALTER TABLE text_0 SET LOGGED",
+                "ALTER TABLE text_1 SET LOGGED",
+            ],
+        )
+        self.assertNotIn("ALTER TABLE text SET LOGGED", engine.statements)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""Tests for the wikitools.manifest module
+
+Coverage
+--------
+build_manifest
+verify_checksums
+FileManifest.streams_per_unit
+wikidump.load_wikifile_list with a manifest
+
+Missing
+-------
+
+"""
+import multiprocessing as mp
+import os
+import unittest
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import wikitools.manifest as manifest
+import wikitools.synthetic as synthetic
+import wikitools.wikidump as wikidump
+import wikitools.wikixml as wikixml
+
+
+def write_checksum_lists(data_path: Path) -> None:
+    for algorithm in ["md5", "sha1"]:
+        with open(data_path.joinpath("enwiki-20210420-{}sums.txt".format(algorithm)), "w") as f:
+            for path in sorted(data_path.glob("*.bz2")):
+                digest = manifest.file_digests(path)[algorithm]
+                f.write("{}  {}\n".format(digest, path.name))
+
+
+class BuildManifestTest(unittest.TestCase):
+    """Test build_manifest
+
+    Tests
+    -----
+    scan
+        are the page ranges, sizes, streams, articles and checksums of every file saved?
+    reuse
+        are unchanged files reused, and only changed files rescanned?
+    load_wikifile_list
+        does load_wikifile_list take the files from a current manifest?
+    streams_per_unit
+        are work units sized by compressed bytes?
+    """
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.data_path = Path(self.tmp_dir.name)
+        self.files = synthetic.write_dump(self.data_path, 3, 120, pages_per_stream=20, seed=2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_scan(self):
+        dump_manifest = manifest.build_manifest(self.data_path, 2)
+        self.assertTrue(manifest.get_manifest_path(self.data_path).is_file())
+        self.assertEqual(list(dump_manifest), [file.path.name for file in self.files])
+        for file, entry in zip(self.files, dump_manifest.values()):
+            self.assertEqual((entry.start_idx, entry.end_idx), (file.start_idx, file.end_idx))
+            self.assertEqual(entry.size, file.path.stat().st_size)
+            self.assertEqual(entry.streams, 6)
+            articles, longest_title = wikixml.wikifile_num_articles_longest_article(file)
+            self.assertEqual((entry.articles, entry.longest_title), (articles, longest_title))
+            self.assertEqual(entry.md5, manifest.file_digests(file.path)["md5"])
+        self.assertEqual(manifest.load_manifest(self.data_path), dump_manifest)
+
+    def test_reuse(self):
+        dump_manifest = manifest.build_manifest(self.data_path, 2, count_articles=False)
+        self.assertIsNone(next(iter(dump_manifest.values())).articles)
+        changed = self.files[1].path
+        stat = changed.stat()
+        os.utime(changed, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        rebuilt = manifest.build_manifest(self.data_path, 2, count_articles=False)
+        for name, entry in rebuilt.items():
+            if name == changed.name:
+                self.assertEqual(entry.mtime_ns, stat.st_mtime_ns + 10**9)
+            else:
+                self.assertIs(type(entry), manifest.FileManifest)
+                self.assertEqual(entry, dump_manifest[name])
+        # entries without article counts are rescanned when counts are wanted
+        counted = manifest.build_manifest(self.data_path, 2)
+        self.assertTrue(all(entry.articles is not None for entry in counted.values()))
+
+    def test_load_wikifile_list(self):
+        expected = wikidump.load_wikifile_list(self.data_path, use_manifest=False)
+        dump_manifest = manifest.build_manifest(self.data_path, 2, count_articles=False)
+        with mock.patch.object(wikidump, "find_dump_files") as find_dump_files:
+            self.assertEqual(wikidump.load_wikifile_list(self.data_path), expected)
+            find_dump_files.assert_not_called()  # a current manifest isn't rescanned
+        self.assertTrue(wikidump.is_dump_contiguous(wikidump.load_wikifile_list(self.data_path)))
+        # a file missing from the manifest falls back to matching the file names
+        del dump_manifest[self.files[2].path.name]
+        manifest.save_manifest(self.data_path, dump_manifest)
+        with self.assertLogs(mp.get_logger(), "WARNING"):
+            self.assertEqual(wikidump.load_wikifile_list(self.data_path), expected)
+        # so does a file that changed since it was scanned
+        dump_manifest = manifest.build_manifest(self.data_path, 2, count_articles=False)
+        path = self.files[0].path
+        os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10**9))
+        with self.assertLogs(mp.get_logger(), "WARNING"):
+            self.assertEqual(wikidump.load_wikifile_list(self.data_path), expected)
+
+    def test_streams_per_unit(self):
+        entry = manifest.build_manifest(self.data_path, 1, count_articles=False)
+        entry = next(iter(entry.values()))
+        self.assertEqual(entry.streams_per_unit(entry.size), 6)
+        self.assertEqual(entry.streams_per_unit(entry.size // 3), 2)
+        self.assertEqual(entry.streams_per_unit(1), 1)
+        self.assertEqual(entry._replace(streams=None).streams_per_unit(1), 1)
+
+
+class VerifyChecksumsTest(unittest.TestCase):
+    """Test verify_checksums
+
+    Tests
+    -----
+    verify
+        do matching files pass, and corrupted or unlisted files fail, with and without
+        rehashing?
+    missing_lists
+        will verify_checksums raise FileNotFoundError without any checksum lists?
+    """
+
+    def test_verify(self):
+        with TemporaryDirectory() as tmp_dir:
+            data_path = Path(tmp_dir)
+            files = synthetic.write_dump(data_path, 2, 50, seed=3)
+            write_checksum_lists(data_path)
+            dump_manifest = manifest.build_manifest(data_path, 2, count_articles=False)
+            self.assertEqual(manifest.verify_checksums(data_path, dump_manifest), {})
+            self.assertEqual(manifest.verify_checksums(data_path, dump_manifest, 2, True), {})
+            # corrupt a file without changing its size or mtime
+            corrupted = files[0].path
+            stat = corrupted.stat()
+            with open(corrupted, "r+b") as f:
+                f.seek(100)
+                byte = f.read(1)
+                f.seek(100)
+                f.write(bytes([byte[0] ^ 0xFF]))
+            os.utime(corrupted, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            self.assertEqual(manifest.verify_checksums(data_path, dump_manifest), {})
+            problems = manifest.verify_checksums(data_path, dump_manifest, 2, rehash=True)
+            self.assertEqual(list(problems), [corrupted.name])
+            self.assertEqual(len(problems[corrupted.name]), 2)
+            self.assertRegex(problems[corrupted.name][0], "^md5 mismatch")
+            # only the published lists are checked, and unlisted files fail
+            data_path.joinpath("enwiki-20210420-sha1sums.txt").unlink()
+            unlisted = dump_manifest[files[1].path.name]
+            problems = manifest.verify_checksums(data_path, {unlisted.name: unlisted})
+            self.assertEqual(problems, {})
+            data_path.joinpath("enwiki-20210420-md5sums.txt").write_text("")
+            problems = manifest.verify_checksums(data_path, {unlisted.name: unlisted})
+            self.assertRegex(problems[unlisted.name][0], "missing from the published md5")
+
+    def test_missing_lists(self):
+        with TemporaryDirectory() as tmp_dir:
+            with self.assertRaisesRegex(FileNotFoundError, "checksum lists"):
+                manifest.verify_checksums(Path(tmp_dir), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+"""Tests for the database.redirect module
+
+Coverage
+--------
+transform_redirects
+transform_redirect_pages
+iter_xml_redirects
+collapse_chains
+RedirectMap
+
+Missing
+-------
+etl_redirect, etl_xml_redirects and RedirectMap.from_db against a live PostgreSQL
+database
+
+"""
+import unittest
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import database.redirect as redirect
+import database.sql as sql
+import wikitools.synthetic as synthetic
+
+from wikitools.transliterate import transliterate_cached
+
+
+class TransformTest(unittest.TestCase):
+    """Test transform_redirects, transform_redirect_pages and iter_xml_redirects
+
+    Tests
+    -----
+    transform_redirects
+        are only ns 0 redirects of this wiki kept, with spaces in titles and empty
+        fragments None?
+    transform_redirect_pages
+        are only ns 0 redirect pages kept?
+    xml_redirects
+        is every redirect page of an XML dump yielded with its fragment split off?
+    transliterated
+        are non-ASCII titles transliterated like PageText's, so links resolve?
+    """
+
+    def test_transform_redirects(self):
+        line = (
+            b"INSERT INTO `redirect` VALUES (10,0,'Computer_science','',''),"
+            b"(11,0,'Anarchism','','History'),(12,4,'Policy','',''),"
+            b"(13,0,'Main_Page','meta',''),(14,0,'" + b"x" * 201 + b"','','');\n"
+        )
+        rows, skipped = redirect.transform_redirects(sql.iter_rows(line, sql.LineEnum.REDIRECT))
+        self.assertEqual(rows, [(10, "Computer science", None), (11, "Anarchism", "History")])
+        self.assertEqual(skipped, [(14, "x" * 201)])
+
+    def test_transform_redirect_pages(self):
+        line = (
+            b"INSERT INTO `page` VALUES (10,0,'Computer_Science','',1),"
+            b"(11,0,'Anarchism','',0),(12,1,'Computer_Science','',1);\n"
+        )
+        rows = redirect.transform_redirect_pages(sql.iter_rows(line, sql.LineEnum.PAGE))
+        self.assertEqual(rows, [(10, "Computer Science")])
+
+    def test_xml_redirects(self):
+        pages = [
+            synthetic.SyntheticPage(1, "Anarchism", "text"),
+            synthetic.SyntheticPage(2, "Anarchy", "", redirect="Anarchism"),
+            synthetic.SyntheticPage(3, "Anarchist history", "", redirect="Anarchism#History"),
+            synthetic.SyntheticPage(4, "Talk:Anarchy", "", ns=1, redirect="Talk:Anarchism"),
+        ]
+        with TemporaryDirectory() as tmp_dir:
+            wiki_file = synthetic.write_multistream(Path(tmp_dir), pages, pages_per_stream=2)
+            rows = list(redirect.iter_xml_redirects(wiki_file))
+        self.assertEqual(
+            rows,
+            [(2, "Anarchy", "Anarchism", None), (3, "Anarchist history", "Anarchism", "History")],
+        )
+
+    def test_transliterated(self):
+        line = "INSERT INTO `redirect` VALUES (20,0,'Beyoncé_Knowles','','');\n"
+        rows, _ = redirect.transform_redirects(
+            sql.iter_rows(line.encode("utf-8"), sql.LineEnum.REDIRECT)
+        )
+        self.assertEqual(rows, [(20, "Beyonce Knowles", None)])
+        line = "INSERT INTO `page` VALUES (20,0,'Beyoncé','',1);\n"
+        rows = redirect.transform_redirect_pages(
+            sql.iter_rows(line.encode("utf-8"), sql.LineEnum.PAGE)
+        )
+        self.assertEqual(rows, [(20, "Beyonce")])
+        pages = [
+            synthetic.SyntheticPage(1, "Beyoncé Knowles", "text"),
+            synthetic.SyntheticPage(2, "Beyoncé", "", redirect="Beyoncé Knowles"),
+        ]
+        with TemporaryDirectory() as tmp_dir:
+            wiki_file = synthetic.write_multistream(Path(tmp_dir), pages, pages_per_stream=2)
+            rows = list(redirect.iter_xml_redirects(wiki_file))
+        self.assertEqual(rows, [(2, "Beyonce", "Beyonce Knowles", None)])
+        redirect_map = redirect.RedirectMap({title: target for _, title, target, _ in rows})
+        link = transliterate_cached("Beyoncé")  # as wikixml stores links
+        self.assertEqual(redirect_map.resolve_links([link]), ["Beyonce Knowles"])
+
+
+class RedirectMapTest(unittest.TestCase):
+    """Test collapse_chains and RedirectMap
+
+    Tests
+    -----
+    chains
+        does every redirect of a chain map to the page at its end?
+    cycles
+        are redirects in or leading into a cycle left out and listed?
+    self_loops
+        does a redirect to itself, e.g. after transliteration, end its chain?
+    resolve
+        are redirects resolved and other titles returned as they are?
+    save_load
+        does a map survive the round trip through save/load?
+    params
+        will the constructor and load raise the correct errors?
+    """
+
+    def setUp(self):
+        self.redirects = {
+            "A": "B",
+            "B": "C",
+            "C": "Article",
+            "D": "B",
+            "Self": "Self",
+            "X": "Y",
+            "Y": "Z",
+            "Z": "X",
+            "Into cycle": "Y",
+        }
+
+    def test_chains(self):
+        targets, _ = redirect.collapse_chains(self.redirects)
+        for title in ["A", "B", "C", "D"]:
+            self.assertEqual(targets[title], "Article")
+        self.assertEqual(len(targets), 4)
+
+    def test_cycles(self):
+        _, cycles = redirect.collapse_chains(self.redirects)
+        self.assertEqual(cycles, ["Into cycle", "X", "Y", "Z"])
+        redirect_map = redirect.RedirectMap(self.redirects)
+        self.assertEqual(redirect_map.cycles, cycles)
+        self.assertNotIn("X", redirect_map)
+
+    def test_self_loops(self):
+        redirects = {"Zurich": "Zürich", "Zuerich": "Zürich", "Zurich, Switzerland": "Zurich"}
+        redirects = {
+            transliterate_cached(title): transliterate_cached(target)
+            for title, target in redirects.items()
+        }
+        redirect_map = redirect.RedirectMap(redirects)
+        self.assertEqual(redirect_map.cycles, [])
+        self.assertEqual(redirect_map.resolve("Zuerich"), "Zurich")
+        self.assertEqual(redirect_map.resolve("Zurich, Switzerland"), "Zurich")
+        self.assertEqual(redirect_map.resolve("Zurich"), "Zurich")
+
+    def test_resolve(self):
+        redirect_map = redirect.RedirectMap(self.redirects)
+        self.assertEqual(len(redirect_map), 4)
+        self.assertEqual(redirect_map["A"], "Article")
+        self.assertEqual(redirect_map.resolve("D"), "Article")
+        self.assertEqual(redirect_map.resolve("Article"), "Article")
+        self.assertEqual(redirect_map.resolve("X"), "X")
+        self.assertEqual(redirect_map.resolve("Self"), "Self")
+        self.assertEqual(
+            redirect_map.resolve_links(["A", "Other", "C"]), ["Article", "Other", "Article"]
+        )
+
+    def test_save_load(self):
+        redirect_map = redirect.RedirectMap(self.redirects)
+        with TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir).joinpath("redirect_map.tsv")
+            redirect_map.save(path)
+            loaded = redirect.RedirectMap.load(path)
+            self.assertEqual(loaded.targets, redirect_map.targets)
+            path.write_text("A\tB\nno tab\n")
+            with self.assertRaisesRegex(ValueError, "line 2 of"):
+                redirect.RedirectMap.load(path)
+
+    def test_params(self):
+        with self.assertRaisesRegex(TypeError, "redirects must be a dict"):
+            redirect.RedirectMap([("A", "B")])
+
+
+if __name__ == "__main__":
+    unittest.main()
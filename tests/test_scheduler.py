@@ -0,0 +1,144 @@
+"""Tests for the scheduler module
+
+Coverage
+--------
+Scheduler
+
+Missing
+-------
+
+"""
+import multiprocessing as mp
+import os
+import threading
+import time
+import unittest
+
+from scheduler import Scheduler, WorkUnit
+
+MARKER = None  # set by test_fork before the workers start
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+def pid(_) -> int:
+    return os.getpid()
+
+
+def marker(_) -> str:
+    return MARKER
+
+
+def fail_on_three(x: int) -> int:
+    if x == 3:
+        raise ValueError("three is not allowed")
+    if x == 4:
+        os._exit(3)  # pylint: disable=protected-access
+    return x
+
+
+def exit_when_idle(x: int) -> int:
+    if x == 1:  # the worker exits while it waits for its next unit
+        threading.Timer(0.1, os._exit, (5,)).start()  # pylint: disable=protected-access
+    return x
+
+
+class SchedulerTest(unittest.TestCase):
+    """Test Scheduler
+
+    Tests
+    -----
+    results
+        is every unit run, largest first, with its result passed to on_result?
+    recycle
+        are workers replaced after max_units_per_worker units?
+    errors
+        are units that raise or kill their worker reported, without stopping the rest?
+    idle_exit
+        is a unit sent to a worker that died while idle run on a fresh worker?
+    fork
+        are workers forked, and see the main process's globals, whatever the default
+        start method?
+    params
+        will the constructor raise the correct errors for invalid parameters?
+    """
+
+    def test_results(self):
+        results = []
+        units = [WorkUnit(x, size, (x,)) for x, size in [(1, 10), (2, 30), (3, 20), (4, 5)]]
+        scheduler = Scheduler(square, 1, on_result=lambda unit, r: results.append((unit.key, r)))
+        self.assertEqual(scheduler.run(units), [])
+        self.assertEqual(results, [(2, 4), (3, 9), (1, 1), (4, 16)])
+        self.assertEqual(scheduler.workers_started, 1)
+        results = []
+        scheduler = Scheduler(square, 3, on_result=lambda unit, r: results.append((unit.key, r)))
+        scheduler.run(WorkUnit(x, x, (x,)) for x in range(20))
+        self.assertEqual(sorted(results), [(x, x * x) for x in range(20)])
+
+    def test_recycle(self):
+        pids = []
+        scheduler = Scheduler(pid, 2, max_units_per_worker=2, on_result=lambda _, r: pids.append(r))
+        scheduler.run([WorkUnit(x, 1, (x,)) for x in range(7)])
+        self.assertEqual(len(pids), 7)
+        self.assertEqual(scheduler.workers_started, 4)
+        for worker_pid in set(pids):
+            self.assertLessEqual(pids.count(worker_pid), 2)
+
+    def test_errors(self):
+        results, errors = [], []
+        scheduler = Scheduler(
+            fail_on_three,
+            2,
+            on_result=lambda unit, r: results.append(r),
+            on_error=errors.append,
+        )
+        failed = scheduler.run([WorkUnit(x, 1, (x,)) for x in range(1, 7)])
+        self.assertEqual(sorted(results), [1, 2, 5, 6])
+        self.assertEqual(failed, errors)
+        messages = {error.unit.key: error.message for error in failed}
+        self.assertEqual(set(messages), {3, 4})
+        self.assertIn("ValueError: three is not allowed", messages[3])
+        self.assertRegex(messages[4], "died with exit code 3")
+
+    def test_idle_exit(self):
+        results = []
+
+        def on_result(unit, result):
+            results.append(result)
+            time.sleep(0.5)  # until the worker has exited
+
+        scheduler = Scheduler(exit_when_idle, 1, on_result=on_result)
+        units = [WorkUnit(1, 2, (1,)), WorkUnit(2, 1, (2,))]
+        self.assertEqual(scheduler.run(units), [])
+        self.assertEqual(results, [1, 2])
+        self.assertEqual(scheduler.workers_started, 2)
+
+    def test_fork(self):
+        global MARKER  # pylint: disable=global-statement
+        results = []
+        method = mp.get_start_method()
+        mp.set_start_method("spawn", force=True)
+        MARKER = "set"
+        try:
+            scheduler = Scheduler(marker, 1, on_result=lambda _, r: results.append(r))
+            self.assertEqual(scheduler.run([WorkUnit(1, 1, (1,))]), [])
+        finally:
+            mp.set_start_method(method, force=True)
+            MARKER = None
+        self.assertEqual(results, ["set"])
+
+    def test_params(self):
+        with self.assertRaisesRegex(TypeError, "invalid target"):
+            Scheduler(None, 2)
+        with self.assertRaisesRegex(TypeError, "invalid max_workers"):
+            Scheduler(square, "2")
+        with self.assertRaisesRegex(ValueError, r"max_workers \(0\) must be at least 1"):
+            Scheduler(square, 0)
+        with self.assertRaisesRegex(ValueError, r"max_units_per_worker \(0\)"):
+            Scheduler(square, 1, max_units_per_worker=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
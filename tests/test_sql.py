@@ -0,0 +1,199 @@
+"""Tests for the database.sql module
+
+Coverage
+--------
+find_statement_ranges
+iter_statements
+open_sql_lines
+iter_values
+iter_rows
+get_line_iterator
+parse_columns
+
+Missing
+-------
+
+"""
+import gzip
+import unittest
+
+import numpy as np
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import database.sql as sql
+
+HEADER = b"-- MySQL dump\n/*!40101 SET NAMES binary*/;\nCREATE TABLE `page` (\n);\n"
+
+
+def page_dump(num_statements: int) -> bytes:
+    """a page table dump with num_statements INSERT INTO lines of 1-5 rows, one of
+    them containing 'INSERT INTO ' inside a title"""
+    lines = [HEADER]
+    page_id = 1
+    for i in range(num_statements):
+        rows = []
+        for _ in range(1 + i % 5):
+            title = "INSERT_INTO_" if page_id == 7 else "Title_{}".format(page_id)
+            rows.append("({},0,'{}',0,0,0.5)".format(page_id, title))
+            page_id += 1
+        lines.append("INSERT INTO `page` VALUES {};\n".format(",".join(rows)).encode())
+    lines.append(b"/*!40101 SET NAMES utf8 */;\n")
+    return b"".join(lines)
+
+
+class StatementRangesTest(unittest.TestCase):
+    """Test find_statement_ranges and iter_statements
+
+    Tests
+    -----
+    ranges
+        do the ranges start on INSERT INTO lines and cover every statement exactly
+        once, whatever the number of ranges?
+    no_statements
+        are no ranges returned for a dump without INSERT INTO lines?
+    """
+
+    def test_ranges(self):
+        data = page_dump(40)
+        expected = [line + b"\n" for line in data.split(b"\n") if line.startswith(b"INSERT")]
+        for num_ranges in [1, 3, 7, 40, 1000]:
+            ranges = sql.find_statement_ranges(data, num_ranges)
+            self.assertLessEqual(len(ranges), max(num_ranges, 1))
+            self.assertEqual(ranges[0][0], len(HEADER))
+            self.assertEqual(ranges[-1][1], len(data))
+            statements = []
+            for (start, end), (next_start, _) in zip(ranges, ranges[1:] + [(len(data), 0)]):
+                self.assertEqual(end, next_start)
+                self.assertTrue(data[start:].startswith(sql.STATEMENT_START))
+                statements.extend(sql.iter_statements(data, start, end))
+            self.assertEqual(statements, expected)
+
+    def test_no_statements(self):
+        self.assertEqual(sql.find_statement_ranges(HEADER, 4), [])
+        self.assertEqual(list(sql.iter_statements(HEADER, 0, len(HEADER))), [])
+
+
+class OpenSqlLinesTest(unittest.TestCase):
+    """Test open_sql_lines
+
+    Tests
+    -----
+    gzip
+        are the same lines read from a .sql file and its .sql.gz?
+    """
+
+    def test_gzip(self):
+        data = page_dump(10)
+        with TemporaryDirectory() as tmp_dir:
+            sql_path = Path(tmp_dir).joinpath("enwiki-20210520-page.sql")
+            sql_path.write_bytes(data)
+            gz_path = sql_path.with_suffix(".sql.gz")
+            gz_path.write_bytes(gzip.compress(data))
+            lines = list(sql.open_sql_lines(sql_path))
+            self.assertEqual(len(lines), 10)
+            self.assertEqual(list(sql.open_sql_lines(gz_path)), lines)
+            mapped = sql.map_sql_file(sql_path)
+            self.assertEqual(list(sql.iter_statements(mapped, 0, len(mapped))), lines)
+            mapped.close()
+
+
+# (sql literal, value) pairs of page titles that broke the old regexes
+EDGE_CASE_TITLES = [
+    ("'Don\\'t_Stop'", "Don't_Stop"),
+    ("'A,_B_(C)'", "A,_B_(C)"),
+    ("'),(1,0,\\'x\\''", "),(1,0,'x'"),
+    ("'C:\\\\'", "C:\\"),
+    ("'\\\\\\''", "\\'"),
+    ("'Tab\\there\\nnewline'", "Tab\there\nnewline"),
+    ("'\\\"Quoted\\\"'", '"Quoted"'),
+    ("'Zürich_–_東京'", "Zürich_–_東京"),
+    ("''", ""),
+    ("'NULL'", "NULL"),
+]
+
+
+def insert_line(table: str, rows: list) -> bytes:
+    return "INSERT INTO `{}` VALUES {};\n".format(table, ",".join(rows)).encode("utf-8")
+
+
+class TokenizerTest(unittest.TestCase):
+    """Test iter_values, iter_rows, get_line_iterator and parse_columns
+
+    Tests
+    -----
+    edge_case_titles
+        are escaped quotes, commas, parentheses, backslashes, control character
+        escapes and utf-8 in titles read exactly?
+    types
+        are the schema's columns typed, NULL None, and extra columns ignored?
+    get_line_iterator
+        does get_line_iterator return rows, or None for other lines?
+    parse_columns
+        are batches of lines turned into numpy columns?
+    errors
+        will invalid rows or non-INSERT lines raise ValueError?
+    """
+
+    def test_edge_case_titles(self):
+        rows = [
+            "({},0,{},'',0,0,0.5,'20210501000000')".format(i, literal)
+            for i, (literal, _) in enumerate(EDGE_CASE_TITLES)
+        ]
+        line = insert_line("page", rows)
+        titles = [row.page_title for row in sql.iter_rows(line, sql.LineEnum.PAGE)]
+        self.assertEqual(titles, [title for _, title in EDGE_CASE_TITLES])
+
+    def test_types(self):
+        line = insert_line("pagelinks", ["(12,0,'Anarchism',0)", "(-3,14,'Cat\\'s',NULL)"])
+        rows = list(sql.iter_rows(line, sql.LineEnum.LINK))
+        self.assertEqual(rows[0], (12, 0, "Anarchism", 0))
+        self.assertEqual(rows[1].pl_from, -3)
+        self.assertEqual(rows[1].pl_title, "Cat's")
+        self.assertIsNone(rows[1].pl_from_namespace)
+        line = insert_line(
+            "categorylinks", ["(1,'A','KEY','2021-05-01 00:00:00',0,'uca','page',9)"]
+        )
+        row = next(sql.iter_rows(line, sql.LineEnum.CATEGORYLINK))
+        self.assertEqual(row.cl_to, "A")
+        self.assertEqual(row.cl_type, "page")
+        self.assertEqual(row.cl_sortkey_prefix, "0")  # unquoted values of str columns
+        self.assertEqual(len(row), 7)
+
+    def test_get_line_iterator(self):
+        line = insert_line("page", ["(1,0,'A','',0)", "(2,0,'B','',1)"])
+        rows = list(sql.get_line_iterator(line, sql.LineEnum.PAGE))
+        self.assertEqual([row.page_is_redirect for row in rows], [0, 1])
+        self.assertIsNone(sql.get_line_iterator(b"-- MySQL dump\n", sql.LineEnum.PAGE))
+
+    def test_parse_columns(self):
+        lines = [
+            insert_line("page", ["(1,0,'A','',0)", "(2,1,'B\\'s','',0)"]),
+            insert_line("page", ["(3,0,'C','',1)"]),
+        ]
+        columns = sql.parse_columns(lines, sql.LineEnum.PAGE)
+        self.assertEqual(list(columns), [name for name, _ in sql.SCHEMAS[sql.LineEnum.PAGE]])
+        self.assertEqual(columns["page_id"].dtype, np.int64)
+        np.testing.assert_array_equal(columns["page_id"], [1, 2, 3])
+        self.assertEqual(list(columns["page_title"]), ["A", "B's", "C"])
+        columns = sql.parse_columns(lines, sql.LineEnum.PAGE, ["page_namespace"])
+        np.testing.assert_array_equal(columns["page_namespace"], [0, 1, 0])
+        with self.assertRaisesRegex(ValueError, "isn't a column of page"):
+            sql.parse_columns(lines, sql.LineEnum.PAGE, ["pl_title"])
+
+    def test_errors(self):
+        with self.assertRaisesRegex(ValueError, "invalid link row at byte 31"):
+            list(sql.iter_rows(insert_line("pagelinks", ["(1,0,'A')"]), sql.LineEnum.LINK))
+        line = insert_line("pagelinks", ["(1,0,'A',0)", "(2,'B',0)", "(3,0,'C',0)"])
+        with self.assertRaisesRegex(ValueError, "invalid link row at byte 43"):
+            list(sql.iter_rows(line, sql.LineEnum.LINK))
+        line = b"INSERT INTO `page` VALUES (1,0,'a','',0)X(2,0,'b','',0);"
+        with self.assertRaisesRegex(ValueError, "invalid page row separator at byte 40"):
+            list(sql.iter_rows(line, sql.LineEnum.PAGE))
+        with self.assertRaisesRegex(ValueError, "not an INSERT INTO"):
+            list(sql.iter_values(b"CREATE TABLE `page` (\n", sql.LineEnum.PAGE))
+
+
+if __name__ == "__main__":
+    unittest.main()
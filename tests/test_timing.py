@@ -0,0 +1,96 @@
+"""Tests for the wikitools.timing module
+
+Coverage
+--------
+StageTimer
+
+Missing
+-------
+
+"""
+import time
+import unittest
+from xml.etree.ElementTree import Element
+
+import wikitools.wikixml as wikixml
+
+from wikitools.timing import StageTimer
+
+
+class StageTimerTest(unittest.TestCase):
+    """Test StageTimer
+
+    Tests
+    -----
+    stage
+        is the time spent inside a stage added to it, even if the stage raises?
+    merge
+        are the stages and counters of two timers added together?
+    as_dict
+        does a timer survive the round trip through as_dict/from_dict?
+    report
+        are stages listed with their share of the total, without nested stages?
+    extraction
+        does get_headings_sections_links time its stages?
+    """
+
+    def test_stage(self):
+        timer = StageTimer()
+        with timer.stage("sleep"):
+            time.sleep(0.01)
+        with self.assertRaises(ValueError):
+            with timer.stage("sleep"):
+                raise ValueError("stage failed")
+        self.assertEqual(timer.counts["sleep"], 2)
+        self.assertGreaterEqual(timer.seconds("sleep"), 0.01)
+        self.assertEqual(timer.seconds("missing"), 0.0)
+
+    def test_merge(self):
+        timer = StageTimer()
+        timer.add("parse", 100)
+        timer.count("pages", 2)
+        other = StageTimer()
+        other.add("parse", 50, count=3)
+        other.add("commit", 10)
+        other.count("pages")
+        self.assertIs(timer.merge(other), timer)
+        self.assertEqual(timer.times, {"parse": 150, "commit": 10})
+        self.assertEqual(timer.counts, {"parse": 4, "commit": 1, "pages": 3})
+        timer.reset()
+        self.assertEqual(timer.as_dict(), {"times": {}, "counts": {}})
+
+    def test_as_dict(self):
+        timer = StageTimer()
+        timer.add("links", 1234, count=2)
+        timer.count("links_found", 9)
+        copy = StageTimer.from_dict(timer.as_dict())
+        self.assertEqual(copy.times, timer.times)
+        self.assertEqual(copy.counts, timer.counts)
+
+    def test_report(self):
+        timer = StageTimer()
+        timer.add("parse", 3 * 10**9)
+        timer.add("links", 10**9, count=4)
+        timer.add("transliterate", 10**9)  # inside links
+        timer.count("links_found", 7)
+        lines = timer.report("file", nested=("transliterate",)).split("\n")
+        self.assertEqual(lines[0], "file: 4.000s timed")
+        self.assertRegex(lines[1], r"parse +1 calls +3.000s +3000000.0us/call +75.0%")
+        self.assertRegex(lines[2], r"links +4 calls +1.000s +250000.0us/call +25.0%")
+        self.assertRegex(lines[4], r"links_found +7")
+
+    def test_extraction(self):
+        element = Element("text")
+        element.text = "lead [[A]]\n== History ==\ntext [[B|b]]"
+        timer = StageTimer()
+        expected = wikixml.get_headings_sections_links(element)
+        self.assertEqual(wikixml.get_headings_sections_links(element, timer), expected)
+        for stage in ["parse", "links", "headings", "sections"]:
+            self.assertEqual(timer.counts[stage], 1)
+        wikixml.get_headings_links_fast(element, timer)
+        self.assertEqual(timer.counts["scan"], 1)
+        self.assertEqual(timer.counts["links"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Tests for the wikitools.transliterate module
+
+Coverage
+--------
+transliterate
+transliterate_cached
+set_cache_size
+cache_stats
+cache_stats_msg
+
+Missing
+-------
+
+"""
+import unittest
+
+from unidecode import unidecode
+
+import wikitools.transliterate as transliterate
+
+SAMPLES = [
+    "",
+    "Albert Einstein",
+    "Erwin Schrödinger",
+    "Zürich, Genève and Москва",
+    "東京 (Tokyo)",
+    "naïve café – “quoted” … ½",
+    "emoji 😀 and ﬁ ligature",
+]
+
+
+class TransliterateTest(unittest.TestCase):
+    """Test transliterate and transliterate_cached
+
+    Tests
+    -----
+    unidecode
+        do both give the same result as unidecode for ascii and non-ascii text?
+    ascii
+        is ascii text returned as is?
+    """
+
+    def test_unidecode(self):
+        for text in SAMPLES:
+            self.assertEqual(transliterate.transliterate(text), unidecode(text))
+            self.assertEqual(transliterate.transliterate_cached(text), unidecode(text))
+
+    def test_ascii(self):
+        text = "plain ascii [[link]]"
+        self.assertIs(transliterate.transliterate(text), text)
+        self.assertIs(transliterate.transliterate_cached(text), text)
+
+
+class CacheTest(unittest.TestCase):
+    """Test the transliterate_cached cache
+
+    Tests
+    -----
+    stats
+        are hits and misses of non-ascii strings counted, and ascii strings skipped?
+    size
+        is the cache bounded by set_cache_size?
+    params
+        will set_cache_size raise the correct errors for invalid sizes?
+    """
+
+    def setUp(self):
+        transliterate.set_cache_size(transliterate.DEFAULT_CACHE_SIZE)
+
+    def tearDown(self):
+        transliterate.set_cache_size(transliterate.DEFAULT_CACHE_SIZE)
+
+    def test_stats(self):
+        self.assertEqual(transliterate.cache_stats()["hit_rate"], 0.0)
+        for _ in range(3):
+            transliterate.transliterate_cached("Schrödinger")
+        transliterate.transliterate_cached("Einstein")
+        stats = transliterate.cache_stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["size"], 1)
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+        self.assertIn("66.7% hit rate", transliterate.cache_stats_msg())
+
+    def test_size(self):
+        transliterate.set_cache_size(2)
+        for text in ["é", "ü", "ö", "é"]:
+            transliterate.transliterate_cached(text)
+        stats = transliterate.cache_stats()
+        self.assertEqual(stats["size"], 2)
+        self.assertEqual(stats["maxsize"], 2)
+        self.assertEqual(stats["hits"], 0)  # "é" was evicted by "ö"
+
+    def test_params(self):
+        with self.assertRaisesRegex(TypeError, "invalid maxsize"):
+            transliterate.set_cache_size("10")
+        with self.assertRaisesRegex(ValueError, "must be at least 0"):
+            transliterate.set_cache_size(-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
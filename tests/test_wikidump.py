@@ -3,15 +3,18 @@
 Coverage
 --------
 verify_contiguous_dump
+load_wikifile_list
 
 Missing
 -------
-load_wikifile_list
+
 """
 from pathlib import Path
+from tempfile import TemporaryDirectory
 import unittest
 
 from wikitools.wikixml import WikiXMLFile
+import wikitools.synthetic
 import wikitools.wikidump
 
 
@@ -55,5 +58,20 @@ class FindMissingDumpFilesTest(unittest.TestCase):
         self.assertDictEqual(results, expected_dict)
 
 
+class LoadWikifileListTest(unittest.TestCase):
+    def test_load_wikifile_list(self):
+        with TemporaryDirectory() as tmp_dir:
+            data_path = Path(tmp_dir)
+            expected = wikitools.synthetic.write_dump(data_path, 3, 20, pages_per_stream=5)
+            data_path.joinpath("enwiki-20210420-md5sums.txt").touch()  # not a dump file
+            files = wikitools.wikidump.load_wikifile_list(data_path)
+            self.assertEqual(files, expected)
+            self.assertTrue(wikitools.wikidump.is_dump_contiguous(files))
+            with self.assertRaises(NotADirectoryError):
+                wikitools.wikidump.load_wikifile_list(files[0].path)
+            with self.assertRaises(FileNotFoundError):
+                wikitools.wikidump.load_wikifile_list(data_path.joinpath("missing"))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -3,7 +3,14 @@
 Coverage
 --------
 WikiXMLFile
+WikiXMLFile multistream index (load_index, stream_ranges, stream_offset, stream_parser,
+    page_parser)
+get_index_path
+get_headings_sections_links
+get_headings_links_fast
+iter_pages
 get_next_title_element
+wikifile_num_articles_longest_article
 
 Missing
 -------
@@ -11,11 +18,14 @@ get_headsings_sections
 """
 from pathlib import Path
 import re
+from tempfile import TemporaryDirectory
 import unittest
 from xml.etree.ElementTree import Element
 
+import wikitools.synthetic as synthetic
 import wikitools.wikixml as wikixml
 
+from wikitools.transliterate import transliterate
 from wikitools.wikipage import WikipediaPage
 from wikitools.wikixml import WikiXMLFile
 
@@ -106,10 +116,308 @@ class WikiXMLFileTest(unittest.TestCase):
         self.assertNotEqual(test_self, test_other)
 
 
+class MultistreamIndexTest(unittest.TestCase):
+    """Test random access to WikiXMLFile through its multistream index
+
+    Tests
+    -----
+    get_index_path
+        is the index path derived from the data file's name?
+    load_index
+        are all offset:page_id:title lines (including titles with colons) loaded?
+    stream_ranges
+        is there one contiguous range per stream?
+    stream_parser
+        does parsing every stream independently yield every page in the file?
+    page_parser
+        does seeking by page id yield the stream with that page?
+    threaded
+        do the threaded parsers yield the same pages as the in-memory ones?
+    """
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.pages = [
+            (10, "Quantum Mechanics", "'''Quantum mechanics''' is a [[theory]]."),
+            (12, "Albert Einstein", "Einstein & [[Quantum Mechanics|QM]]."),
+            (13, "Talk:Albert Einstein", "a talk page"),
+            (15, "Dog", "A [[dog]] <is> an animal."),
+            (18, "War of the Worlds", "A novel."),
+        ]
+        self.wiki_file = synthetic.write_multistream(Path(self.tmp_dir.name), self.pages, 2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_get_index_path(self):
+        path = Path("enwiki-20210420-pages-articles-multistream16.xml-p20460153p20570392.bz2")
+        expected = "enwiki-20210420-pages-articles-multistream-index16.txt-p20460153p20570392.bz2"
+        self.assertEqual(wikixml.get_index_path(path).name, expected)
+        self.assertEqual(WikiXMLFile(20460153, 20570392, path).index_path.name, expected)
+        with self.assertRaisesRegex(TypeError, "invalid index_path"):
+            WikiXMLFile(20460153, 20570392, path, index_path="not/a/path")
+
+    def test_load_index(self):
+        self.assertTrue(self.wiki_file.has_index())
+        index = self.wiki_file.load_index()
+        self.assertEqual([entry.page_id for entry in index], [10, 12, 13, 15, 18])
+        self.assertEqual(index[2].title, "Talk:Albert Einstein")
+        self.assertEqual(index[0].offset, index[1].offset)
+        self.assertNotEqual(index[1].offset, index[2].offset)
+        missing = WikiXMLFile(1, 2, Path(self.tmp_dir.name).joinpath("missing.xml-p1p2.bz2"))
+        self.assertFalse(missing.has_index())
+        with self.assertRaises(FileNotFoundError):
+            missing.load_index()
+
+    def test_stream_ranges(self):
+        ranges = self.wiki_file.stream_ranges()
+        self.assertEqual(len(ranges), 3)
+        for (_, end), (next_start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+        self.assertEqual(ranges[-1][1], self.wiki_file.path.stat().st_size)
+
+    def test_stream_parser(self):
+        titles = []
+        for start, _ in self.wiki_file.stream_ranges():
+            with self.wiki_file.stream_parser(start) as parser:
+                while True:
+                    try:
+                        title, elem = wikixml.get_next_title_element(parser)
+                    except StopIteration:
+                        break
+                    titles.append(title)
+                    self.assertIsInstance(elem, Element)
+        expected = ["Quantum Mechanics", "Albert Einstein", "Dog", "War of the Worlds"]
+        self.assertEqual(titles, expected)
+        # a range spanning several streams decompresses all of them
+        ranges = self.wiki_file.stream_ranges()
+        with self.wiki_file.stream_parser(ranges[1][0], ranges[-1][1]) as parser:
+            title, _ = wikixml.get_next_title_element(parser)
+            self.assertEqual(title, "Dog")
+            title, _ = wikixml.get_next_title_element(parser)
+            self.assertEqual(title, "War of the Worlds")
+        with self.assertRaisesRegex(ValueError, "isn't the offset of a stream"):
+            with self.wiki_file.stream_parser(ranges[0][0] + 1):
+                pass
+
+    def test_page_parser(self):
+        with self.wiki_file.page_parser(15) as parser:
+            title, elem = wikixml.get_next_title_element(parser)
+            self.assertEqual(title, "Dog")
+            self.assertEqual(elem.text, "A [[dog]] <is> an animal.")
+        with self.assertRaises(KeyError):
+            with self.wiki_file.page_parser(11):
+                pass
+        self.assertEqual(self.wiki_file.stream_offset(12), self.wiki_file.stream_offset(10))
+        with self.assertRaises(KeyError):
+            self.wiki_file.stream_offset(11)
+
+    def test_threaded(self):
+        def titles(parser):
+            return [page.title for page in wikixml.iter_pages(parser, namespaces=(0, 1))]
+
+        with self.wiki_file.parser(events=wikixml.PAGE_EVENTS) as parser:
+            expected = titles(parser)
+        with self.wiki_file.parser(events=wikixml.PAGE_EVENTS, threaded=True) as parser:
+            self.assertEqual(titles(parser), expected)
+        ranges = self.wiki_file.stream_ranges()
+        for start, end in [(ranges[0][0], ranges[-1][1]), (ranges[0][0], ranges[1][1])]:
+            with self.wiki_file.stream_parser(start, end, events=wikixml.PAGE_EVENTS) as parser:
+                expected = titles(parser)
+            with self.wiki_file.stream_parser(
+                start, end, events=wikixml.PAGE_EVENTS, threaded=True
+            ) as parser:
+                self.assertEqual(titles(parser), expected)
+
+
 class GetHeadingsSections(unittest.TestCase):
     pass
 
 
+WIKITEXT_SAMPLES = [
+    "A stub with no headings and a [[link]].",
+    "",
+    """'''Quantum mechanics''' is a [[Fundamental theory|fundamental theory]] in
+[[physics]].<ref>{{cite book|title=[[Physics]]}}</ref> &Sigma; is a letter.
+[[File:Solvay conference 1927.jpg|thumb|The [[Solvay Conference]] of 1927]]
+[[File:Wave.png|A wave]]
+
+== History ==
+Started by [[Max Planck]] in {{year|1900}}.<!-- a comment -->
+
+=== ''Early'' theory ===
+[[Niels Bohr|Bohr]] & [[Albert Einstein]].
+
+== See also ==
+* [[Quantum field theory]]
+* [[  ]]
+
+[[Category:Quantum mechanics]]
+[[Category:Physics|Quantum]]""",
+    """Intro with [[Paris|the city of ''Paris'']] and [[Zürich]].
+==Heading with [[link in heading]]==
+text
+==Empty section==
+==Last==
+<div>block</div> final [[link]]""",
+    """Plain [[links]] only: [[A|b]], [[File:X.png|thumb|[[C|c]] caption]], [[D|]]
+== One ==
+===Two===
+[[Category:E|sort key]]""",
+    """Lead text.
+<div>
+== Heading inside a div ==
+</div>
+== Top level heading ==
+Body with [[Link]].""",
+]
+
+
+class GetHeadingsSectionsLinksTest(unittest.TestCase):
+    """Test wikixml.get_headings_sections_links
+
+    Tests
+    -----
+    fidelity : results are identical to get_headings_sections and get_pagelinks
+    repeated_heading_text : sections are split on the heading node, not on the first
+        occurrence of the heading's text
+    params : typechecking works
+    """
+
+    def test_fidelity(self):
+        for text in WIKITEXT_SAMPLES:
+            element = Element("text")
+            element.text = text
+            expected_headings, expected_sections = wikixml.get_headings_sections(element)
+            expected_links = wikixml.get_pagelinks(element)
+            headings, sections, links = wikixml.get_headings_sections_links(element)
+            self.assertEqual(headings, expected_headings)
+            self.assertEqual(sections, expected_sections)
+            self.assertEqual(links, expected_links)
+            # results are valid WikipediaPage fields
+            WikipediaPage("title", headings, sections, links)
+
+    def test_repeated_heading_text(self):
+        element = Element("text")
+        element.text = "Text that repeats the heading == Repeated ==\n== Repeated ==\nafter"
+        headings, sections, _ = wikixml.get_headings_sections_links(element)
+        self.assertEqual(headings, ["Lead", "Repeated"])
+        self.assertEqual(sections, ["Text that repeats the heading == Repeated ==", "after"])
+
+    def test_params(self):
+        with self.assertRaisesRegex(TypeError, "invalid element"):
+            wikixml.get_headings_sections_links("not an element")
+
+
+class GetHeadingsLinksFastTest(unittest.TestCase):
+    """Test wikixml.get_headings_links_fast
+
+    Tests
+    -----
+    fidelity : headings and links are identical to get_headings_sections and
+        get_pagelinks, whether the page is scanned or falls back to mwparserfromhell
+    params : typechecking works
+    """
+
+    def test_fidelity(self):
+        for text in WIKITEXT_SAMPLES:
+            element = Element("text")
+            element.text = text
+            expected_headings, _ = wikixml.get_headings_sections(element)
+            expected_links = wikixml.get_pagelinks(element)
+            headings, links = wikixml.get_headings_links_fast(element)
+            self.assertEqual(headings, expected_headings)
+            self.assertEqual(links, expected_links)
+
+    def test_params(self):
+        with self.assertRaisesRegex(TypeError, "invalid element"):
+            wikixml.get_headings_links_fast("not an element")
+
+
+class IterPagesTest(unittest.TestCase):
+    """Test wikixml.iter_pages
+
+    Tests
+    -----
+    fields : page id, revision id, timestamp, sha1 and text are captured
+    namespaces : pages are filtered on <ns>, not on colons in the title
+    redirects : redirects are skipped unless include_redirects
+    memory : completed pages are removed from the root element
+    params : typechecking works
+    """
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.pages = [
+            (10, "Quantum Mechanics", "[[Physics]]"),
+            (11, "Star Wars: Episode IV", "an article with a colon in its title"),
+            (12, "Talk:Quantum Mechanics", "a talk page", 1, None),
+            (13, "QM", "#REDIRECT [[Quantum Mechanics]]", 0, "Quantum Mechanics"),
+            (14, "Category:Physics", "a category", 14, None),
+        ]
+        self.wiki_file = synthetic.write_multistream(Path(self.tmp_dir.name), self.pages, 2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_fields(self):
+        with self.wiki_file.parser(events=wikixml.PAGE_EVENTS) as parser:
+            page = next(wikixml.iter_pages(parser))
+        self.assertEqual(page.page_id, 10)
+        self.assertEqual(page.title, "Quantum Mechanics")
+        self.assertEqual(page.ns, 0)
+        self.assertEqual(page.revision_id, 1000)
+        self.assertEqual(page.timestamp, "2021-04-20T00:00:00Z")
+        self.assertEqual(page.sha1, "sha10")
+        self.assertIsNone(page.redirect)
+        self.assertIsInstance(page.text, Element)
+
+    def test_namespaces(self):
+        with self.wiki_file.parser(events=wikixml.PAGE_EVENTS) as parser:
+            ids = [page.page_id for page in wikixml.iter_pages(parser)]
+        self.assertEqual(ids, [10, 11])
+        with self.wiki_file.parser(events=wikixml.PAGE_EVENTS) as parser:
+            ids = [page.page_id for page in wikixml.iter_pages(parser, namespaces=(1, 14))]
+        self.assertEqual(ids, [12, 14])
+        # stream parsers work the same way
+        start, end = self.wiki_file.stream_ranges()[1]
+        with self.wiki_file.stream_parser(start, end, events=wikixml.PAGE_EVENTS) as parser:
+            ids = [page.page_id for page in wikixml.iter_pages(parser, namespaces=(1,))]
+        self.assertEqual(ids, [12])
+
+    def test_redirects(self):
+        with self.wiki_file.parser(events=wikixml.PAGE_EVENTS) as parser:
+            pages = list(wikixml.iter_pages(parser, include_redirects=True))
+        self.assertEqual([page.page_id for page in pages], [10, 11, 13])
+        self.assertEqual(pages[2].redirect, "Quantum Mechanics")
+
+    def test_memory(self):
+        seen = {}
+
+        def spy(parser):  # keep a reference to the root element
+            for event, elem in parser:
+                seen.setdefault("root", elem)
+                yield event, elem
+
+        page_tag = "{" + synthetic.MEDIAWIKI_NS + "}page"
+        with self.wiki_file.parser(events=wikixml.PAGE_EVENTS) as parser:
+            for _ in wikixml.iter_pages(spy(parser), namespaces=(0, 1, 14)):
+                self.assertIsNotNone(seen["root"].find(page_tag))  # the current page
+        self.assertEqual(len(seen["root"].findall(page_tag)), 0)
+
+    def test_params(self):
+        with self.assertRaisesRegex(TypeError, "invalid parser"):
+            next(wikixml.iter_pages(None))
+        with self.wiki_file.parser() as parser:
+            with self.assertRaisesRegex(ValueError, "PAGE_EVENTS"):
+                next(wikixml.iter_pages(parser))
+
+    def test_num_articles_longest_article(self):
+        num_articles, longest_title = wikixml.wikifile_num_articles_longest_article(self.wiki_file)
+        self.assertEqual(num_articles, 2)
+        self.assertEqual(longest_title, "Star Wars: Episode IV")
+
+
 class GetNextTitleElementTest(unittest.TestCase):
     """Test wikixml.get_next_title_element
 
@@ -118,14 +426,20 @@ class GetNextTitleElementTest(unittest.TestCase):
     params : typechecking works
     return_types : return types are correct
     returns_only_articles : only ns 0 pages are returned
-    elem :
+    elem : the text of the page is returned
     """
 
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.pages = synthetic.generate_pages(300, other_ns_fraction=0.3, seed=1)
+        self.wiki_file = synthetic.write_multistream(Path(self.tmp_dir.name), self.pages)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
     def test_params(self):
         """Verify parameter type-checking is correct"""
-        path = Path("tests/enwiki-20210420-pages-articles-multistream16.xml-p20460153p20570392.bz2")
-        wiki_file = WikiXMLFile(20460153, 20570392, path)
-        with wiki_file.parser() as parser:
+        with self.wiki_file.parser() as parser:
             title, elem = wikixml.get_next_title_element(parser)
             self.assertIsInstance(title, str)
             self.assertIsInstance(elem, Element)
@@ -138,9 +452,7 @@ class GetNextTitleElementTest(unittest.TestCase):
 
     def test_return_types(self):
         """Verify that the return types are (str, xml.etree.ElementTree.Element)"""
-        path = Path("tests/enwiki-20210420-pages-articles-multistream16.xml-p20460153p20570392.bz2")
-        wiki_file = WikiXMLFile(20460153, 20570392, path)
-        with wiki_file.parser() as parser:
+        with self.wiki_file.parser() as parser:
             title, elem = wikixml.get_next_title_element(parser)
             self.assertIsInstance(title, str)
             self.assertIsInstance(elem, Element)
@@ -148,8 +460,6 @@ class GetNextTitleElementTest(unittest.TestCase):
     def test_returns_only_articles(self):
         """Verify that all page namespaces except ns 0 (Main/Article) are excluded
         from results"""
-        path = Path("tests/enwiki-20210420-pages-articles-multistream16.xml-p20460153p20570392.bz2")
-        wiki_file = WikiXMLFile(20460153, 20570392, path)
         namespaces = [  # listed at https://en.wikipedia.org/wiki/Wikipedia:Namespace
             "User",
             "Wikipedia",
@@ -163,7 +473,8 @@ class GetNextTitleElementTest(unittest.TestCase):
             "TimedText",
             "Module",
         ]
-        with wiki_file.parser() as parser:
+        titles = []
+        with self.wiki_file.parser() as parser:
             while True:
                 try:
                     title, elem = wikixml.get_next_title_element(parser)
@@ -173,35 +484,38 @@ class GetNextTitleElementTest(unittest.TestCase):
                 self.assertLessEqual(len(title), 200)  # titles are limited to 200 chars
                 for ns in namespaces:
                     self.assertIsNone(re.search(r"^{}:(.+)$".format(ns), title))
+                titles.append(title)
+        expected = [transliterate(page.title) for page in synthetic.iter_articles(self.pages)]
+        self.assertEqual(titles, expected)
 
     def test_elem(self):
-        """
-        TODO: TBH doesn't do anything, not sure how to actually test that the content
-        coming out of the files is valid...
-        """
-        path = Path("tests/enwiki-20210420-pages-articles-multistream16.xml-p20460153p20570392.bz2")
-        wiki_file = WikiXMLFile(20460153, 20570392, path)
-        with wiki_file.parser() as parser:
-            title, elem = wikixml.get_next_title_element(parser)
-            print(title)
-            print()
-            print(type(elem.text))
+        """Verify that the element holds the page's wikitext"""
+        article = next(synthetic.iter_articles(self.pages))
+        with self.wiki_file.parser() as parser:
+            _, elem = wikixml.get_next_title_element(parser)
+            self.assertEqual(elem.text, article.text)
 
 
 class IntegrationTest(unittest.TestCase):
-    parent = "/hdd/datasets/wikipedia_4_20_21/"
-    name = "enwiki-20210420-pages-articles-multistream1.xml-p1p41242.bz2"
-    data_path = Path(parent + name)
-    test_file = WikiXMLFile(1, 41242, data_path)
-    with test_file.parser() as parser:
-        title, element = wikixml.get_next_title_element(parser)
-        links = wikixml.get_pagelinks(element)
-        # for link in links:
-        #     print(link)
-        # print(links)
-        headings, sections = wikixml.get_headings_sections(element)
-        page = WikipediaPage(title, headings, sections, links)
-        print(page)
+    """Extract a WikipediaPage from the first article of a synthetic dump file
+
+    Tests
+    -----
+    page : the first article's title, headings, sections and links are extracted
+    """
+
+    def test_page(self):
+        with TemporaryDirectory() as tmp_dir:
+            pages = synthetic.generate_pages(20, redirect_fraction=0, other_ns_fraction=0)
+            test_file = synthetic.write_multistream(Path(tmp_dir), pages)
+            with test_file.parser() as parser:
+                title, element = wikixml.get_next_title_element(parser)
+                links = wikixml.get_pagelinks(element)
+                headings, sections = wikixml.get_headings_sections(element)
+                page = WikipediaPage(title, headings, sections, links)
+        self.assertEqual(page.title, pages[0].title)
+        self.assertEqual(len(page.headings), len(page.sections))
+        self.assertGreater(len(page.links), 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""Tests for the database.writer module
+
+Coverage
+--------
+BatchWriter
+BatchStats
+BatchSizer
+page_size
+
+Missing
+-------
+BatchWriter committing to a live PostgreSQL database (see scripts/etl_flow.py)
+
+"""
+import threading
+import time
+import unittest
+
+from database.writer import BatchSizer, BatchWriter, page_size
+from wikitools.wikipage import WikipediaPage
+
+
+class SlowCommit:
+    """Records the batches it commits, and the thread it commits them in. Blocks
+    until release is set"""
+
+    def __init__(self, fail_on: int = None):
+        self.batches = []
+        self.threads = set()
+        self.release = threading.Event()
+        self.release.set()
+        self.fail_on = fail_on
+
+    def __call__(self, pages):
+        self.release.wait(timeout=5)
+        if self.fail_on is not None and len(self.batches) == self.fail_on:
+            raise KeyError("commit failed")
+        self.threads.add(threading.current_thread().name)
+        self.batches.append(list(pages))
+        pages.clear()  # like commit_list_to_db
+
+
+class BatchWriterTest(unittest.TestCase):
+    """Test BatchWriter
+
+    Tests
+    -----
+    order
+        are batches committed in order in the writer thread, with on_commit called
+        after each?
+    synchronous
+        does queue_size=0 commit in the submitting thread?
+    backpressure
+        does submit block once queue_size batches are waiting, and count the time?
+    error
+        is an exception from commit re-raised by submit or close?
+    abort
+        does an exception in the with statement drop the waiting batches?
+    stats
+        are the per-batch stats written to stats_file and totalled in timer?
+    """
+
+    def test_order(self):
+        commit = SlowCommit()
+        committed = []
+        with BatchWriter(commit, queue_size=2) as writer:
+            for i in range(10):
+                writer.submit([i, i + 1], lambda i=i: committed.append(i))
+        self.assertEqual(commit.batches, [[i, i + 1] for i in range(10)])
+        self.assertEqual(committed, list(range(10)))
+        self.assertEqual(commit.threads, {"writer"})
+        self.assertEqual([stats.batch for stats in writer.batches], list(range(10)))
+        with self.assertRaisesRegex(ValueError, "the writer was closed"):
+            writer.submit([11])
+
+    def test_synchronous(self):
+        commit = SlowCommit()
+        with BatchWriter(commit, queue_size=0) as writer:
+            writer.submit([1])
+            self.assertEqual(commit.batches, [[1]])
+        self.assertEqual(commit.threads, {threading.current_thread().name})
+        with self.assertRaisesRegex(ValueError, r"queue_size \(-1\) must be at least 0"):
+            BatchWriter(commit, queue_size=-1)
+        with self.assertRaisesRegex(TypeError, "queue_size must be an int"):
+            BatchWriter(commit, queue_size=1.5)
+
+    def test_backpressure(self):
+        commit = SlowCommit()
+        commit.release.clear()
+        writer = BatchWriter(commit, queue_size=1)
+        writer.submit([0])  # being committed
+        writer.submit([1])  # waiting
+        submitted = threading.Event()
+
+        def submit():
+            writer.submit([2])
+            submitted.set()
+
+        thread = threading.Thread(target=submit)
+        thread.start()
+        self.assertFalse(submitted.wait(timeout=0.2))
+        commit.release.set()
+        self.assertTrue(submitted.wait(timeout=5))
+        thread.join()
+        writer.close()
+        self.assertEqual(commit.batches, [[0], [1], [2]])
+        self.assertGreaterEqual(writer.batches[2].blocked_ns, 0.2e9)
+        self.assertGreaterEqual(writer.timer().seconds("commit_wait"), 0.2)
+
+    def test_error(self):
+        writer = BatchWriter(SlowCommit(fail_on=1), queue_size=1)
+        with self.assertRaisesRegex(KeyError, "commit failed"):
+            for i in range(100):
+                writer.submit([i])
+                time.sleep(0.01)
+        writer.close()
+        writer = BatchWriter(SlowCommit(fail_on=0), queue_size=1)
+        writer.submit([0])
+        with self.assertRaisesRegex(KeyError, "commit failed"):
+            writer.close()
+
+    def test_abort(self):
+        commit = SlowCommit()
+        commit.release.clear()
+        with self.assertRaises(KeyError):
+            with BatchWriter(commit, queue_size=3) as writer:
+                for i in range(4):
+                    writer.submit([i])
+                time.sleep(0.05)  # until the writer is committing the first batch
+                threading.Timer(0.1, commit.release.set).start()  # once the writer is stopped
+                raise KeyError("parser failed")
+        self.assertEqual(commit.batches, [[0]])
+
+    def test_stats(self):
+        lines = []
+
+        class StatsFile:
+            def write(self, line):
+                lines.append(line)
+
+        with BatchWriter(SlowCommit(), stats_file=StatsFile()) as writer:
+            writer.submit([1, 2, 3])
+            writer.submit([4])
+        self.assertEqual(len(lines), 2)
+        self.assertRegex(lines[0], r"batch 0: 3 pages, 0.0/0.0 MB. blocked \d+\.\d{3}s")
+        self.assertEqual(writer.timer().counts["commit"], 2)
+        self.assertIn("2 batches, 4 pages", writer.stats_msg())
+
+
+def make_page(size: int) -> WikipediaPage:
+    """page with size characters of text"""
+    return WikipediaPage("T", ["H"], ["x" * (size - 3)], ["L"])
+
+
+class BatchSizerTest(unittest.TestCase):
+    """Test BatchSizer
+
+    Tests
+    -----
+    full
+        is a batch full once it holds limit bytes or max_pages pages?
+    observe
+        does the limit move towards the bytes committed in target_seconds, within
+        min_bytes and max_bytes?
+    writer
+        does the writer take each batch's size, record it and adapt the limit?
+    errors
+        are invalid bounds a ValueError?
+    """
+
+    def test_full(self):
+        self.assertEqual(page_size(make_page(100)), 100)
+        sizer = BatchSizer(min_bytes=250, max_bytes=1000, max_pages=5)
+        self.assertFalse(sizer.add(make_page(100)))
+        self.assertFalse(sizer.add(make_page(100)))
+        self.assertTrue(sizer.add(make_page(100)))
+        self.assertEqual(sizer.take(), 300)
+        self.assertFalse(sizer.full())
+        for _ in range(4):
+            self.assertFalse(sizer.add(make_page(10)))
+        self.assertTrue(sizer.add(make_page(10)))
+
+    def test_observe(self):
+        sizer = BatchSizer(target_seconds=2.0, min_bytes=100, max_bytes=10000)
+        sizer.observe(100, int(0.1e9))  # 2000 bytes in 2 s
+        self.assertEqual(sizer.limit, 1050)
+        sizer.observe(1050, int(0.5e9))  # 4200 bytes in 2 s
+        self.assertEqual(sizer.limit, 2625)
+        sizer.observe(2625, int(0.01e9))
+        self.assertEqual(sizer.limit, 10000)
+        for _ in range(20):
+            sizer.observe(1000, int(100e9))
+        self.assertEqual(sizer.limit, 100)
+        sizer.observe(0, 0)
+        self.assertEqual(sizer.limit, 100)
+
+    def test_writer(self):
+        sizer = BatchSizer(target_seconds=1.0, min_bytes=200, max_bytes=10**9)
+        sizer.add(make_page(50))  # left over from another writer
+        pages = [make_page(100), make_page(150)]
+        with BatchWriter(SlowCommit(), sizer=sizer) as writer:
+            for page in pages:
+                sizer.add(page)
+            writer.submit(pages)
+        stats = writer.batches[0]
+        self.assertEqual((stats.pages, stats.size, stats.limit), (2, 250, 200))
+        self.assertGreater(sizer.limit, 200)  # a commit that quick can take far more
+
+    def test_errors(self):
+        with self.assertRaisesRegex(ValueError, r"target_seconds \(0\) must be positive"):
+            BatchSizer(target_seconds=0)
+        with self.assertRaisesRegex(ValueError, "byte limits must be"):
+            BatchSizer(min_bytes=100, max_bytes=10)
+        with self.assertRaisesRegex(ValueError, "byte limits must be"):
+            BatchSizer(min_bytes=100, max_bytes=1000, start_bytes=2000)
+        with self.assertRaisesRegex(ValueError, r"max_pages \(0\) must be at least 1"):
+            BatchSizer(max_pages=0)
+
+
+if __name__ == "__main__":
+    unittest.main()